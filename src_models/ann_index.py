@@ -0,0 +1,309 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+CENTROIDS_FILE = "centroids.npy"
+VECTORS_FILE = "vectors.npy"
+IDS_FILE = "ids.npy"
+OFFSETS_FILE = "offsets.npy"
+META_FILE = "meta.json"
+
+
+class IVFIndex:
+    """
+    An inverted-file (IVF) approximate nearest-neighbour index for cosine similarity.
+
+    Vectors are L2-normalized and assigned to the nearest of `nlist` centroids
+    learned with spherical k-means. A query only scans the `nprobe` lists whose
+    centroids are closest to it, so `nprobe` trades recall for latency:
+    `nprobe == nlist` is an exhaustive search.
+    """
+
+    def __init__(self, dimension: Optional[int] = None, nlist: int = 1024, nprobe: int = 16):
+        """
+        Initialize an empty, untrained index.
+
+        Args:
+            dimension (Optional[int]): Size of the indexed vectors, or None to take it from the training data.
+            nlist (int): Number of inverted lists (k-means centroids).
+            nprobe (int): Default number of lists scanned per query.
+        """
+        self.dimension: Optional[int] = dimension
+        self.nlist: int = nlist
+        self.nprobe: int = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self._vectors: List[np.ndarray] = []
+        self._ids: List[np.ndarray] = []
+        self._sizes: np.ndarray = np.zeros(nlist, dtype=np.int64)
+        # Built on first mutation so that loading a saved index stays cheap
+        self._locations: Optional[Dict[int, Tuple[int, int]]] = {}
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        return int(self._sizes.sum())
+
+    def __contains__(self, vector_id: int) -> bool:
+        return int(vector_id) in self._location_map()
+
+    def train(self, vectors: np.ndarray, iterations: int = 10, seed: int = 0) -> None:
+        """
+        Learn the coarse quantizer with spherical k-means.
+
+        Args:
+            vectors (np.ndarray): Training vectors of shape (N, dimension), N >= nlist.
+            iterations (int): Number of k-means iterations.
+            seed (int): Seed of the centroid initialization.
+        """
+        vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        if vectors.shape[0] < self.nlist:
+            raise ValueError(f"Training needs at least {self.nlist} vectors, got {vectors.shape[0]}.")
+        self.dimension = vectors.shape[1]
+
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(vectors.shape[0], self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = self._assign(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+
+            # Re-seed empty clusters with random training vectors
+            empty = np.bincount(assignments, minlength=self.nlist) == 0
+            sums[empty] = vectors[rng.choice(vectors.shape[0], int(empty.sum()), replace=False)]
+            centroids = _normalize_rows(sums)
+
+        self.centroids = centroids
+        self._vectors = [np.empty((0, self.dimension), dtype=np.float32) for _ in range(self.nlist)]
+        self._ids = [np.empty(0, dtype=np.int64) for _ in range(self.nlist)]
+        self._sizes = np.zeros(self.nlist, dtype=np.int64)
+        self._locations = {}
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        """
+        Insert vectors, replacing any vector already stored under the same id.
+
+        Args:
+            ids (np.ndarray): Integer ids of shape (N,).
+            vectors (np.ndarray): Vectors of shape (N, dimension).
+        """
+        if not self.is_trained:
+            raise RuntimeError("The index must be trained before adding vectors.")
+
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+        locations = self._location_map()
+        self.remove([i for i in ids.tolist() if i in locations])
+
+        assignments = self._assign(vectors, self.centroids)
+        for list_no in np.unique(assignments).tolist():
+            members = np.flatnonzero(assignments == list_no)
+            start = int(self._sizes[list_no])
+            self._reserve(list_no, start + len(members))
+            self._vectors[list_no][start : start + len(members)] = vectors[members]
+            self._ids[list_no][start : start + len(members)] = ids[members]
+            self._sizes[list_no] += len(members)
+            for offset, vector_id in enumerate(ids[members].tolist()):
+                locations[vector_id] = (list_no, start + offset)
+
+    def remove(self, ids) -> int:
+        """
+        Delete vectors by id; unknown ids are ignored.
+
+        Args:
+            ids: Iterable of integer ids.
+
+        Returns:
+            int: Number of vectors removed.
+        """
+        locations = self._location_map()
+        removed = 0
+        for vector_id in ids:
+            location = locations.pop(int(vector_id), None)
+            if location is None:
+                continue
+            list_no, position = location
+            self._make_writable(list_no)
+
+            # Move the list's last vector into the freed slot
+            last = int(self._sizes[list_no]) - 1
+            if position != last:
+                moved_id = int(self._ids[list_no][last])
+                self._vectors[list_no][position] = self._vectors[list_no][last]
+                self._ids[list_no][position] = moved_id
+                locations[moved_id] = (list_no, position)
+            self._sizes[list_no] = last
+            removed += 1
+        return removed
+
+    def search(
+        self, query: np.ndarray, top_k: int = 5, nprobe: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the approximate nearest neighbours of a query vector.
+
+        Args:
+            query (np.ndarray): Query vector of shape (dimension,) or (1, dimension).
+            top_k (int): Number of neighbours to return.
+            nprobe (Optional[int]): Lists to scan, overriding the index default.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Ids and cosine similarities, best match first.
+        """
+        if not self.is_trained:
+            raise RuntimeError("The index must be trained before searching.")
+
+        query = _normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        coarse = self.centroids @ query
+        probed = np.argpartition(coarse, self.nlist - nprobe)[self.nlist - nprobe :]
+
+        scores, ids = [], []
+        for list_no in probed.tolist():
+            size = int(self._sizes[list_no])
+            if size:
+                scores.append(self._vectors[list_no][:size] @ query)
+                ids.append(self._ids[list_no][:size])
+        if not scores:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores, ids = np.concatenate(scores), np.concatenate(ids)
+        k = min(top_k, len(scores))
+        best = np.argpartition(scores, len(scores) - k)[len(scores) - k :]
+        best = best[np.argsort(scores[best])[::-1]]
+        return ids[best], scores[best]
+
+    def save(self, directory: str) -> None:
+        """
+        Write the index to a directory as flat arrays suitable for memory-mapping.
+
+        Args:
+            directory (str): Target directory, created if missing.
+        """
+        self.write(directory, self.export())
+
+    def export(self) -> Dict[str, Any]:
+        """
+        Copy the index into the flat arrays written by `save`.
+
+        The copy can be written with `write` while the index keeps changing.
+
+        Returns:
+            Dict[str, Any]: Arrays and metadata, keyed by file name.
+        """
+        if not self.is_trained:
+            raise RuntimeError("Only a trained index can be saved.")
+
+        offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        np.cumsum(self._sizes, out=offsets[1:])
+        vectors = np.concatenate(
+            [self._vectors[i][: self._sizes[i]] for i in range(self.nlist)], axis=0
+        )
+        ids = np.concatenate([self._ids[i][: self._sizes[i]] for i in range(self.nlist)])
+        return {
+            CENTROIDS_FILE: self.centroids.copy(),
+            VECTORS_FILE: vectors,
+            IDS_FILE: ids,
+            OFFSETS_FILE: offsets,
+            META_FILE: {"dimension": self.dimension, "nlist": self.nlist, "nprobe": self.nprobe},
+        }
+
+    @staticmethod
+    def write(directory: str, exported: Dict[str, Any]) -> None:
+        """
+        Write arrays returned by `export` to a directory.
+
+        Args:
+            directory (str): Target directory, created if missing.
+            exported (Dict[str, Any]): Output of `export`.
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        # Replace files rather than overwrite them: a loaded index may still map the old ones
+        for name in (CENTROIDS_FILE, VECTORS_FILE, IDS_FILE, OFFSETS_FILE):
+            tmp_path = os.path.join(directory, f"{name}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, exported[name])
+            os.replace(tmp_path, os.path.join(directory, name))
+
+        tmp_path = os.path.join(directory, f"{META_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(exported[META_FILE], f)
+        os.replace(tmp_path, os.path.join(directory, META_FILE))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "IVFIndex":
+        """
+        Load an index written by `save`.
+
+        With `mmap=True` the inverted lists are read-only views into memory-mapped
+        files, so start-up cost does not grow with the index size; a list is copied
+        into memory only when it is first modified.
+
+        Args:
+            directory (str): Directory written by `save`.
+            mmap (bool): Memory-map the stored vectors instead of reading them.
+
+        Returns:
+            IVFIndex: The loaded index.
+        """
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        mmap_mode = "r" if mmap else None
+
+        index = cls(meta["dimension"], meta["nlist"], meta["nprobe"])
+        index.centroids = np.load(os.path.join(directory, CENTROIDS_FILE))
+        vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode=mmap_mode)
+        ids = np.load(os.path.join(directory, IDS_FILE), mmap_mode=mmap_mode)
+        offsets = np.load(os.path.join(directory, OFFSETS_FILE))
+
+        index._vectors = [vectors[offsets[i] : offsets[i + 1]] for i in range(index.nlist)]
+        index._ids = [ids[offsets[i] : offsets[i + 1]] for i in range(index.nlist)]
+        index._sizes = np.diff(offsets)
+        index._locations = None
+        return index
+
+    def _location_map(self) -> Dict[int, Tuple[int, int]]:
+        if self._locations is None:
+            self._locations = {
+                vector_id: (list_no, position)
+                for list_no in range(self.nlist)
+                for position, vector_id in enumerate(
+                    self._ids[list_no][: self._sizes[list_no]].tolist()
+                )
+            }
+        return self._locations
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        assignments = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], chunk_size):
+            chunk = vectors[start : start + chunk_size]
+            assignments[start : start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignments
+
+    def _make_writable(self, list_no: int) -> None:
+        if not self._vectors[list_no].flags.writeable:
+            self._vectors[list_no] = np.array(self._vectors[list_no])
+            self._ids[list_no] = np.array(self._ids[list_no])
+
+    def _reserve(self, list_no: int, size: int) -> None:
+        capacity = self._vectors[list_no].shape[0]
+        if size <= capacity and self._vectors[list_no].flags.writeable:
+            return
+        capacity = max(size, 2 * capacity, 16)
+        used = int(self._sizes[list_no])
+        vectors = np.empty((capacity, self.dimension), dtype=np.float32)
+        ids = np.empty(capacity, dtype=np.int64)
+        vectors[:used] = self._vectors[list_no][:used]
+        ids[:used] = self._ids[list_no][:used]
+        self._vectors[list_no], self._ids[list_no] = vectors, ids
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
@@ -0,0 +1,75 @@
+"""
+Compare recall@k and queries per second of the IVF index against exhaustive search.
+
+Usage:
+    python -m src_models.benchmarks.bench_ann_index --size 200000 --nlist 1024
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src_models.ann_index import IVFIndex
+
+
+def synthetic_embeddings(size: int, dimension: int, identities: int, seed: int) -> np.ndarray:
+    """
+    Generate clustered, L2-normalized vectors resembling face embeddings.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((identities, dimension)).astype(np.float32)
+    labels = rng.integers(0, identities, size)
+    vectors = centers[labels] + 0.5 * rng.standard_normal((size, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=200000, help="Number of gallery vectors")
+    parser.add_argument("--dimension", type=int, default=512, help="Embedding size")
+    parser.add_argument("--queries", type=int, default=200, help="Number of probe queries")
+    parser.add_argument("--top-k", type=int, default=10, help="k of recall@k")
+    parser.add_argument("--nlist", type=int, default=1024, help="Number of IVF lists")
+    parser.add_argument(
+        "--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64], help="nprobe values to sweep"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors = synthetic_embeddings(args.size, args.dimension, args.size // 10, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.choice(args.size, args.queries, replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    # Exhaustive search provides both the baseline throughput and the ground truth
+    start = time.perf_counter()
+    truth = []
+    for query in queries:
+        scores = vectors @ query
+        best = np.argpartition(scores, args.size - args.top_k)[args.size - args.top_k :]
+        truth.append(set(best.tolist()))
+    brute_force_qps = args.queries / (time.perf_counter() - start)
+    print(f"brute force: recall@{args.top_k}=1.000  qps={brute_force_qps:9.1f}")
+
+    index = IVFIndex(nlist=args.nlist)
+    start = time.perf_counter()
+    index.train(vectors[rng.choice(args.size, min(args.size, 64 * args.nlist), replace=False)])
+    index.add(np.arange(args.size), vectors)
+    print(f"index build: {time.perf_counter() - start:.1f}s")
+
+    for nprobe in args.nprobe:
+        start = time.perf_counter()
+        hits = 0
+        for query, expected in zip(queries, truth):
+            ids, _ = index.search(query, args.top_k, nprobe=nprobe)
+            hits += len(expected.intersection(ids.tolist()))
+        qps = args.queries / (time.perf_counter() - start)
+        recall = hits / (args.queries * args.top_k)
+        print(
+            f"ivf nprobe={nprobe:3d}: recall@{args.top_k}={recall:.3f}  qps={qps:9.1f}  "
+            f"speed-up={qps / brute_force_qps:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Compare full-image landmarking with the detector-first cascade on large frames.
+
+Each face image is pasted into a blank frame of the given size (4K by
+default) and landmarked both ways. Reported are the per-image latency of each
+path and, for each, the largest error of the alignment landmarks against the
+landmarks of the original image mapped into the frame, plus the mean absolute
+difference between the two aligned faces.
+
+Usage:
+    python -m src_models.benchmarks.bench_cascade test_images/clear_face.png test_images/cr77.webp --frame 3840 2160
+"""
+import argparse
+import time
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from src_models.models import FACE_DETECTOR, FACE_LANDMARKER
+from src_models.models.utils import ALIGNMENT_LANDMARK_INDICES, align_face, detect_landmarks_cascade
+
+
+def time_per_call(func: Callable[[], Optional[np.ndarray]], iterations: int) -> float:
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def paste_into_frame(
+    image: np.ndarray, width: int, height: int, face_fraction: float
+) -> Tuple[np.ndarray, float, np.ndarray]:
+    """
+    Scale the image to `face_fraction` of the frame height and paste it off-center.
+
+    Returns the frame and the scale and offset mapping image to frame coordinates.
+    """
+    scale = face_fraction * height / image.shape[0]
+    resized = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    frame = np.full((height, width, 3), 96, dtype=np.uint8)
+    y, x = (height - resized.shape[0]) // 3, (width - resized.shape[1]) * 2 // 3
+    frame[y : y + resized.shape[0], x : x + resized.shape[1]] = resized[: height - y, : width - x]
+    return frame, scale, np.array([x, y], dtype=np.float32)
+
+
+def alignment_error(landmarks: np.ndarray, reference: np.ndarray) -> float:
+    return float(
+        np.linalg.norm(landmarks[ALIGNMENT_LANDMARK_INDICES] - reference[ALIGNMENT_LANDMARK_INDICES], axis=1).max()
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("images", nargs="+", help="Face images to paste into the frames")
+    parser.add_argument("--frame", type=int, nargs=2, default=[3840, 2160], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--face-fraction", type=float, default=0.8, help="Pasted image height relative to the frame")
+    parser.add_argument("--detect-side", type=int, default=640, help="Long side the cascade detector runs on")
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'image':<32} {'full ms':>8} {'cascade ms':>10} {'full err px':>11} {'cascade err px':>14} {'aligned MAE':>11}")
+    for path in args.images:
+        image = cv2.imread(path)
+        frame, scale, offset = paste_into_frame(image, *args.frame, args.face_fraction)
+        reference = FACE_LANDMARKER.detect_landmarks(image)
+
+        def full() -> Optional[np.ndarray]:
+            return FACE_LANDMARKER.detect_landmarks(frame)
+
+        def cascade() -> Optional[np.ndarray]:
+            return detect_landmarks_cascade(frame, FACE_LANDMARKER, FACE_DETECTOR, detect_side=args.detect_side)
+
+        full_landmarks, cascade_landmarks = full(), cascade()
+        if reference is None or full_landmarks is None or cascade_landmarks is None:
+            print(
+                f"{path:<32} no face found (original: {reference is not None}, full: {full_landmarks is not None}, "
+                f"cascade: {cascade_landmarks is not None})"
+            )
+            continue
+
+        reference = reference * scale + offset
+        aligned_full, _ = align_face(frame, full_landmarks)
+        aligned_cascade, _ = align_face(frame, cascade_landmarks)
+        aligned_mae = np.abs(aligned_full.astype(np.float32) - aligned_cascade).mean()
+
+        print(
+            f"{path:<32} {time_per_call(full, args.iterations):>8.1f} {time_per_call(cascade, args.iterations):>10.1f} "
+            f"{alignment_error(full_landmarks, reference):>11.2f} {alignment_error(cascade_landmarks, reference):>14.2f} "
+            f"{aligned_mae:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Compare per-upload MIME detection cost: a new libmagic handle per call, a reused
+handle, and the magic-byte fast path used by validate_file_mime.
+
+Usage:
+    python -m src_models.benchmarks.bench_mime_validation test_images/clear_face.png test_images/cr77.webp
+"""
+import argparse
+import time
+from typing import Callable
+
+import magic
+
+from src_models.request_utils import sniff_image_mime
+
+
+def time_per_call(func: Callable[[], object], iterations: int) -> float:
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("images", nargs="+", help="Image files to classify")
+    parser.add_argument("--iterations", type=int, default=200, help="Calls per method")
+    args = parser.parse_args()
+
+    handle = magic.Magic(mime=True)
+    for path in args.images:
+        with open(path, "rb") as f:
+            data = f.read()
+
+        methods = {
+            "new handle": lambda: magic.Magic(mime=True).from_buffer(data),
+            "reused handle": lambda: handle.from_buffer(data),
+            "fast path": lambda: sniff_image_mime(data),
+        }
+        print(f"{path} ({len(data)} bytes): libmagic={handle.from_buffer(data)} fast path={sniff_image_mime(data)}")
+        for name, method in methods.items():
+            print(f"  {name:>14}: {time_per_call(method, args.iterations):9.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Sweep ONNX Runtime session options of the face embedder on CPU and report
+latency and throughput for batch sizes 1-64, plus cold-start time with and
+without the optimized-graph cache.
+
+Usage:
+    python -m src_models.benchmarks.bench_ort_session --intra-threads 1 4 8 --optimization basic all
+"""
+import argparse
+import itertools
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+
+from src_models.models.face_verifier import FaceEmbedderBackbone
+from src_models.models.paths import ModelPaths
+
+
+def time_batches(embedder: FaceEmbedderBackbone, batch_size: int, seconds: float) -> List[float]:
+    images = np.random.default_rng(0).standard_normal((batch_size, 3, 112, 112)).astype(np.float32)
+    embedder.forward_batch(images)
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline or len(latencies) < 3:
+        start = time.perf_counter()
+        embedder.forward_batch(images)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def time_cold_start(model_path: str, optimization: str) -> None:
+    start = time.perf_counter()
+    FaceEmbedderBackbone(model_path, graph_optimization=optimization)
+    uncached = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        FaceEmbedderBackbone(model_path, graph_optimization=optimization, optimized_model_dir=cache_dir)
+        start = time.perf_counter()
+        FaceEmbedderBackbone(model_path, graph_optimization=optimization, optimized_model_dir=cache_dir)
+        cached = time.perf_counter() - start
+    print(f"cold start ({optimization}): {uncached * 1000:.0f} ms, from optimized cache {cached * 1000:.0f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=ModelPaths.FACE_EMBEDDER.value, help="ONNX model path")
+    parser.add_argument("--intra-threads", type=int, nargs="+", default=[0, 1, 4], help="0 is the runtime default")
+    parser.add_argument("--inter-threads", type=int, nargs="+", default=[0])
+    parser.add_argument("--optimization", nargs="+", default=["basic", "extended", "all"])
+    parser.add_argument("--arena", choices=["on", "off", "both"], default="both", help="CPU memory arena")
+    parser.add_argument("--parallel", action="store_true", help="Also sweep parallel execution mode")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--seconds", type=float, default=1.0, help="Measurement time per batch size")
+    args = parser.parse_args()
+
+    arenas = {"on": [True], "off": [False], "both": [True, False]}[args.arena]
+    modes = [False, True] if args.parallel else [False]
+
+    for optimization in args.optimization:
+        time_cold_start(args.model, optimization)
+
+    print(f"{'intra':>5} {'inter':>5} {'mode':>10} {'opt':>8} {'arena':>5} {'batch':>5} "
+          f"{'p50 ms':>9} {'p99 ms':>9} {'img/s':>9}")
+    for intra, inter, parallel, optimization, arena in itertools.product(
+        args.intra_threads, args.inter_threads, modes, args.optimization, arenas
+    ):
+        embedder = FaceEmbedderBackbone(
+            args.model,
+            intra_op_num_threads=intra,
+            inter_op_num_threads=inter,
+            parallel_execution=parallel,
+            graph_optimization=optimization,
+            enable_cpu_mem_arena=arena,
+        )
+        for batch_size in args.batch_sizes:
+            latencies = np.array(time_batches(embedder, batch_size, args.seconds)) * 1000
+            p50, p99 = np.percentile(latencies, [50, 99])
+            print(
+                f"{intra:>5} {inter:>5} {'parallel' if parallel else 'sequential':>10} {optimization:>8} "
+                f"{'on' if arena else 'off':>5} {batch_size:>5} {p50:>9.2f} {p99:>9.2f} "
+                f"{batch_size / (p50 / 1000):>9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Measure /faceapp/compare/ latency under concurrent clients.
+
+Every request uploads distinct bytes (random padding after the image data) so
+the embedding cache cannot serve it. While the load runs, a probe polls
+/faceapp/stats/ to show how long the event loop is blocked.
+
+Usage:
+    python -m src_models.benchmarks.load_test_compare --clients 50 --requests 500
+    python -m src_models.benchmarks.load_test_compare --url http://localhost:8000
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import List, Optional
+
+import httpx
+import numpy as np
+
+
+def unique_upload(image_data: bytes) -> bytes:
+    # Decoders ignore trailing bytes, the cache key does not
+    return image_data + os.urandom(16)
+
+
+def summarize(name: str, latencies: List[float]) -> None:
+    if not latencies:
+        print(f"{name}: no samples")
+        return
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    print(f"{name}: n={len(latencies)} p50={p50:.1f} ms p95={p95:.1f} ms p99={p99:.1f} ms")
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    image_data: bytes,
+    filename: str,
+    clients: int,
+    requests: int,
+    backoff: bool,
+) -> None:
+    latencies: List[float] = []
+    ok_latencies: List[float] = []
+    probe_latencies: List[float] = []
+    statuses: Counter = Counter()
+    remaining = iter(range(requests))
+    done = asyncio.Event()
+
+    async def worker() -> None:
+        for _ in remaining:
+            files = {
+                "image1": (filename, unique_upload(image_data)),
+                "image2": (filename, unique_upload(image_data)),
+            }
+            start = time.perf_counter()
+            response = await client.post("/faceapp/compare/", files=files)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code == 200:
+                ok_latencies.append(latencies[-1])
+            statuses[response.status_code] += 1
+            if response.status_code == 503 and backoff:
+                # Behave like a well-mannered client and honour Retry-After
+                await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+
+    async def probe() -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get("/faceapp/stats/")
+            probe_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.05)
+
+    probe_task = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe_task
+
+    print(f"{requests} requests from {clients} clients in {elapsed:.1f} s ({requests / elapsed:.1f} req/s)")
+    print(f"status codes: {dict(statuses)}")
+    summarize("compare (all)", latencies)
+    summarize("compare (200 only)", ok_latencies)
+    summarize("stats probe", probe_latencies)
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    with open(args.image, "rb") as f:
+        image_data = f.read()
+    filename = os.path.basename(args.image)
+
+    transport: Optional[httpx.AsyncBaseTransport] = None
+    base_url = args.url
+    if base_url is None:
+        # Serve the app in-process; the models are loaded on import
+        from src_models.main import app
+
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://testserver"
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=None) as client:
+        # Warm up the models before measuring
+        files = {"image1": (filename, image_data), "image2": (filename, image_data)}
+        await client.post("/faceapp/compare/", files=files)
+        await run_load(client, image_data, filename, args.clients, args.requests, not args.no_backoff)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=50, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=500, help="Total compare requests")
+    parser.add_argument("--image", default="test_images/clear_face.png", help="Face image to upload")
+    parser.add_argument("--no-backoff", action="store_true", help="Retry rejected requests immediately")
+    parser.add_argument("--url", default=None, help="Base URL of a running service; in-process when omitted")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+from typing import Optional
+
+# Verification threshold on the (cosine + 1) / 2 score at start-up; POST /set_threshold changes it at runtime
+SIMILARITY_THRESHOLD: float = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
+
+# Micro-batching of embedder inference across concurrent requests
+EMBEDDER_MAX_BATCH_SIZE: int = int(os.getenv("EMBEDDER_MAX_BATCH_SIZE", "32"))
+EMBEDDER_MAX_WAIT_MS: float = float(os.getenv("EMBEDDER_MAX_WAIT_MS", "5"))
+# Batches run on the shared session at once; further submissions queue into the next batch
+EMBEDDER_MAX_CONCURRENT_RUNS: int = int(os.getenv("EMBEDDER_MAX_CONCURRENT_RUNS", "1"))
+
+# Parallel inference: MediaPipe model instances (one per concurrent pipeline) and
+# ONNX Runtime threads per embedder run. The default splits the cores between the
+# concurrent runs so they do not oversubscribe the CPU; 0 leaves it to ONNX Runtime,
+# which uses every core in each run
+_CPU_COUNT = os.cpu_count() or 1
+MODEL_POOL_SIZE: int = int(os.getenv("MODEL_POOL_SIZE", str(_CPU_COUNT)))
+ORT_INTRA_OP_THREADS: int = int(
+    os.getenv("ORT_INTRA_OP_THREADS", str(max(1, _CPU_COUNT // EMBEDDER_MAX_CONCURRENT_RUNS)))
+)
+
+# ONNX Runtime session options of the embedder
+ORT_INTER_OP_THREADS: int = int(os.getenv("ORT_INTER_OP_THREADS", "0"))
+ORT_PARALLEL_EXECUTION: bool = os.getenv("ORT_PARALLEL_EXECUTION", "false").lower() == "true"
+ORT_GRAPH_OPTIMIZATION: str = os.getenv("ORT_GRAPH_OPTIMIZATION", "all")
+ORT_ENABLE_CPU_MEM_ARENA: bool = os.getenv("ORT_ENABLE_CPU_MEM_ARENA", "true").lower() == "true"
+ORT_OPTIMIZED_MODEL_DIR: str = os.getenv("ORT_OPTIMIZED_MODEL_DIR", "")
+# "int8" serves the quantized embedder written by src_models.tools.quantize_embedder
+EMBEDDER_PRECISION: str = os.getenv("EMBEDDER_PRECISION", "fp32")
+
+# Warm-up run after the models load, before the readiness probe passes;
+# WARMUP_BATCH_SIZES is comma-separated, powers of two up to EMBEDDER_MAX_BATCH_SIZE when unset
+WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_IMAGE: str = os.getenv("WARMUP_IMAGE", "test_images/clear_face.png")
+WARMUP_BATCH_SIZES: str = os.getenv("WARMUP_BATCH_SIZES", "")
+
+# Bounded executor running decode and face preprocessing off the event loop
+PREPROCESS_WORKERS: int = int(os.getenv("PREPROCESS_WORKERS", str(MODEL_POOL_SIZE)))
+PREPROCESS_QUEUE_SIZE: int = int(os.getenv("PREPROCESS_QUEUE_SIZE", str(4 * PREPROCESS_WORKERS)))
+# Worker processes for face preprocessing (0 keeps it in the serving process);
+# PREPROCESS_WORKERS threads hand work to them, so use at least as many threads
+PREPROCESS_PROCESSES: int = int(os.getenv("PREPROCESS_PROCESSES", "0"))
+
+# Reduced-resolution JPEG decoding: smallest long side to decode large uploads at (0 disables),
+# and the iris distance below which the face is re-cropped from the full-resolution image
+DECODE_TARGET_SIDE: int = int(os.getenv("DECODE_TARGET_SIDE", "1024"))
+DECODE_MIN_EYE_DISTANCE: float = float(os.getenv("DECODE_MIN_EYE_DISTANCE", "48"))
+
+# Detector-first cascade: find the face on a copy downscaled to CASCADE_DETECT_SIDE and run
+# the landmarker only on a region CASCADE_CROP_SCALE times the face box around it
+LANDMARK_CASCADE: bool = os.getenv("LANDMARK_CASCADE", "false").lower() == "true"
+CASCADE_DETECT_SIDE: int = int(os.getenv("CASCADE_DETECT_SIDE", "640"))
+CASCADE_CROP_SCALE: float = float(os.getenv("CASCADE_CROP_SCALE", "1.5"))
+
+# Faces the landmarker finds per image; above 1, /faceapp/compare/ and /faceapp/compare_video/
+# default to matching the reference against every face instead of the first one
+MAX_FACES: int = int(os.getenv("MAX_FACES", "1"))
+
+# How the aligned face is cropped: "detector" runs face detection on the aligned image,
+# "landmarks" derives the box from the aligned landmarks and runs detection only on
+# a CROP_VALIDATION_RATE fraction of faces to report how often the two disagree
+CROP_MODE: str = os.getenv("CROP_MODE", "detector")
+CROP_VALIDATION_RATE: float = float(os.getenv("CROP_VALIDATION_RATE", "0"))
+
+# Content-addressed embedding cache for repeated uploads
+EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_DIR: str = os.getenv("EMBEDDING_CACHE_DIR", "")
+EMBEDDING_MODEL_VERSION: str = os.getenv("EMBEDDING_MODEL_VERSION", "")
+
+# Enrolled gallery for 1:N identification
+GALLERY_DIR: str = os.getenv("GALLERY_DIR", "")
+GALLERY_SNAPSHOT_EVERY: int = int(os.getenv("GALLERY_SNAPSHOT_EVERY", "10000"))
+IDENTIFY_TOP_K: int = int(os.getenv("IDENTIFY_TOP_K", "5"))
+
+# Approximate gallery search ("flat" for exhaustive search, "ivf" for an IVF index)
+GALLERY_INDEX: str = os.getenv("GALLERY_INDEX", "flat")
+IVF_NLIST: int = int(os.getenv("IVF_NLIST", "1024"))
+IVF_NPROBE: int = int(os.getenv("IVF_NPROBE", "16"))
+IVF_MIN_TRAIN_SIZE: int = int(os.getenv("IVF_MIN_TRAIN_SIZE", "50000"))
+
+# Video frame sampling
+VIDEO_SAMPLE_BY_TIMESTAMP: bool = os.getenv("VIDEO_SAMPLE_BY_TIMESTAMP", "false").lower() == "true"
+VIDEO_ADAPTIVE_SAMPLING: bool = os.getenv("VIDEO_ADAPTIVE_SAMPLING", "false").lower() == "true"
+VIDEO_ADAPTIVE_MIN_FRAMES: int = int(os.getenv("VIDEO_ADAPTIVE_MIN_FRAMES", "3"))
+VIDEO_ADAPTIVE_MAX_FRAMES: int = int(os.getenv("VIDEO_ADAPTIVE_MAX_FRAMES", "15"))
+VIDEO_ADAPTIVE_STEP: int = int(os.getenv("VIDEO_ADAPTIVE_STEP", "2"))
+VIDEO_ADAPTIVE_Z_SCORE: float = float(os.getenv("VIDEO_ADAPTIVE_Z_SCORE", "2.0"))
+# Seek instead of decoding through gaps of more frames than this. A seek decodes from the
+# previous keyframe, so it pays off beyond about one keyframe interval; "off" never seeks,
+# which only suits encodes with very long keyframe intervals
+_VIDEO_MAX_GRAB_GAP = os.getenv("VIDEO_MAX_GRAB_GAP", "100")
+VIDEO_MAX_GRAB_GAP: Optional[int] = None if _VIDEO_MAX_GRAB_GAP.lower() == "off" else int(_VIDEO_MAX_GRAB_GAP)
+
+# Video frame quality selection: VIDEO_CANDIDATE_FRAMES frames are landmarked and scored
+# for sharpness, face size and pose, and only the VIDEO_QUALITY_TOP_K best are embedded and
+# averaged with their quality as weight. Tracking implies selection: the candidates are
+# landmarked in MediaPipe's video running mode, which looks for the face where it was in
+# the previous frame before running the face detector
+VIDEO_QUALITY_SELECTION: bool = os.getenv("VIDEO_QUALITY_SELECTION", "false").lower() == "true"
+VIDEO_TRACKING: bool = os.getenv("VIDEO_TRACKING", "false").lower() == "true"
+VIDEO_CANDIDATE_FRAMES: int = int(os.getenv("VIDEO_CANDIDATE_FRAMES", "15"))
+VIDEO_QUALITY_TOP_K: int = int(os.getenv("VIDEO_QUALITY_TOP_K", "3"))
+
+# Largest accepted request body and video upload, in bytes
+MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", str(512 * 1024 * 1024)))
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    A content-addressed cache of face embeddings keyed by the raw upload bytes.
+
+    Entries live in a bounded in-memory LRU; when `disk_dir` is set, they are
+    also written to disk as `.npy` files so they survive restarts and can be
+    shared between workers.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        disk_dir: Optional[str] = None,
+        model_version: str = "",
+        pipeline: str = "",
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries (int): Maximum number of in-memory entries; 0 disables the cache.
+            disk_dir (Optional[str]): Directory of the on-disk tier, or None to keep entries in memory only.
+            model_version (str): Identifier of the embedding model, mixed into every key.
+            pipeline (str): Identifier of the preprocessing settings that change embeddings, mixed into every key.
+        """
+        self.max_entries: int = max_entries
+        self.disk_dir: Optional[str] = disk_dir
+        self.model_version: str = model_version
+        self.pipeline: str = pipeline
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def key(self, data: bytes) -> str:
+        """
+        Compute the cache key of an upload.
+
+        Args:
+            data (bytes): The raw upload bytes.
+
+        Returns:
+            str: Hex digest of the model version, preprocessing settings and upload content.
+        """
+        digest = hashlib.blake2b(digest_size=16, person=b"face-embedding")
+        digest.update(self.model_version.encode())
+        if self.pipeline:
+            digest.update(b"\0" + self.pipeline.encode())
+        digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Look up an embedding, promoting disk hits into memory.
+
+        Args:
+            key (str): Key returned by `key`.
+
+        Returns:
+            Optional[np.ndarray]: The cached embedding, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+        embedding = self._load_from_disk(key)
+        if embedding is not None:
+            self._store_in_memory(key, embedding)
+            with self._lock:
+                self.disk_hits += 1
+            return embedding
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, embedding: np.ndarray) -> None:
+        """
+        Store an embedding in memory and, if configured, on disk.
+
+        Args:
+            key (str): Key returned by `key`.
+            embedding (np.ndarray): The embedding to cache.
+        """
+        if not self.enabled:
+            return
+
+        embedding = np.array(embedding, dtype=np.float32, copy=True)
+        embedding.flags.writeable = False
+        self._store_in_memory(key, embedding)
+        self._save_to_disk(key, embedding)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return hit, miss and eviction counters.
+
+        Returns:
+            Dict[str, Any]: Cache counters and current size.
+        """
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def _store_in_memory(self, key: str, embedding: np.ndarray) -> None:
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.npy")
+
+    def _load_from_disk(self, key: str) -> Optional[np.ndarray]:
+        if not self.disk_dir:
+            return None
+        try:
+            embedding = np.load(self._disk_path(key), allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+        embedding.flags.writeable = False
+        return embedding
+
+    def _save_to_disk(self, key: str, embedding: np.ndarray) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                np.save(tmp, embedding, allow_pickle=False)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
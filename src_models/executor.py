@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, TypeVar
+
+from fastapi import HTTPException
+
+T = TypeVar("T")
+
+
+class BoundedExecutor:
+    """
+    A thread pool for CPU-bound request work with bounded admission.
+
+    Requests enter through `admit`: at most `max_workers + max_queue` of them
+    are in flight at once, and further ones are rejected with 503 straight away
+    rather than queued. Rejecting whole requests up front means no work is
+    wasted on requests that would be dropped halfway, and under overload the
+    latency of admitted requests stays bounded by the queue depth instead of
+    growing with the number of clients.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, thread_name_prefix: str = "preprocess"):
+        """
+        Initialize the executor.
+
+        Args:
+            max_workers (int): Number of worker threads.
+            max_queue (int): Requests admitted beyond `max_workers` that wait for a worker.
+            thread_name_prefix (str): Name prefix of the worker threads.
+        """
+        self.max_workers: int = max(max_workers, 1)
+        self.max_queue: int = max(max_queue, 0)
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=thread_name_prefix)
+        self._lock = threading.Lock()
+        self.in_flight: int = 0
+        self.completed: int = 0
+        self.rejected: int = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    @contextmanager
+    def admit(self) -> Iterator[None]:
+        """
+        Admit a request for the duration of a `with` block.
+
+        Raises:
+            HTTPException: With status 503 if the executor is saturated.
+        """
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Server is busy, retry later.",
+                    headers={"Retry-After": "1"},
+                )
+            self.in_flight += 1
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Run a blocking function on a worker thread.
+
+        Args:
+            func (Callable[..., T]): The function to call.
+            *args: Positional arguments of `func`.
+
+        Returns:
+            T: The return value of `func`.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the executor load counters.
+
+        Returns:
+            Dict[str, Any]: Settings, admitted requests in flight, completed and rejected requests.
+        """
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,466 @@
+import base64
+import json
+import os
+import re
+import shutil
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src_models.ann_index import IVFIndex
+
+EMBEDDINGS_FILE = "embeddings.npy"
+SUBJECTS_FILE = "subjects.json"
+INDEX_DIR = "ivf_index"
+# Names the snapshot directory in use; without it the files above sit in the storage directory itself
+CURRENT_FILE = "CURRENT"
+SNAPSHOT_DIR_PATTERN = "snapshot-{:08d}"
+# Changes made after snapshot n are appended to journal n and later ones
+JOURNAL_FILE_PATTERN = "journal-{:08d}.log"
+_JOURNAL_FILE_RE = re.compile(r"journal-(\d{8})\.log$")
+
+
+class FaceGallery:
+    """
+    An in-memory gallery of enrolled face embeddings, one template per subject.
+
+    Templates are kept L2-normalized in a contiguous float32 matrix so that a
+    probe is scored against the whole gallery with a single matrix-vector
+    product. When an IVF index is attached, it is built in a background thread
+    once the gallery is large enough to train it, and searches go through it
+    from then on.
+
+    Changes are persisted by appending them to a journal; every
+    `snapshot_every` changes the whole gallery is written to a new snapshot in
+    a background thread, and loading replays the journal on top of the latest
+    snapshot. Searches score a view of the matrix outside the lock: a change
+    to rows a view may still be reading first copies the matrix.
+    """
+
+    def __init__(
+        self,
+        storage_dir: Optional[str] = None,
+        initial_capacity: int = 1024,
+        index: Optional[IVFIndex] = None,
+        index_min_size: int = 0,
+        snapshot_every: int = 10000,
+    ):
+        """
+        Initialize the gallery, loading persisted templates if present.
+
+        Args:
+            storage_dir (Optional[str]): Directory to persist the gallery in, or None to keep it in memory only.
+            initial_capacity (int): Number of rows preallocated on first enrollment.
+            index (Optional[IVFIndex]): Approximate index used for search, or None for exhaustive search.
+            index_min_size (int): Gallery size at which the index is trained; below it search is exhaustive.
+            snapshot_every (int): Journaled changes after which a new snapshot is written.
+        """
+        self.storage_dir: Optional[str] = storage_dir
+        self.initial_capacity: int = initial_capacity
+        self.index: Optional[IVFIndex] = index
+        self.index_min_size: int = max(index_min_size, index.nlist if index is not None else 0)
+        self.snapshot_every: int = snapshot_every
+        self._matrix: Optional[np.ndarray] = None
+        self._subject_ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Whether a search or snapshot may still read the current matrix or subject list
+        self._matrix_shared: bool = False
+        self._ids_shared: bool = False
+        # Sequence number of the latest snapshot; new changes go to its journal
+        self._sequence: int = 0
+        self._journal = None
+        self._journal_records: int = 0
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_thread: Optional[threading.Thread] = None
+        # Rows changed while the index is being built, or None when no build is running
+        self._index_dirty_rows: Optional[Set[int]] = None
+        self._index_thread: Optional[threading.Thread] = None
+
+        if self.storage_dir:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._subject_ids)
+
+    def __contains__(self, subject_id: str) -> bool:
+        return subject_id in self._rows
+
+    @property
+    def subject_ids(self) -> List[str]:
+        return list(self._subject_ids)
+
+    def enroll(self, subject_id: str, embedding: np.ndarray) -> bool:
+        """
+        Enroll a subject, replacing its template if it is already enrolled.
+
+        Args:
+            subject_id (str): Identifier of the subject.
+            embedding (np.ndarray): Face embedding of shape (D,) or (1, D).
+
+        Returns:
+            bool: True if the subject was newly added, False if its template was replaced.
+        """
+        template = _normalize(np.asarray(embedding, dtype=np.float32).reshape(-1))
+
+        with self._lock:
+            created = self._enroll(subject_id, template)
+            self._append_journal(
+                {"op": "enroll", "subject_id": subject_id, "embedding": base64.b64encode(template.tobytes()).decode()}
+            )
+
+        self._snapshot_if_due()
+        return created
+
+    def remove(self, subject_id: str) -> bool:
+        """
+        Remove a subject from the gallery.
+
+        Args:
+            subject_id (str): Identifier of the subject.
+
+        Returns:
+            bool: True if the subject was enrolled and has been removed.
+        """
+        with self._lock:
+            removed = self._remove(subject_id)
+            if removed:
+                self._append_journal({"op": "remove", "subject_id": subject_id})
+
+        if removed:
+            self._snapshot_if_due()
+        return removed
+
+    def search(self, embedding: np.ndarray, top_k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Score a probe embedding against every enrolled template.
+
+        Args:
+            embedding (np.ndarray): Probe embedding of shape (D,) or (1, D).
+            top_k (int): Number of best matches to return.
+
+        Returns:
+            List[Tuple[str, float]]: (subject_id, cosine similarity) pairs, best match first.
+        """
+        probe = _normalize(np.asarray(embedding, dtype=np.float32).reshape(-1))
+
+        with self._lock:
+            count = len(self._subject_ids)
+            if count == 0 or top_k <= 0:
+                return []
+
+            if self.index is not None and self.index.is_trained:
+                rows, scores = self.index.search(probe, top_k)
+                return [(self._subject_ids[row], float(score)) for row, score in zip(rows, scores)]
+
+            matrix, subject_ids = self._share()
+
+        # Concurrent searches score in parallel; writers leave these views untouched
+        scores = matrix @ probe
+
+        k = min(top_k, count)
+        if k < count:
+            candidates = np.argpartition(scores, count - k)[count - k :]
+        else:
+            candidates = np.arange(count)
+        best = candidates[np.argsort(scores[candidates])[::-1]]
+        return [(subject_ids[i], float(scores[i])) for i in best]
+
+    def save(self) -> None:
+        """
+        Write a snapshot of the gallery to `storage_dir`, if configured, and start a new journal.
+
+        The gallery stays available while the snapshot is written; only taking
+        it holds the lock.
+        """
+        if not self.storage_dir:
+            return
+
+        with self._snapshot_lock:
+            with self._lock:
+                matrix, subject_ids = self._share()
+                subject_ids = subject_ids[: matrix.shape[0]]
+                sequence = self._sequence + 1
+                snapshot_dir = os.path.join(self.storage_dir, SNAPSHOT_DIR_PATTERN.format(sequence))
+                os.makedirs(snapshot_dir, exist_ok=True)
+                index = self.index.export() if self.index is not None and self.index.is_trained else None
+                # Changes from here on belong to the new snapshot's journal
+                self._close_journal()
+                self._sequence, self._journal_records = sequence, 0
+
+            _atomic_write(
+                os.path.join(snapshot_dir, EMBEDDINGS_FILE),
+                lambda f: np.save(f, matrix, allow_pickle=False),
+            )
+            _atomic_write(
+                os.path.join(snapshot_dir, SUBJECTS_FILE),
+                lambda f: f.write(json.dumps(subject_ids).encode()),
+            )
+            if index is not None:
+                IVFIndex.write(os.path.join(snapshot_dir, INDEX_DIR), index)
+            _atomic_write(os.path.join(self.storage_dir, CURRENT_FILE), lambda f: f.write(str(sequence).encode()))
+            self._remove_files_before(sequence)
+
+    def load(self) -> None:
+        """
+        Load the latest snapshot from `storage_dir` and replay the changes journaled since.
+        """
+        current_path = os.path.join(self.storage_dir, CURRENT_FILE)
+        if os.path.exists(current_path):
+            with open(current_path) as f:
+                sequence = int(f.read())
+            snapshot_dir = os.path.join(self.storage_dir, SNAPSHOT_DIR_PATTERN.format(sequence))
+        else:
+            # Galleries saved before journaling keep their files in the storage directory itself
+            sequence, snapshot_dir = 0, self.storage_dir
+
+        with self._lock:
+            self._close_journal()
+            self._matrix, self._subject_ids, self._rows = None, [], {}
+            self._matrix_shared = self._ids_shared = False
+
+            embeddings_path = os.path.join(snapshot_dir, EMBEDDINGS_FILE)
+            subjects_path = os.path.join(snapshot_dir, SUBJECTS_FILE)
+            if os.path.exists(embeddings_path) and os.path.exists(subjects_path):
+                matrix = np.load(embeddings_path, allow_pickle=False)
+                with open(subjects_path) as f:
+                    subject_ids = json.load(f)
+                if len(subject_ids) != matrix.shape[0]:
+                    raise ValueError("Gallery subjects and embeddings are out of sync.")
+                if subject_ids:
+                    self._ensure_capacity(len(subject_ids), matrix.shape[1])
+                    self._matrix[: len(subject_ids)] = matrix
+                self._subject_ids = list(subject_ids)
+                self._rows = {subject_id: row for row, subject_id in enumerate(subject_ids)}
+
+                # Memory-map the saved index rather than retraining it on start-up
+                index_dir = os.path.join(snapshot_dir, INDEX_DIR)
+                if self.index is not None and os.path.exists(index_dir):
+                    nprobe = self.index.nprobe
+                    self.index = IVFIndex.load(index_dir, mmap=True)
+                    self.index.nprobe = nprobe
+
+            # A snapshot interrupted before CURRENT was updated leaves later journals behind
+            self._sequence, self._journal_records = sequence, 0
+            for journal_sequence, path in self._journal_paths():
+                if journal_sequence < sequence:
+                    continue
+                self._sequence = journal_sequence
+                self._journal_records = self._replay(path)
+
+    def build_index(self) -> None:
+        """
+        Train the attached index on the enrolled templates and switch searches to it.
+
+        Training runs without holding the lock, on a view of the templates taken
+        when it starts; changes made in the meantime are applied to the new index
+        before it is put in place. Does nothing if there is no index to build or
+        a build is already running.
+        """
+        with self._lock:
+            if self.index is None or self.index.is_trained or self._index_dirty_rows is not None:
+                return
+            matrix, _ = self._share()
+            self._index_dirty_rows = set()
+
+        index = IVFIndex(nlist=self.index.nlist, nprobe=self.index.nprobe)
+        try:
+            index.train(matrix)
+            index.add(np.arange(matrix.shape[0]), matrix)
+        except Exception:
+            with self._lock:
+                self._index_dirty_rows = None
+            raise
+
+        with self._lock:
+            count = len(self._subject_ids)
+            changed = sorted(self._index_dirty_rows)
+            index.remove([row for row in changed if row >= count])
+            rows = [row for row in changed if row < count]
+            if rows:
+                index.add(rows, self._matrix[rows])
+            self.index, self._index_dirty_rows = index, None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the gallery size and allocation.
+
+        Returns:
+            Dict[str, Any]: Number of subjects, allocated rows and embedding size.
+        """
+        with self._lock:
+            return {
+                "subjects": len(self._subject_ids),
+                "capacity": 0 if self._matrix is None else self._matrix.shape[0],
+                "dimension": 0 if self._matrix is None else self._matrix.shape[1],
+                "indexed": self.index is not None and self.index.is_trained,
+            }
+
+    def _enroll(self, subject_id: str, template: np.ndarray) -> bool:
+        self._ensure_capacity(len(self._subject_ids) + 1, template.shape[0])
+        row = self._rows.get(subject_id)
+        created = row is None
+        if created:
+            # Appending leaves the rows and subjects a search may be reading untouched
+            row = len(self._subject_ids)
+            self._subject_ids.append(subject_id)
+            self._rows[subject_id] = row
+        else:
+            self._unshare_matrix()
+        self._matrix[row] = template
+        self._update_index([row])
+        return created
+
+    def _remove(self, subject_id: str) -> bool:
+        row = self._rows.pop(subject_id, None)
+        if row is None:
+            return False
+
+        # Move the last template into the freed row to keep the matrix dense
+        self._unshare_matrix()
+        self._unshare_ids()
+        last = len(self._subject_ids) - 1
+        if row != last:
+            moved_id = self._subject_ids[last]
+            self._matrix[row] = self._matrix[last]
+            self._subject_ids[row] = moved_id
+            self._rows[moved_id] = row
+        self._subject_ids.pop()
+
+        if self.index is not None and self.index.is_trained:
+            self.index.remove([last])
+            if row != last:
+                self.index.add([row], self._matrix[row : row + 1])
+        elif self._index_dirty_rows is not None:
+            self._index_dirty_rows.update((row, last))
+        return True
+
+    def _share(self) -> Tuple[np.ndarray, List[str]]:
+        # Hand out views for reading outside the lock; the next change copies before writing
+        count = len(self._subject_ids)
+        if self._matrix is None:
+            return np.zeros((0, 0), dtype=np.float32), []
+        self._matrix_shared = self._ids_shared = True
+        return self._matrix[:count], self._subject_ids
+
+    def _unshare_matrix(self) -> None:
+        if self._matrix_shared:
+            self._matrix = self._matrix.copy()
+            self._matrix_shared = False
+
+    def _unshare_ids(self) -> None:
+        if self._ids_shared:
+            self._subject_ids = list(self._subject_ids)
+            self._ids_shared = False
+
+    def _append_journal(self, record: Dict[str, Any]) -> None:
+        if not self.storage_dir:
+            return
+        if self._journal is None:
+            os.makedirs(self.storage_dir, exist_ok=True)
+            path = os.path.join(self.storage_dir, JOURNAL_FILE_PATTERN.format(self._sequence))
+            self._journal = open(path, "ab")
+            # Start on a fresh line if an earlier process died in the middle of a record
+            if self._journal.tell() > 0:
+                with open(path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        self._journal.write(b"\n")
+        self._journal.write(json.dumps(record).encode() + b"\n")
+        self._journal.flush()
+        self._journal_records += 1
+
+    def _close_journal(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _journal_paths(self) -> List[Tuple[int, str]]:
+        paths = []
+        for name in os.listdir(self.storage_dir) if os.path.isdir(self.storage_dir) else []:
+            match = _JOURNAL_FILE_RE.match(name)
+            if match:
+                paths.append((int(match.group(1)), os.path.join(self.storage_dir, name)))
+        return sorted(paths)
+
+    def _replay(self, path: str) -> int:
+        records = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A record cut short by a crash
+                    continue
+                if record["op"] == "enroll":
+                    template = np.frombuffer(base64.b64decode(record["embedding"]), dtype=np.float32)
+                    self._enroll(record["subject_id"], template.copy())
+                else:
+                    self._remove(record["subject_id"])
+                records += 1
+        return records
+
+    def _snapshot_if_due(self) -> None:
+        if not self.storage_dir or self._journal_records < self.snapshot_every:
+            return
+        with self._lock:
+            if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+                return
+            self._snapshot_thread = threading.Thread(target=self.save, name="gallery-snapshot", daemon=True)
+            self._snapshot_thread.start()
+
+    def _remove_files_before(self, sequence: int) -> None:
+        for journal_sequence, path in self._journal_paths():
+            if journal_sequence < sequence:
+                os.remove(path)
+        for name in os.listdir(self.storage_dir):
+            path = os.path.join(self.storage_dir, name)
+            if name.startswith("snapshot-") and name != SNAPSHOT_DIR_PATTERN.format(sequence):
+                shutil.rmtree(path, ignore_errors=True)
+        # Files of a gallery saved before journaling
+        for name in (EMBEDDINGS_FILE, SUBJECTS_FILE):
+            if os.path.exists(os.path.join(self.storage_dir, name)):
+                os.remove(os.path.join(self.storage_dir, name))
+        shutil.rmtree(os.path.join(self.storage_dir, INDEX_DIR), ignore_errors=True)
+
+    def _update_index(self, rows: List[int]) -> None:
+        if self.index is None:
+            return
+        if self.index.is_trained:
+            self.index.add(rows, self._matrix[rows])
+        elif self._index_dirty_rows is not None:
+            self._index_dirty_rows.update(rows)
+        elif len(self._subject_ids) >= self.index_min_size and not (
+            self._index_thread is not None and self._index_thread.is_alive()
+        ):
+            # Train once the gallery is large enough, away from the request that crossed the threshold
+            self._index_thread = threading.Thread(target=self.build_index, name="gallery-index", daemon=True)
+            self._index_thread.start()
+
+    def _ensure_capacity(self, rows: int, dimension: int) -> None:
+        if self._matrix is None:
+            self._matrix = np.zeros((max(self.initial_capacity, rows), dimension), dtype=np.float32)
+            return
+        if self._matrix.shape[1] != dimension:
+            raise ValueError(
+                f"Embedding size {dimension} does not match gallery size {self._matrix.shape[1]}."
+            )
+        if rows > self._matrix.shape[0]:
+            grown = np.zeros((max(rows, 2 * self._matrix.shape[0]), dimension), dtype=np.float32)
+            grown[: len(self._subject_ids)] = self._matrix[: len(self._subject_ids)]
+            self._matrix, self._matrix_shared = grown, False
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        raise ValueError("Cannot normalize a zero embedding.")
+    return vector / norm
+
+
+def _atomic_write(path: str, write) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,102 @@
+import struct
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# JPEG start-of-frame markers; C4 (DHT), C8 (JPG) and CC (DAC) share the range but are not frames
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field
+_JPEG_STANDALONE_MARKERS = set(range(0xD0, 0xDA)) | {0x01}
+
+
+def jpeg_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Read the width and height of a JPEG from its start-of-frame segment.
+
+    Args:
+        data (bytes): The binary content of the file.
+
+    Returns:
+        Optional[Tuple[int, int]]: (width, height), or None if `data` is not a readable JPEG header.
+    """
+    if not data.startswith(b"\xff\xd8"):
+        return None
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            position += 1
+            continue
+        if marker in _JPEG_STANDALONE_MARKERS:
+            position += 2
+            continue
+        (length,) = struct.unpack(">H", data[position + 2 : position + 4])
+        if marker in _JPEG_SOF_MARKERS:
+            if position + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[position + 5 : position + 9])
+            return width, height
+        if marker == 0xDA:
+            # Entropy-coded data follows the start of scan; no frame header was found
+            return None
+        position += 2 + length
+    return None
+
+
+def jpeg_reduction_factor(data: bytes, target_side: int) -> int:
+    """
+    Choose how much a JPEG can be downscaled while decoding.
+
+    Args:
+        data (bytes): The binary content of the file.
+        target_side (int): Smallest acceptable long side of the decoded image; 0 disables reduction.
+
+    Returns:
+        int: 1, 2, 4 or 8; always 1 for non-JPEG data or unreadable headers.
+    """
+    dimensions = jpeg_dimensions(data) if target_side > 0 else None
+    if dimensions is None:
+        return 1
+    long_side = max(dimensions)
+    factor = 1
+    while factor < 8 and long_side / (factor * 2) >= target_side:
+        factor *= 2
+    return factor
+
+
+def decode_image(
+    data: bytes, target_side: int = 0
+) -> Tuple[Optional[np.ndarray], Optional[Callable[[], Optional[np.ndarray]]]]:
+    """
+    Decode an image, downscaling large JPEGs during decoding.
+
+    JPEGs are decoded with libjpeg's DCT scaling (IMREAD_REDUCED_COLOR_*),
+    which never materializes the full-resolution image, so decode time and
+    memory follow `target_side` rather than the camera resolution. Other
+    formats are decoded at full resolution.
+
+    Args:
+        data (bytes): The binary content of the file.
+        target_side (int): Smallest acceptable long side of the decoded image; 0 disables reduction.
+
+    Returns:
+        Tuple[Optional[np.ndarray], Optional[Callable[[], Optional[np.ndarray]]]]: The decoded BGR image
+            (None if decoding failed) and, if it was reduced, a function decoding it at full resolution.
+    """
+    image_array = np.frombuffer(data, dtype=np.uint8)
+    factor = jpeg_reduction_factor(data, target_side)
+    image = cv2.imdecode(image_array, REDUCED_DECODE_FLAGS[factor])
+    if image is None or factor == 1:
+        return image, None
+    return image, lambda: cv2.imdecode(image_array, cv2.IMREAD_COLOR)
@@ -1,29 +1,120 @@
 import asyncio
-import tempfile
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
-import cv2
 import numpy as np
-from fastapi import FastAPI, File, Header, HTTPException, UploadFile
+from fastapi import FastAPI, File, Header, HTTPException, Query, Request, UploadFile
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from uuid import uuid4
 
-from src_models.models import FACE_VERIFIER
-from src_models.models.utils import cosine_similarity
-from src_models.request_utils import process_image, process_image_sync
+from src_models.ann_index import IVFIndex
+from src_models.config import (
+    EMBEDDER_MAX_BATCH_SIZE,
+    GALLERY_DIR,
+    GALLERY_INDEX,
+    GALLERY_SNAPSHOT_EVERY,
+    IDENTIFY_TOP_K,
+    IVF_MIN_TRAIN_SIZE,
+    IVF_NLIST,
+    IVF_NPROBE,
+    MAX_FACES,
+    MAX_UPLOAD_BYTES,
+    SIMILARITY_THRESHOLD,
+    VIDEO_ADAPTIVE_MAX_FRAMES,
+    VIDEO_ADAPTIVE_MIN_FRAMES,
+    VIDEO_ADAPTIVE_SAMPLING,
+    VIDEO_ADAPTIVE_STEP,
+    VIDEO_ADAPTIVE_Z_SCORE,
+    VIDEO_MAX_GRAB_GAP,
+    VIDEO_CANDIDATE_FRAMES,
+    VIDEO_QUALITY_SELECTION,
+    VIDEO_QUALITY_TOP_K,
+    VIDEO_SAMPLE_BY_TIMESTAMP,
+    VIDEO_TRACKING,
+    WARMUP_BATCH_SIZES,
+    WARMUP_ENABLED,
+    WARMUP_IMAGE,
+)
+from src_models.gallery import FaceGallery
+from src_models.models import FACE_BATCHER, FACE_MODEL_POOL, FACE_VERIFIER, FACE_VIDEO_LANDMARKER_POOL, MODELS
+from src_models.models.utils import CROP_VALIDATOR, cosine_similarities, cosine_similarity
+from src_models.request_utils import (
+    EMBEDDING_CACHE,
+    PREPROCESS_EXECUTOR,
+    PREPROCESS_PROCESS_POOL,
+    FaceBox,
+    embed_image,
+    embed_image_faces,
+    process_images_faces_sync,
+    process_images_sync,
+    select_video_faces_sync,
+)
+from src_models.video_utils import (
+    SequentialSimilarityTest,
+    VideoFrameSampler,
+    spooled_upload,
+)
+from src_models.warmup import warm_up, warm_up_batch_sizes
 
 
 # Initialize a global threshold
-CURRENT_THRESHOLD: float = 0.7  # Default threshold
+CURRENT_THRESHOLD: float = SIMILARITY_THRESHOLD
 VIDEO_FRAME_SAMPLE_COUNT: int = 5
 
+# Enrolled subjects for 1:N identification
+FACE_GALLERY = FaceGallery(
+    GALLERY_DIR or None,
+    index=IVFIndex(nlist=IVF_NLIST, nprobe=IVF_NPROBE) if GALLERY_INDEX == "ivf" else None,
+    index_min_size=IVF_MIN_TRAIN_SIZE,
+    snapshot_every=GALLERY_SNAPSHOT_EVERY,
+)
+
+# Progress of the startup warm-up; the readiness probe passes only once it is done
+WARMUP_STATUS: dict = {"state": "pending" if WARMUP_ENABLED else "disabled", "seconds": None, "error": None}
+
+
+async def load_models() -> None:
+    """
+    Load all models concurrently, each in its own thread.
+
+    A model that fails to load records the error in its status and is retried on first use.
+    """
+    await asyncio.gather(*(asyncio.to_thread(model.load) for model in MODELS.values()), return_exceptions=True)
+
+
+async def prepare_models() -> None:
+    """
+    Load the models, then warm them up unless warm-up is disabled.
+    """
+    await load_models()
+    if not WARMUP_ENABLED:
+        return
+    if not all(model.loaded for model in MODELS.values()):
+        WARMUP_STATUS.update(state="failed", error="Models failed to load")
+        return
+
+    batch_sizes = (
+        [int(size) for size in WARMUP_BATCH_SIZES.split(",")]
+        if WARMUP_BATCH_SIZES
+        else warm_up_batch_sizes(EMBEDDER_MAX_BATCH_SIZE)
+    )
+    WARMUP_STATUS["state"] = "running"
+    try:
+        timings = await asyncio.to_thread(warm_up, WARMUP_IMAGE, batch_sizes)
+    except Exception as e:
+        WARMUP_STATUS.update(state="failed", error=str(e))
+        return
+    WARMUP_STATUS.update(state="done", seconds=timings, error=None)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """
-    Manage application lifespan: load model on startup, cleanup on shutdown.
+    Manage application lifespan: load models on startup, cleanup on shutdown.
+
+    Models load and warm up in the background so that /faceapp/ready/ can
+    report progress; requests arriving earlier wait for the models they need.
 
     Args:
         app (FastAPI): The FastAPI application instance.
@@ -32,17 +123,80 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
         None
     """
     global FACE_VERIFIER
-    print("Loading model during startup...")
+    print("Loading models during startup...")
     if FACE_VERIFIER is None:
         raise Exception("Model is not initialized!")
+    loading = asyncio.create_task(prepare_models())
     yield
     print("Cleaning up resources during shutdown...")
+    # Loader threads cannot be interrupted, so let them finish
+    await loading
+    if PREPROCESS_PROCESS_POOL is not None:
+        PREPROCESS_PROCESS_POOL.shutdown()
+    # Fold the journal into a snapshot so the next start-up has nothing to replay
+    await asyncio.to_thread(FACE_GALLERY.save)
 
 
 # Create the FastAPI app with the lifespan hook
 app = FastAPI(lifespan=lifespan)
 
 
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """
+    Reject requests that declare a body larger than MAX_UPLOAD_BYTES before reading it.
+
+    Args:
+        request (Request): The incoming request.
+        call_next: The next request handler.
+
+    Returns:
+        Response: A 413 response for oversized requests, otherwise the handler's response.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        return JSONResponse(
+            status_code=413,
+            content={
+                "status_code": 413,
+                "error": f"Request body exceeds the maximum size of {MAX_UPLOAD_BYTES} bytes.",
+            },
+        )
+    return await call_next(request)
+
+
+def error_response(error: Exception, correlation_id: str) -> JSONResponse:
+    """
+    Build the JSON error response for an exception raised by an endpoint.
+
+    Args:
+        error (Exception): The raised exception.
+        correlation_id (str): A unique identifier for request tracking.
+
+    Returns:
+        JSONResponse: The HTTP error for HTTPExceptions, otherwise a 500 response.
+    """
+    if isinstance(error, HTTPException):
+        return JSONResponse(
+            status_code=error.status_code,
+            content={
+                "status_code": error.status_code,
+                "error": error.detail,
+                "correlation_id": correlation_id,
+            },
+            headers=error.headers,
+        )
+    return JSONResponse(
+        status_code=500,
+        content={
+            "status_code": 500,
+            "error": "Internal Server Error",
+            "details": str(error),
+            "correlation_id": correlation_id,
+        },
+    )
+
+
 # Threshold management
 class Threshold(BaseModel):
     threshold: float
@@ -69,32 +223,91 @@ async def set_threshold(new_threshold: Threshold) -> dict[str, str]:
     return {"message": f"Threshold updated to {CURRENT_THRESHOLD}"}
 
 
+@app.get("/faceapp/stats/")
+async def get_stats() -> dict[str, dict]:
+    """
+    Report runtime statistics of the inference pipeline.
+
+    Returns:
+        dict: Embedder batching histograms, preprocessing executor load, model and
+              video landmarker pool utilization, embedding cache counters and landmark
+              crop validation.
+    """
+    return {
+        "embedder_batching": FACE_BATCHER.stats(),
+        "preprocess_executor": PREPROCESS_EXECUTOR.stats(),
+        "model_pool": FACE_MODEL_POOL.stats(),
+        "video_landmarker_pool": FACE_VIDEO_LANDMARKER_POOL.stats(),
+        "embedding_cache": EMBEDDING_CACHE.stats(),
+        "crop_validation": CROP_VALIDATOR.stats(),
+    }
+
+
+@app.get("/faceapp/ready/")
+async def get_readiness() -> JSONResponse:
+    """
+    Report whether all models are loaded and warmed up, for use as a readiness probe.
+
+    Returns:
+        JSONResponse: 200 once every model is ready and warm-up is done (or disabled), 503 before,
+                      with the load state of each model and the warm-up state.
+    """
+    ready = all(model.loaded for model in MODELS.values()) and WARMUP_STATUS["state"] in ("done", "disabled")
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "models": {name: model.status() for name, model in MODELS.items()},
+            "warmup": WARMUP_STATUS,
+        },
+    )
+
+
+def face_box_json(box: FaceBox) -> dict[str, int]:
+    x, y, width, height = box
+    return {"x": x, "y": y, "width": width, "height": height}
+
+
 @app.post("/faceapp/compare/")
 async def compare_faces(
     image1: UploadFile = File(...),
     image2: UploadFile = File(...),
+    multi_face: bool = Query(MAX_FACES > 1),
     correlation_id: str = Header(f"{uuid4()}"),
 ) -> JSONResponse:
     """
     Compare two uploaded face images and return their similarity score.
 
+    In multi-face mode every face in the second image (up to MAX_FACES) is
+    embedded in one batch, and the one best matching the first image is used.
+
     Args:
         image1 (UploadFile): The first image to compare.
         image2 (UploadFile): The second image to compare.
+        multi_face (bool): Match against every face in `image2` instead of the first one found.
         correlation_id (str): A unique identifier for request tracking.
 
     Returns:
-        JSONResponse: The similarity score and whether the faces are similar.
+        JSONResponse: The similarity score and whether the faces are similar; in multi-face
+                      mode also the box of the best-matching face and the number of faces.
     """
     try:
-        # Process both images concurrently
-        preprocessed_images = await asyncio.gather(
-            process_image(image1), process_image(image2)
-        )
-
-        # Compute embeddings and similarity score
-        embedding1, embedding2 = FACE_VERIFIER.forward(*preprocessed_images)
-        similarity_score: float = float(cosine_similarity(embedding1, embedding2))
+        content = {}
+        with PREPROCESS_EXECUTOR.admit():
+            if multi_face:
+                embedding1, (embeddings2, boxes) = await asyncio.gather(
+                    embed_image(image1), embed_image_faces(image2)
+                )
+                scores = cosine_similarities(embedding1, embeddings2)
+                best = int(np.argmax(scores))
+                similarity_score: float = float(scores[best])
+                content = {"face_box": face_box_json(boxes[best]), "faces_detected": len(boxes)}
+            else:
+                # Embed both images concurrently, reusing cached embeddings of repeated uploads
+                embedding1, embedding2 = await asyncio.gather(
+                    embed_image(image1), embed_image(image2)
+                )
+                similarity_score: float = float(cosine_similarity(embedding1, embedding2))
         similarity_score: float = (similarity_score + 1) / 2
         is_similar: bool = similarity_score >= CURRENT_THRESHOLD
 
@@ -104,80 +317,117 @@ async def compare_faces(
                 "status_code": 200,
                 "similarity_score": similarity_score,
                 "is_similar": is_similar,
-                "correlation_id": correlation_id,
-            },
-        )
-    except HTTPException as he:
-        # Handle HTTP exceptions
-        return JSONResponse(
-            status_code=he.status_code,
-            content={
-                "status_code": he.status_code,
-                "error": he.detail,
+                **content,
                 "correlation_id": correlation_id,
             },
         )
     except Exception as e:
-        # Handle all other exceptions
-        return JSONResponse(
-            status_code=500,
-            content={
-                "status_code": 500,
-                "error": "Internal Server Error",
-                "details": str(e),
-                "correlation_id": correlation_id,
-            },
-        )
+        return error_response(e, correlation_id)
+
 
 @app.post("/faceapp/compare_video/")
 async def compare_video_faces(
     image: UploadFile = File(...),
     video: UploadFile = File(...),
+    adaptive: bool = Query(VIDEO_ADAPTIVE_SAMPLING),
+    multi_face: bool = Query(MAX_FACES > 1),
+    quality: bool = Query(VIDEO_QUALITY_SELECTION),
+    tracking: bool = Query(VIDEO_TRACKING),
     correlation_id: str = Header(f"{uuid4()}"),
 ) -> JSONResponse:
-    try:
-        # Process the input image asynchronously using process_image.
-        image_processed = await process_image(image)
-
-        # Write the entire video to a temporary file.
-        video_bytes = await video.read()
-        with tempfile.NamedTemporaryFile(suffix=".mp4") as tmp:
-            tmp.write(video_bytes)
-            tmp.flush()
-
-            cap = cv2.VideoCapture(tmp.name)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            if total_frames <= 0:
-                raise HTTPException(status_code=400, detail="Invalid video or no frames found.")
-
-            # Get n evenly spaced frame indices.
-            frame_indices = np.linspace(0, total_frames - 1, VIDEO_FRAME_SAMPLE_COUNT, dtype=int).tolist()
-
-            # Read each frame at the specified indices.
-            frames = []
-            for idx in frame_indices:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-                ret, frame = cap.read()
-                if ret:
-                    frames.append(frame)
-
-        if not frames:
-            raise HTTPException(status_code=400, detail="No valid frames extracted from video.")
+    """
+    Compare the face in an image with the face in sampled frames of a video.
 
-        # Asynchronously process each frame using process_image_sync.
-        async def process_frame(frame: np.ndarray) -> np.ndarray:
-            return await asyncio.to_thread(process_image_sync, frame)
+    With adaptive sampling, frames are processed progressively and sampling
+    stops as soon as the mean similarity is confidently above or below the
+    threshold; otherwise a fixed number of frames is averaged. In multi-face
+    mode each frame scores its best-matching face. With quality selection,
+    more candidate frames are landmarked, only the best-quality faces are
+    embedded and their scores are averaged weighted by quality; tracking does
+    the same while following one face from frame to frame. Adaptive sampling
+    and multi-face mode do not apply to either.
 
-        processed_frames = await asyncio.gather(*(process_frame(frame) for frame in frames))
+    Args:
+        image (UploadFile): The reference image.
+        video (UploadFile): The video to compare against.
+        adaptive (bool): Stop sampling early once the decision is clear.
+        multi_face (bool): Match against every face in a frame instead of the first one found.
+        quality (bool): Embed only the VIDEO_QUALITY_TOP_K best of VIDEO_CANDIDATE_FRAMES frames.
+        tracking (bool): Like `quality`, tracking the face through the candidate frames.
+        correlation_id (str): A unique identifier for request tracking.
 
-        # For each processed frame, asynchronously call the model to compute similarity with the input image.
-        async def process_pair(frame_processed: np.ndarray) -> float:
-            embedding_image, embedding_frame = await asyncio.to_thread(FACE_VERIFIER.forward, image_processed, frame_processed)
-            score = float(cosine_similarity(embedding_image, embedding_frame))
-            return (score + 1) / 2  
+    Returns:
+        JSONResponse: The mean similarity score (quality-weighted with selection), the decision and the number
+            of frames used.
+    """
+    try:
+        with PREPROCESS_EXECUTOR.admit():
+            # Embed the input image, reusing the cached embedding of a repeated upload.
+            embedding_image = await embed_image(image)
+
+            select = quality or tracking
+            if select:
+                min_frames = max_frames = VIDEO_QUALITY_TOP_K
+            elif adaptive:
+                min_frames, max_frames = VIDEO_ADAPTIVE_MIN_FRAMES, VIDEO_ADAPTIVE_MAX_FRAMES
+            else:
+                min_frames = max_frames = VIDEO_FRAME_SAMPLE_COUNT
+            sequential_test = SequentialSimilarityTest(
+                CURRENT_THRESHOLD, min_frames, max_frames, VIDEO_ADAPTIVE_Z_SCORE
+            )
+
+            # Compute the similarity of a batch of preprocessed frame faces with the input image.
+            async def score_faces(faces_processed: np.ndarray) -> list[float]:
+                scores = cosine_similarities(embedding_image, await FACE_BATCHER.forward(faces_processed))
+                return [(float(score) + 1) / 2 for score in scores]
+
+            # Compute the similarity of a batch of frames with the input image.
+            async def score_frames(frames: list[np.ndarray]) -> list[float]:
+                if not multi_face:
+                    return await score_faces(await PREPROCESS_EXECUTOR.run(process_images_sync, frames))
+
+                # All faces of all frames go through the embedder in one batch
+                faces_processed, boxes = await PREPROCESS_EXECUTOR.run(process_images_faces_sync, frames)
+                face_scores = cosine_similarities(embedding_image, await FACE_BATCHER.forward(faces_processed))
+                ends = np.cumsum([len(frame_boxes) for frame_boxes in boxes])
+                return [(float(scores.max()) + 1) / 2 for scores in np.split(face_scores, ends[:-1])]
+
+            # Copy the video to a temporary file in chunks, enforcing the size limit.
+            async with spooled_upload(video, MAX_UPLOAD_BYTES) as video_path:
+                # Decode evenly spaced frames, a batch at a time.
+                sampler = await PREPROCESS_EXECUTOR.run(
+                    VideoFrameSampler,
+                    video_path,
+                    max(VIDEO_CANDIDATE_FRAMES, max_frames) if select else max_frames,
+                    VIDEO_SAMPLE_BY_TIMESTAMP,
+                    VIDEO_MAX_GRAB_GAP,
+                    # Adaptive sampling may stop after min_frames, which must already span the clip
+                    None if select else min_frames,
+                )
+                try:
+                    if sampler.total_frames <= 0:
+                        raise HTTPException(status_code=400, detail="Invalid video or no frames found.")
+
+                    if select:
+                        # Candidate frames are decoded and landmarked one by one in a single worker call
+                        faces_processed, qualities = await PREPROCESS_EXECUTOR.run(
+                            select_video_faces_sync, sampler, VIDEO_QUALITY_TOP_K, tracking
+                        )
+                        sequential_test.add(await score_faces(faces_processed), qualities)
+
+                    while not select and not sequential_test.done:
+                        batch_size = sequential_test.next_batch_size(VIDEO_ADAPTIVE_STEP)
+                        frames = await PREPROCESS_EXECUTOR.run(sampler.read, batch_size)
+                        if not frames:
+                            break
+                        sequential_test.add(await score_frames(frames))
+                finally:
+                    sampler.close()
+
+        if sequential_test.count == 0:
+            raise HTTPException(status_code=400, detail="No valid frames extracted from video.")
 
-        similarity_scores = await asyncio.gather(*(process_pair(frame) for frame in processed_frames))
-        aggregated_similarity = sum(similarity_scores) / len(similarity_scores)
+        aggregated_similarity = sequential_test.mean
         is_similar = aggregated_similarity >= CURRENT_THRESHOLD
 
         return JSONResponse(
@@ -186,25 +436,131 @@ async def compare_video_faces(
                 "status_code": 200,
                 "similarity_score": aggregated_similarity,
                 "is_similar": is_similar,
+                "frames_used": sequential_test.count,
                 "correlation_id": correlation_id,
             },
         )
-    except HTTPException as he:
+    except Exception as e:
+        return error_response(e, correlation_id)
+
+
+@app.get("/faceapp/gallery/")
+async def get_gallery() -> dict[str, int]:
+    """
+    Report the size of the enrolled gallery.
+
+    Returns:
+        dict: Number of enrolled subjects, allocated rows and embedding size.
+    """
+    return FACE_GALLERY.stats()
+
+
+@app.post("/faceapp/gallery/{subject_id}")
+async def enroll_subject(
+    subject_id: str,
+    image: UploadFile = File(...),
+    correlation_id: str = Header(f"{uuid4()}"),
+) -> JSONResponse:
+    """
+    Enroll a subject in the gallery, replacing any previous template.
+
+    Args:
+        subject_id (str): Identifier of the subject.
+        image (UploadFile): A face image of the subject.
+        correlation_id (str): A unique identifier for request tracking.
+
+    Returns:
+        JSONResponse: 201 for a new subject, 200 if an existing template was replaced.
+    """
+    try:
+        with PREPROCESS_EXECUTOR.admit():
+            embedding = await embed_image(image)
+        created = await asyncio.to_thread(FACE_GALLERY.enroll, subject_id, embedding)
+        status_code = 201 if created else 200
+
         return JSONResponse(
-            status_code=he.status_code,
+            status_code=status_code,
             content={
-                "status_code": he.status_code,
-                "error": he.detail,
+                "status_code": status_code,
+                "subject_id": subject_id,
+                "gallery_size": len(FACE_GALLERY),
                 "correlation_id": correlation_id,
             },
         )
     except Exception as e:
+        return error_response(e, correlation_id)
+
+
+@app.delete("/faceapp/gallery/{subject_id}")
+async def remove_subject(
+    subject_id: str,
+    correlation_id: str = Header(f"{uuid4()}"),
+) -> JSONResponse:
+    """
+    Remove a subject from the gallery.
+
+    Args:
+        subject_id (str): Identifier of the subject.
+        correlation_id (str): A unique identifier for request tracking.
+
+    Returns:
+        JSONResponse: Confirmation, or 404 if the subject is not enrolled.
+    """
+    try:
+        removed = await asyncio.to_thread(FACE_GALLERY.remove, subject_id)
+        if not removed:
+            raise HTTPException(status_code=404, detail=f"Subject {subject_id} is not enrolled.")
+
         return JSONResponse(
-            status_code=500,
+            status_code=200,
             content={
-                "status_code": 500,
-                "error": "Internal Server Error",
-                "details": str(e),
+                "status_code": 200,
+                "subject_id": subject_id,
+                "gallery_size": len(FACE_GALLERY),
                 "correlation_id": correlation_id,
             },
         )
+    except Exception as e:
+        return error_response(e, correlation_id)
+
+
+@app.post("/faceapp/identify/")
+async def identify_face(
+    image: UploadFile = File(...),
+    top_k: int = Query(IDENTIFY_TOP_K, ge=1, le=100),
+    correlation_id: str = Header(f"{uuid4()}"),
+) -> JSONResponse:
+    """
+    Identify the face in an uploaded image against every enrolled subject.
+
+    Args:
+        image (UploadFile): The probe image.
+        top_k (int): Number of best-scoring subjects to return.
+        correlation_id (str): A unique identifier for request tracking.
+
+    Returns:
+        JSONResponse: The best matches with their similarity scores.
+    """
+    try:
+        with PREPROCESS_EXECUTOR.admit():
+            embedding = await embed_image(image)
+        results = await asyncio.to_thread(FACE_GALLERY.search, embedding, top_k)
+        matches = [
+            {
+                "subject_id": subject_id,
+                "similarity_score": (score + 1) / 2,
+                "is_similar": (score + 1) / 2 >= CURRENT_THRESHOLD,
+            }
+            for subject_id, score in results
+        ]
+
+        return JSONResponse(
+            status_code=200,
+            content={
+                "status_code": 200,
+                "matches": matches,
+                "correlation_id": correlation_id,
+            },
+        )
+    except Exception as e:
+        return error_response(e, correlation_id)
@@ -1,10 +1,58 @@
+from typing import Dict
+
+from src_models.config import (
+    EMBEDDER_MAX_BATCH_SIZE,
+    EMBEDDER_MAX_CONCURRENT_RUNS,
+    EMBEDDER_MAX_WAIT_MS,
+    EMBEDDER_PRECISION,
+    MAX_FACES,
+    MODEL_POOL_SIZE,
+    ORT_ENABLE_CPU_MEM_ARENA,
+    ORT_GRAPH_OPTIMIZATION,
+    ORT_INTER_OP_THREADS,
+    ORT_INTRA_OP_THREADS,
+    ORT_OPTIMIZED_MODEL_DIR,
+    ORT_PARALLEL_EXECUTION,
+)
+from .batching import BatchingEmbedder
 from .face_detector import FaceDetector
 from .face_landmarker import FaceLandmarker
 from .face_verifier import FaceEmbedderBackbone
 from .face_verifier import SiameseNetwork
+from .lazy import LazyModel
+from .paths import ModelPaths
+from .pool import FaceModels, ModelPool
+
+
+FACE_EMBEDDER_PATH = (ModelPaths.FACE_EMBEDDER_INT8 if EMBEDDER_PRECISION == "int8" else ModelPaths.FACE_EMBEDDER).value
 
+# Importing this package is cheap: models are constructed by load_models() at startup,
+# or on first use by code that never calls it (tests, tools)
+FACE_DETECTOR = LazyModel("face_detector", FaceDetector)
+FACE_LANDMARKER = LazyModel("face_landmarker", lambda: FaceLandmarker(max_faces=MAX_FACES))
+FACE_EMBEDDER = LazyModel(
+    "face_embedder",
+    lambda: FaceEmbedderBackbone(
+        model_path=FACE_EMBEDDER_PATH,
+        intra_op_num_threads=ORT_INTRA_OP_THREADS,
+        inter_op_num_threads=ORT_INTER_OP_THREADS,
+        parallel_execution=ORT_PARALLEL_EXECUTION,
+        graph_optimization=ORT_GRAPH_OPTIMIZATION,
+        enable_cpu_mem_arena=ORT_ENABLE_CPU_MEM_ARENA,
+        optimized_model_dir=ORT_OPTIMIZED_MODEL_DIR or None,
+    ),
+)
+MODELS: Dict[str, LazyModel] = {model.name: model for model in (FACE_DETECTOR, FACE_LANDMARKER, FACE_EMBEDDER)}
 
-FACE_DETECTOR = FaceDetector()
-FACE_LANDMARKER = FaceLandmarker()
-FACE_EMBEDDER = FaceEmbedderBackbone()
-FACE_VERIFIER = SiameseNetwork(FACE_EMBEDDER)
\ No newline at end of file
+FACE_VERIFIER = SiameseNetwork(FACE_EMBEDDER)
+FACE_BATCHER = BatchingEmbedder(
+    FACE_EMBEDDER, EMBEDDER_MAX_BATCH_SIZE, EMBEDDER_MAX_WAIT_MS, EMBEDDER_MAX_CONCURRENT_RUNS
+)
+# The module-level instances seed the pool; further ones are created on demand
+FACE_MODEL_POOL = ModelPool(
+    lambda: FaceModels(FaceLandmarker(max_faces=MAX_FACES), FaceDetector()),
+    MODEL_POOL_SIZE,
+    initial=[FaceModels(FACE_LANDMARKER, FACE_DETECTOR)],
+)
+# Video-mode landmarkers for tracking; one is checked out per video so its frames are in order
+FACE_VIDEO_LANDMARKER_POOL = ModelPool(lambda: FaceLandmarker(running_mode="video"), MODEL_POOL_SIZE)
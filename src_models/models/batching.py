@@ -0,0 +1,216 @@
+import asyncio
+import numpy as np
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from .face_verifier import FaceEmbedderBackbone
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram of observed integer values.
+    """
+
+    def __init__(self, upper_bounds: List[int]):
+        """
+        Initialize the histogram.
+
+        Parameters:
+        - upper_bounds (List[int]): Inclusive upper bound of each bucket, in ascending order.
+                                    Values above the last bound land in an overflow bucket.
+        """
+        self.upper_bounds: List[int] = upper_bounds
+        self.counts: List[int] = [0] * (len(upper_bounds) + 1)
+        self.total: int = 0
+        self.count: int = 0
+
+    def observe(self, value: int) -> None:
+        """
+        Record a single observation.
+
+        Parameters:
+        - value (int): The observed value.
+        """
+        index = int(np.searchsorted(self.upper_bounds, value, side="left"))
+        self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return the histogram as a JSON-serializable dictionary.
+
+        Returns:
+        - Dict[str, Any]: Bucket counts keyed by upper bound, plus count and mean.
+        """
+        buckets = {f"le_{bound}": count for bound, count in zip(self.upper_bounds, self.counts)}
+        buckets["overflow"] = self.counts[-1]
+        return {
+            "buckets": buckets,
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+        }
+
+
+def _power_of_two_bounds(limit: int) -> List[int]:
+    bounds = [1]
+    while bounds[-1] < limit:
+        bounds.append(bounds[-1] * 2)
+    return bounds
+
+
+class BatchingEmbedder:
+    """
+    A micro-batching front-end for the FaceEmbedder backbone.
+
+    Coroutines submit preprocessed tensors through `forward`; submissions are
+    stacked into a single ONNX run once `max_batch_size` rows are queued or
+    `max_wait_ms` has elapsed since the first queued tensor, and the resulting
+    embeddings are handed back to each awaiting coroutine. No run exceeds
+    `max_batch_size` rows: larger submissions are queued in chunks.
+
+    At most `max_concurrent_runs` runs are in flight. While the embedder is
+    busy, submissions keep filling the queue instead of starting runs of their
+    own, so batches grow with load rather than competing for the same cores.
+    """
+
+    def __init__(
+        self,
+        face_embedder_backbone: FaceEmbedderBackbone,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_concurrent_runs: int = 1,
+    ):
+        """
+        Initialize the batching embedder.
+
+        Parameters:
+        - face_embedder_backbone (FaceEmbedderBackbone): The backbone used to run batches.
+        - max_batch_size (int): Number of queued rows that triggers an immediate run, and the largest run.
+        - max_wait_ms (float): Longest time a queued tensor waits for others to join its batch.
+        - max_concurrent_runs (int): Number of batches run on the backbone at the same time.
+        """
+        self.face_embedder_backbone: FaceEmbedderBackbone = face_embedder_backbone
+        self.max_batch_size: int = max_batch_size
+        self.max_wait: float = max_wait_ms / 1000.0
+        self.max_concurrent_runs: int = max(1, max_concurrent_runs)
+        self.queue_depth: Histogram = Histogram(_power_of_two_bounds(max_batch_size))
+        self.batch_size: Histogram = Histogram(_power_of_two_bounds(max_batch_size))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[np.ndarray, asyncio.Future]] = []
+        self._pending_rows: int = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # Full batches waiting for a free run slot, oldest first
+        self._ready: Deque[List[Tuple[np.ndarray, asyncio.Future]]] = deque()
+        self._running: Set[asyncio.Task] = set()
+
+    async def forward(self, image: np.ndarray) -> np.ndarray:
+        """
+        Queue a preprocessed tensor and wait for its embeddings.
+
+        Parameters:
+        - image (np.ndarray): Preprocessed input of shape (N, 3, 112, 112).
+
+        Returns:
+        - np.ndarray: Embeddings of shape (N, D) for the submitted rows.
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Anything still queued belongs to an event loop that is gone
+            self._loop = loop
+            self._pending, self._pending_rows, self._flush_handle = [], 0, None
+            self._ready, self._running = deque(), set()
+
+        rows = image.shape[0]
+        if rows > self.max_batch_size:
+            chunks = [image[i : i + self.max_batch_size] for i in range(0, rows, self.max_batch_size)]
+            return np.concatenate(await asyncio.gather(*(self.forward(chunk) for chunk in chunks)), axis=0)
+
+        if self._pending_rows + rows > self.max_batch_size:
+            # Run what is queued rather than let this submission overfill the batch
+            self._flush()
+
+        future: asyncio.Future = loop.create_future()
+        self._pending.append((image, future))
+        self._pending_rows += rows
+        self.queue_depth.observe(self._pending_rows)
+
+        if self._pending_rows >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._on_max_wait)
+
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return queue depth and batch size statistics.
+
+        Returns:
+        - Dict[str, Any]: Current queue depth and both histograms.
+        """
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "pending_rows": self._pending_rows,
+            "ready_batches": len(self._ready),
+            "running": len(self._running),
+            "queue_depth": self.queue_depth.snapshot(),
+            "batch_size": self.batch_size.snapshot(),
+        }
+
+    def _flush(self) -> None:
+        # Close the queued batch; it runs as soon as a run slot is free
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending, self._pending_rows = self._pending, [], 0
+        if batch:
+            self._ready.append(batch)
+        self._dispatch()
+
+    def _on_max_wait(self) -> None:
+        self._flush_handle = None
+        # With the embedder busy, keep filling the batch; the finishing run starts it
+        if len(self._running) < self.max_concurrent_runs:
+            self._flush()
+
+    def _dispatch(self) -> None:
+        while len(self._running) < self.max_concurrent_runs:
+            if self._ready:
+                batch = self._ready.popleft()
+            elif self._pending:
+                self._flush()
+                return
+            else:
+                return
+            task = self._loop.create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._run_finished)
+
+    def _run_finished(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        if task.get_loop() is self._loop:
+            self._dispatch()
+
+    async def _run_batch(self, batch: List[Tuple[np.ndarray, asyncio.Future]]) -> None:
+        images = np.concatenate([image for image, _ in batch], axis=0)
+        self.batch_size.observe(images.shape[0])
+
+        try:
+            embeddings = await asyncio.to_thread(
+                self.face_embedder_backbone.forward_batch, images
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # Fan the stacked output back out to the submitting coroutines
+        offset = 0
+        for image, future in batch:
+            rows = image.shape[0]
+            if not future.done():
+                future.set_result(embeddings[offset : offset + rows])
+            offset += rows
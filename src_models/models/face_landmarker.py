@@ -1,9 +1,23 @@
+import itertools
 import numpy as np
 import mediapipe as mp
 from .paths import ModelPaths
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
-from typing import Any, List, Tuple, Optional
+from typing import Any, List, Tuple, Optional, Sequence
+
+# Timestamp step between video frames. Candidate frames are seconds apart in the clip, and
+# MediaPipe smooths landmarks over time, pulling them towards the previous frame's at short steps
+VIDEO_FRAME_STEP_MS = 1000
+
+
+def _points_to_array(points: Sequence[Any]) -> np.ndarray:
+    # Reads the landmark objects of a detect() result straight into a float32 buffer
+    return np.fromiter(
+        itertools.chain.from_iterable((point.x, point.y) for point in points),
+        dtype=np.float32,
+        count=2 * len(points),
+    ).reshape(-1, 2)
 
 
 class Landmark:
@@ -29,6 +43,7 @@ class FaceLandmarker:
         model_path: str = ModelPaths.FACE_LANDMARKER.value,
         device: str = "cpu",
         max_faces: int = 1,
+        running_mode: str = "image",
     ):
         """
         Initialize the FaceLandmarker with the MediaPipe model and parameters.
@@ -37,10 +52,17 @@ class FaceLandmarker:
         - model_path (str): Path to the MediaPipe Face Landmarker model file.
         - device (str): Device to run the model on ("cpu" or "cuda").
         - max_faces (int): Maximum number of faces to detect landmarks for.
+        - running_mode (str): "image" for independent images, or "video" for the frames of
+                              detect_video_landmarks.
         """
         self.model_path = model_path
         self.device = device
         self.max_faces = max_faces
+        self.running_mode = running_mode
+        # Timestamp of the last video frame, which MediaPipe requires to increase per instance,
+        # and whether a face was found in it
+        self.timestamp_ms = 0
+        self.tracking_face = False
         self.landmarker = self._load_model()
 
     def _load_model(self) -> Any:
@@ -63,6 +85,9 @@ class FaceLandmarker:
             output_face_blendshapes=False,  # Set to True if blendshapes are needed
             output_facial_transformation_matrixes=False,  # Set to True if transformation matrices are needed
             num_faces=self.max_faces,
+            running_mode=(
+                vision.RunningMode.VIDEO if self.running_mode == "video" else vision.RunningMode.IMAGE
+            ),
         )
         return vision.FaceLandmarker.create_from_options(options)
 
@@ -74,30 +99,85 @@ class FaceLandmarker:
         - face_image (np.ndarray): Cropped face image (RGB format) as a NumPy array.
 
         Returns:
-        - Optional[np.ndarray]: A NumPy array of shape (n, 2) containing (x, y) coordinates
-                                for each detected landmark, or None if no landmarks are found.
+        - Optional[np.ndarray]: A contiguous float32 array of shape (n, 2) containing (x, y)
+                                coordinates for each detected landmark, or None if no landmarks
+                                are found.
         """
         if face_image is None:
             raise ValueError("Input face image cannot be None.")
 
-        # Convert the image to MediaPipe format
+        # Convert the image to MediaPipe format; uint8 contiguous input is not copied here
         mp_image = mp.Image(
-            image_format=mp.ImageFormat.SRGB, data=face_image.astype(np.uint8)
+            image_format=mp.ImageFormat.SRGB, data=np.ascontiguousarray(face_image, dtype=np.uint8)
         )
 
-        # Detect landmarks
-        result = self.landmarker.detect(mp_image)
-        if not result.face_landmarks:
+        faces = self._detect_normalized(mp_image, max_faces=1)
+        if not faces:
             return None  # No landmarks detected
 
-        # Extract landmarks as a NumPy array
-        landmarks = np.array(
-            [(landmark.x, landmark.y) for landmark in result.face_landmarks[0]],
-            dtype=np.float32,
+        # Denormalize landmarks to pixel coordinates
+        landmarks = faces[0]
+        landmarks *= np.array([face_image.shape[1], face_image.shape[0]], dtype=np.float32)
+        return landmarks
+
+    def detect_video_landmarks(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Detect the facial landmarks in the next frame of a video, in "video" running mode.
+
+        MediaPipe landmarks the region of the face found in the previous frame and
+        only runs its face detector when no face is tracked. A face that has left
+        that region is therefore only found by the next call, which is then made
+        right away on the same frame.
+
+        Parameters:
+        - frame (np.ndarray): The next frame (RGB format) as a NumPy array.
+
+        Returns:
+        - Optional[np.ndarray]: A float32 array of shape (n, 2) containing (x, y) coordinates
+                                for each detected landmark, or None if no landmarks are found.
+        """
+        if frame is None:
+            raise ValueError("Input frame cannot be None.")
+
+        mp_image = mp.Image(
+            image_format=mp.ImageFormat.SRGB, data=np.ascontiguousarray(frame, dtype=np.uint8)
         )
+        for _ in range(2 if self.tracking_face else 1):
+            self.timestamp_ms += VIDEO_FRAME_STEP_MS
+            result = self.landmarker.detect_for_video(mp_image, self.timestamp_ms)
+            self.tracking_face = bool(result.face_landmarks)
+            if self.tracking_face:
+                landmarks = _points_to_array(result.face_landmarks[0])
+                landmarks *= np.array([frame.shape[1], frame.shape[0]], dtype=np.float32)
+                return landmarks
+        return None
+
+    def detect_all_landmarks(self, face_image: np.ndarray) -> List[np.ndarray]:
+        """
+        Detect the landmarks of every face in an image, up to `max_faces`.
 
-        # Denormalize landmarks to pixel coordinates (if needed)
-        landmarks[:, 0] *= face_image.shape[1]  # Scale x-coordinates by image width
-        landmarks[:, 1] *= face_image.shape[0]  # Scale y-coordinates by image height
+        Parameters:
+        - face_image (np.ndarray): Image (RGB format) as a NumPy array.
 
-        return landmarks
+        Returns:
+        - List[np.ndarray]: One float32 array of shape (n, 2) of pixel coordinates per face;
+                            empty if no face is found.
+        """
+        if face_image is None:
+            raise ValueError("Input face image cannot be None.")
+
+        mp_image = mp.Image(
+            image_format=mp.ImageFormat.SRGB, data=np.ascontiguousarray(face_image, dtype=np.uint8)
+        )
+        scale = np.array([face_image.shape[1], face_image.shape[0]], dtype=np.float32)
+        faces = self._detect_normalized(mp_image, max_faces=self.max_faces)
+        for landmarks in faces:
+            landmarks *= scale
+        return faces
+
+    def _detect_normalized(self, mp_image: mp.Image, max_faces: int) -> List[np.ndarray]:
+        """
+        Run the landmarker and return the normalized (x, y) of up to `max_faces` faces.
+        """
+        result = self.landmarker.detect(mp_image)
+        return [_points_to_array(points) for points in result.face_landmarks[:max_faces]]
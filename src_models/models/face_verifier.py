@@ -1,24 +1,125 @@
+import os
+import platform
+import threading
 import cv2
 import numpy as np
 import onnxruntime
-from typing import Tuple
+from pathlib import Path
+from typing import Optional, Tuple
 from .paths import ModelPaths
 
+# Per-thread resize buffer of preprocess_image_direct
+_PREPROCESS_SCRATCH = threading.local()
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def model_file_version(model_path: str) -> str:
+    """
+    Identify the weights of a model file without loading it.
+
+    Parameters:
+    - model_path (str): Path to the ONNX model file.
+
+    Returns:
+    - str: File name and size, used to tell models apart in caches keyed by embedding output.
+    """
+    return f"{Path(model_path).name}-{os.path.getsize(model_path)}"
+
+
 class FaceEmbedderBackbone:
     """
     A class representing the FaceEmbedder model for extracting facial embeddings.
     """
 
-    def __init__(self, model_path: str = ModelPaths.FACE_EMBEDDER.value):
+    def __init__(
+        self,
+        model_path: str = ModelPaths.FACE_EMBEDDER.value,
+        intra_op_num_threads: int = 0,
+        inter_op_num_threads: int = 0,
+        parallel_execution: bool = False,
+        graph_optimization: str = "all",
+        enable_cpu_mem_arena: bool = True,
+        optimized_model_dir: Optional[str] = None,
+    ):
         """
         Initialize the FaceEmbedder backbone.
 
         Parameters:
         - model_path (str): Path to the ONNX model file.
+        - intra_op_num_threads (int): Threads ONNX Runtime uses within one operator; 0 lets it choose.
+        - inter_op_num_threads (int): Threads running independent operators in parallel execution mode.
+        - parallel_execution (bool): Run independent graph branches concurrently.
+        - graph_optimization (str): One of "disable", "basic", "extended" or "all".
+        - enable_cpu_mem_arena (bool): Pool CPU allocations across runs.
+        - optimized_model_dir (Optional[str]): Directory caching the optimized graph, so later
+                                               starts skip graph optimization; None disables it.
         """
         self.model_path: str = model_path
-        self.session: onnxruntime.InferenceSession = onnxruntime.InferenceSession(model_path)
+        # Identifies the weights in caches keyed by embedding output
+        self.version: str = model_file_version(model_path)
+
+        # Sessions are thread-safe, so one is shared and only its thread count is bounded
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = intra_op_num_threads
+        session_options.inter_op_num_threads = inter_op_num_threads
+        session_options.execution_mode = (
+            onnxruntime.ExecutionMode.ORT_PARALLEL
+            if parallel_execution
+            else onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        )
+        session_options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[graph_optimization]
+        session_options.enable_cpu_mem_arena = enable_cpu_mem_arena
+
+        session_path = model_path
+        save_path = None
+        if optimized_model_dir:
+            cached_path = self.optimized_model_path(optimized_model_dir, graph_optimization)
+            if os.path.exists(cached_path):
+                # The cached graph is already optimized for this runtime
+                session_path = cached_path
+                session_options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS["disable"]
+            else:
+                os.makedirs(optimized_model_dir, exist_ok=True)
+                save_path = f"{cached_path}.{os.getpid()}.tmp"
+                session_options.optimized_model_filepath = save_path
+
+        self.session: onnxruntime.InferenceSession = onnxruntime.InferenceSession(
+            session_path, sess_options=session_options
+        )
+        if save_path is not None and os.path.exists(save_path):
+            # Publish atomically so concurrent workers never load a partial graph
+            os.replace(save_path, cached_path)
+
         self.input_name: str = self.session.get_inputs()[0].name
+        # A fixed leading dimension means the exported graph cannot take stacked batches
+        batch_dim = self.session.get_inputs()[0].shape[0]
+        self.fixed_batch_size: Optional[int] = batch_dim if isinstance(batch_dim, int) else None
+
+    def optimized_model_path(self, directory: str, graph_optimization: str) -> str:
+        """
+        Path of the cached optimized graph for this model, runtime and optimization level.
+
+        Optimized graphs may contain hardware-specific kernels, so the runtime
+        version and CPU architecture are part of the name.
+
+        Parameters:
+        - directory (str): Cache directory.
+        - graph_optimization (str): Optimization level the graph was produced with.
+
+        Returns:
+        - str: The cache file path.
+        """
+        stem = Path(self.model_path).stem
+        runtime = f"ort{onnxruntime.__version__}-{platform.machine()}"
+        return os.path.join(
+            directory, f"{stem}.{os.path.getsize(self.model_path)}.{runtime}.{graph_optimization}.opt.onnx"
+        )
 
     def forward(self, image: np.ndarray) -> np.ndarray:
         """
@@ -33,6 +134,24 @@ class FaceEmbedderBackbone:
         embeddings: np.ndarray = self.session.run(None, {self.input_name: image})[0]
         return embeddings
 
+    def forward_batch(self, images: np.ndarray) -> np.ndarray:
+        """
+        Extract embeddings for a stacked batch of preprocessed images.
+
+        Parameters:
+        - images (np.ndarray): Preprocessed images of shape (N, 3, 112, 112).
+
+        Returns:
+        - np.ndarray: Embeddings of shape (N, D), one row per input image.
+        """
+        if self.fixed_batch_size is None or self.fixed_batch_size == images.shape[0]:
+            return self.forward(images)
+
+        # Fall back to per-image runs for graphs exported with a static batch size
+        return np.concatenate(
+            [self.forward(images[i : i + 1]) for i in range(images.shape[0])], axis=0
+        )
+
 
 class SiameseNetwork:
     """
@@ -63,27 +182,69 @@ class SiameseNetwork:
         embedding2: np.ndarray = self.face_embedder_backbone.forward(image2)
         return embedding1, embedding2
 
+    def forward_one_to_many(self, reference_image: np.ndarray, images: np.ndarray) -> np.ndarray:
+        """
+        Compare one image with many, embedding the reference once and all images in the same batch.
+
+        Parameters:
+        - reference_image (np.ndarray): Preprocessed reference image of shape (1, 3, 112, 112).
+        - images (np.ndarray): Preprocessed images of shape (N, 3, 112, 112).
+
+        Returns:
+        - np.ndarray: Cosine similarity of the reference with each image, of shape (N,).
+        """
+        embeddings: np.ndarray = self.face_embedder_backbone.forward_batch(
+            np.concatenate([reference_image, images], axis=0)
+        )
+        return cosine_similarities(embeddings[0], embeddings[1:])
+
 
-def preprocess_image_direct(image: np.ndarray) -> np.ndarray:
+def cosine_similarities(reference: np.ndarray, embeddings: np.ndarray) -> np.ndarray:
+    """
+    Calculate the cosine similarity of one embedding with each row of a stack.
+
+    One matrix-vector product, scaled by the norms, instead of a comparison per row.
+
+    Parameters:
+    - reference (np.ndarray): Embedding of shape (D,) or (1, D).
+    - embeddings (np.ndarray): Embeddings of shape (N, D).
+
+    Returns:
+    - np.ndarray: Similarities of shape (N,).
+    """
+    reference = np.asarray(reference, dtype=np.float32).reshape(-1)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return (embeddings @ reference) / (np.linalg.norm(embeddings, axis=1) * np.linalg.norm(reference))
+
+
+def preprocess_image_direct(image: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Preprocess a NumPy image directly for the FaceEmbedder model.
 
+    Normalization is done in float32 straight into the output buffer. Subtracting
+    127.5 and scaling by 1/128 are exact for 8-bit input, so the result is
+    bit-identical to computing in float64 and casting.
+
     Parameters:
     - image (np.ndarray): Input image (H, W, C) in RGB format.
+    - out (Optional[np.ndarray]): Float32 buffer of shape (1, 3, 112, 112) or (3, 112, 112) to write into,
+                                  e.g. a slot of a batch tensor; allocated when omitted.
 
     Returns:
-    - np.ndarray: Preprocessed image suitable for FaceVerifier input.
+    - np.ndarray: Preprocessed image suitable for FaceVerifier input (`out` if given).
     """
-    # Resize to 112x112
-    resized_image: np.ndarray = cv2.resize(image, (112, 112))
-
-    # Normalize to [-1, 1]
-    normalized_image: np.ndarray = (resized_image - 127.5) / 128.0
+    if out is None:
+        out = np.empty((1, 3, 112, 112), dtype=np.float32)
 
-    # Convert to CHW format (C, H, W)
-    chw_image: np.ndarray = np.transpose(normalized_image, (2, 0, 1))
+    # Resize to 112x112, reusing this thread's scratch buffer when the layout matches
+    scratch = getattr(_PREPROCESS_SCRATCH, "resized", None)
+    if scratch is None or scratch.shape[2:] != image.shape[2:] or scratch.dtype != image.dtype:
+        scratch = _PREPROCESS_SCRATCH.resized = np.empty((112, 112) + image.shape[2:], dtype=image.dtype)
+    resized_image: np.ndarray = cv2.resize(image, (112, 112), dst=scratch)
 
-    # Add batch dimension and convert to float32
-    input_tensor: np.ndarray = np.expand_dims(chw_image, axis=0).astype(np.float32)
+    # Normalize to [-1, 1], converting HWC to CHW while writing
+    chw_out: np.ndarray = out[0] if out.ndim == 4 else out
+    np.subtract(np.transpose(resized_image, (2, 0, 1)), np.float32(127.5), out=chw_out)
+    np.multiply(chw_out, np.float32(1 / 128.0), out=chw_out)
 
-    return input_tensor
\ No newline at end of file
+    return out
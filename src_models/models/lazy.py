@@ -0,0 +1,74 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class LazyModel(Generic[T]):
+    """
+    A stand-in for a model that is constructed on first use or by an explicit `load`.
+
+    Attribute access is forwarded to the loaded model, so the proxy can be
+    passed wherever the model itself is expected. Loading happens once, under
+    a lock; callers arriving while it runs wait for it instead of loading a
+    second copy.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        """
+        Initialize the proxy without loading the model.
+
+        Parameters:
+        - name (str): Name reported in the load status.
+        - factory (Callable[[], T]): Constructs the model.
+        """
+        self.name: str = name
+        self.factory: Callable[[], T] = factory
+        self.state: str = "pending"
+        self.load_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> T:
+        """
+        Construct the model unless it is already loaded; a failed load is retried.
+
+        Returns:
+        - T: The loaded model.
+        """
+        instance = self._instance
+        if instance is not None:
+            return instance
+        with self._lock:
+            if self._instance is None:
+                self.state = "loading"
+                start = time.perf_counter()
+                try:
+                    self._instance = self.factory()
+                except Exception as e:
+                    self.state, self.error = "failed", str(e)
+                    raise
+                self.load_seconds = time.perf_counter() - start
+                self.state, self.error = "ready", None
+            return self._instance
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Return the load state of the model.
+
+        Returns:
+        - Dict[str, Any]: State ("pending", "loading", "ready" or "failed"), load time and error.
+        """
+        return {"state": self.state, "load_seconds": self.load_seconds, "error": self.error}
+
+    def __getattr__(self, attribute: str) -> Any:
+        # Only reached for attributes the proxy itself does not define
+        if attribute.startswith("_"):
+            raise AttributeError(attribute)
+        return getattr(self.load(), attribute)
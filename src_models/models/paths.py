@@ -6,4 +6,5 @@ CHECKPOINTS_ROOT = Path.cwd() / "src_models" / "models" / "checkpoints"
 class ModelPaths(Enum):
     FACE_DETECTOR = CHECKPOINTS_ROOT / "blaze_face_short_range.tflite"
     FACE_LANDMARKER = CHECKPOINTS_ROOT / "face_landmarker.task"
-    FACE_EMBEDDER = CHECKPOINTS_ROOT / "face_embedder.onnx"
\ No newline at end of file
+    FACE_EMBEDDER = CHECKPOINTS_ROOT / "face_embedder.onnx"
+    FACE_EMBEDDER_INT8 = CHECKPOINTS_ROOT / "face_embedder.int8.onnx"
\ No newline at end of file
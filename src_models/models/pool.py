@@ -0,0 +1,107 @@
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Generic, Iterable, Iterator, NamedTuple, TypeVar
+
+from .face_detector import FaceDetector
+from .face_landmarker import FaceLandmarker
+
+T = TypeVar("T")
+
+
+class FaceModels(NamedTuple):
+    """
+    The MediaPipe models used together by one detect-align-crop pipeline.
+    """
+
+    landmarker: FaceLandmarker
+    detector: FaceDetector
+
+
+class ModelPool(Generic[T]):
+    """
+    A bounded pool of model instances with checkout/return semantics.
+
+    Each checked-out instance is used by one thread at a time, so models that
+    are not safe to call concurrently can still serve parallel requests.
+    Instances are created lazily up to `size`; once all of them are in use,
+    `checkout` blocks until one is returned.
+    """
+
+    def __init__(self, factory: Callable[[], T], size: int, initial: Iterable[T] = ()):
+        """
+        Initialize the pool.
+
+        Parameters:
+        - factory (Callable[[], T]): Creates a new model instance.
+        - size (int): Maximum number of instances.
+        - initial (Iterable[T]): Already created instances to seed the pool with.
+        """
+        self.factory: Callable[[], T] = factory
+        self.size: int = max(size, 1)
+        self._idle: "queue.LifoQueue[T]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.created: int = 0
+        self.in_use: int = 0
+        self.waits: int = 0
+
+        for instance in initial:
+            if self.created >= self.size:
+                break
+            self._idle.put(instance)
+            self.created += 1
+
+    @contextmanager
+    def checkout(self) -> Iterator[T]:
+        """
+        Borrow an instance for the duration of a `with` block.
+
+        Yields:
+        - T: A model instance not used by any other thread.
+        """
+        instance = self._acquire()
+        try:
+            yield instance
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._idle.put(instance)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the pool size and utilization.
+
+        Returns:
+        - Dict[str, Any]: Configured size, created and busy instances, and checkouts that had to wait.
+        """
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self.created,
+                "in_use": self.in_use,
+                "waits": self.waits,
+            }
+
+    def _acquire(self) -> T:
+        try:
+            instance = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self.created < self.size
+                if create:
+                    self.created += 1
+                else:
+                    self.waits += 1
+            if create:
+                try:
+                    instance = self.factory()
+                except Exception:
+                    with self._lock:
+                        self.created -= 1
+                    raise
+            else:
+                instance = self._idle.get()
+
+        with self._lock:
+            self.in_use += 1
+        return instance
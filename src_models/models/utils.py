@@ -1,10 +1,45 @@
 # import torch
+import itertools
+import random
+import threading
 import cv2
 import numpy as np
 
 from fastapi import HTTPException
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from src_models.models import FACE_DETECTOR, FACE_LANDMARKER
+from src_models.config import (
+    CASCADE_CROP_SCALE,
+    CASCADE_DETECT_SIDE,
+    CROP_MODE,
+    CROP_VALIDATION_RATE,
+    LANDMARK_CASCADE,
+)
+from src_models.models import FACE_DETECTOR, FACE_LANDMARKER, FaceModels
+from src_models.models.face_detector import FaceDetector
+from src_models.models.face_landmarker import FaceLandmarker
+from src_models.models.face_verifier import cosine_similarities
+
+# Landmarks used for alignment: right eye, left eye, nose tip, right and left mouth corners
+ALIGNMENT_LANDMARK_INDICES = [468, 473, 4, 61, 291]
+# Where those landmarks are mapped to in the aligned image
+ALIGNMENT_TARGET_POINTS = np.array(
+    [(251, 272), (364, 272), (308, 336), (262, 402), (355, 402)], dtype=np.float32
+)
+ALIGNED_IMAGE_SIZE = 616
+# Landmark pairs LMedS fits candidate similarities through in cv2.estimateAffinePartial2D
+_ALIGNMENT_PAIRS = np.array(list(itertools.combinations(range(len(ALIGNMENT_LANDMARK_INDICES)), 2)))
+# Share of the LMedS outlier threshold above which a face is aligned by cv2 itself; the margin
+# covers candidate pairs LMedS samples differently
+LMEDS_OUTLIER_MARGIN = 0.5
+# Face mesh points on the right and left cheek contour, used to estimate yaw
+YAW_LANDMARK_INDICES = (234, 454)
+# Side of the face as the embedder sees it, at which sharpness is measured
+QUALITY_IMAGE_SIZE = 112
+# Sharpness at which a face counts as half sharp; a clear face is around 1000, a blurred one below 50
+QUALITY_SHARPNESS_HALF = 100.0
+# Iris distance in pixels from which a face carries all the detail the 112 px embedder input holds
+QUALITY_FULL_EYE_DISTANCE = 40.0
 
 # def get_device() -> str:
 #     """
@@ -16,7 +51,7 @@ from src_models.models import FACE_DETECTOR, FACE_LANDMARKER
 #         return "cpu"
     
     
-def align_face(image, landmarks):
+def align_face(image, landmarks, transform_landmarks: bool = True):
 
     # Define key points
     # C_r = np.mean([landmarks[133], landmarks[33]], axis=0)  # Right eye center
@@ -29,7 +64,7 @@ def align_face(image, landmarks):
 
     # Source and target points
     src_pts = np.array([C_r, C_l, N, M_r, M_l], dtype=np.float32)
-    dst_pts = np.array([(251, 272), (364, 272), (308, 336), (262, 402), (355, 402)], dtype=np.float32)
+    dst_pts = ALIGNMENT_TARGET_POINTS
 
     # Compute affine transformation
     T_matrix, _ = cv2.estimateAffinePartial2D(src_pts, dst_pts, method=cv2.LMEDS)
@@ -37,27 +72,488 @@ def align_face(image, landmarks):
         raise ValueError("Failed to compute affine transformation matrix.")
 
     # Transform image
-    aligned_image = cv2.warpAffine(image, T_matrix, (616, 616), borderValue=(0, 0, 0))
+    aligned_image = cv2.warpAffine(image, T_matrix, (ALIGNED_IMAGE_SIZE, ALIGNED_IMAGE_SIZE), borderValue=(0, 0, 0))
 
-    # Transform landmarks
-    homogeneous_landmarks = np.hstack([landmarks, np.ones((landmarks.shape[0], 1), dtype=np.float32)])
-    transformed_landmarks = (homogeneous_landmarks @ T_matrix.T)[:, :2]
+    # Transform landmarks, unless the caller has no use for them
+    if not transform_landmarks:
+        return aligned_image, None
+    transformed_landmarks = landmarks @ T_matrix[:, :2].T + T_matrix[:, 2]
 
     return aligned_image, transformed_landmarks
 
-def detect_align_crop_face(image):
-    #PROPER
-    landmarks = FACE_LANDMARKER.detect_landmarks(image)
+def estimate_alignment_transforms(landmarks: np.ndarray) -> np.ndarray:
+    """
+    Estimate the alignment similarity transforms of a stack of faces at once.
+
+    Solves the least-squares similarity transform (rotation, uniform scale and
+    translation) mapping each face's alignment landmarks onto
+    ALIGNMENT_TARGET_POINTS in closed form, vectorized over the batch. That is
+    what cv2.estimateAffinePartial2D with LMEDS, as used by `align_face`,
+    converges to when it keeps every landmark. Faces where LMedS may discard a
+    landmark as an outlier are fitted with cv2 instead, so frames are aligned
+    exactly like still images.
+
+    Parameters:
+    - landmarks (np.ndarray): Landmarks of shape (N, num_landmarks, 2).
+
+    Returns:
+    - np.ndarray: Affine matrices of shape (N, 2, 3).
+    """
+    src = landmarks[:, ALIGNMENT_LANDMARK_INDICES, :].astype(np.float64)
+    dst = ALIGNMENT_TARGET_POINTS.astype(np.float64)
+    src_mean = src.mean(axis=1)
+    dst_mean = dst.mean(axis=0)
+    src_centered = src - src_mean[:, None, :]
+    dst_centered = dst - dst_mean
+
+    # Similarity parameters [[a, -b], [b, a]] minimizing the squared point error
+    variance = np.sum(src_centered**2, axis=(1, 2))
+    a = np.einsum("nij,ij->n", src_centered, dst_centered) / variance
+    b = (
+        np.sum(src_centered[..., 0] * dst_centered[:, 1] - src_centered[..., 1] * dst_centered[:, 0], axis=1)
+        / variance
+    )
+
+    transforms = np.empty((len(landmarks), 2, 3), dtype=np.float64)
+    transforms[:, 0, 0], transforms[:, 0, 1] = a, -b
+    transforms[:, 1, 0], transforms[:, 1, 1] = b, a
+    transforms[:, :, 2] = dst_mean - np.einsum("nij,nj->ni", transforms[:, :, :2], src_mean)
+
+    for n in np.flatnonzero(_lmeds_may_drop_landmarks(src, dst)):
+        transform, _ = cv2.estimateAffinePartial2D(src[n].astype(np.float32), ALIGNMENT_TARGET_POINTS, method=cv2.LMEDS)
+        transforms[n] = np.nan if transform is None else transform
+    return transforms
+
+
+def _lmeds_may_drop_landmarks(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    # Replays the outlier test of OpenCV's LMedS over every landmark pair: the similarity through
+    # the pair with the least median squared error sets the threshold, 2.5 robust standard deviations
+    src_points = src[..., 0] + 1j * src[..., 1]
+    dst_points = dst[:, 0] + 1j * dst[:, 1]
+    first, second = _ALIGNMENT_PAIRS[:, 0], _ALIGNMENT_PAIRS[:, 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = (dst_points[second] - dst_points[first]) / (src_points[:, second] - src_points[:, first])
+        shift = dst_points[first] - scale * src_points[:, first]
+        errors = np.abs(scale[..., None] * src_points[:, None, :] + shift[..., None] - dst_points) ** 2
+        errors = np.nan_to_num(errors, nan=np.inf)
+
+    count = src.shape[1]
+    medians = np.sort(errors, axis=2)[..., count // 2]
+    best = np.argmin(medians, axis=1)
+    rows = np.arange(len(src))
+    sigma = np.maximum(2.5 * 1.4826 * (1 + 5.0 / (count - 2)) * np.sqrt(medians[rows, best]), 0.001)
+    return np.any(errors[rows, best] > LMEDS_OUTLIER_MARGIN * sigma[:, None] ** 2, axis=1)
+
+
+def landmark_face_box(aligned_landmarks: np.ndarray) -> Tuple[int, int, int, int]:
+    """
+    Derive a face box from aligned landmarks, in place of running the detector.
+
+    The box is the square centered on the landmarks' extent, with its larger
+    side, so that the crop keeps the square aspect of detector boxes.
+
+    Parameters:
+    - aligned_landmarks (np.ndarray): Landmarks in aligned image coordinates, of shape (n, 2).
+
+    Returns:
+    - Tuple[int, int, int, int]: Bounding box (x, y, width, height), as returned by FaceDetector.detect_face.
+    """
+    low = aligned_landmarks.min(axis=0)
+    high = aligned_landmarks.max(axis=0)
+    side = float(np.max(high - low))
+    center_x, center_y = (low + high) / 2
+    return (
+        int(round(center_x - side / 2)),
+        int(round(center_y - side / 2)),
+        int(round(side)),
+        int(round(side)),
+    )
+
+
+def box_iou(box1: Tuple[int, int, int, int], box2: Tuple[int, int, int, int]) -> float:
+    """
+    Intersection over union of two (x, y, width, height) boxes.
+    """
+    x1, y1 = max(box1[0], box2[0]), max(box1[1], box2[1])
+    x2 = min(box1[0] + box1[2], box2[0] + box2[2])
+    y2 = min(box1[1] + box1[3], box2[1] + box2[3])
+    intersection = max(x2 - x1, 0) * max(y2 - y1, 0)
+    union = box1[2] * box1[3] + box2[2] * box2[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+# Landmark and detector boxes overlapping less than this count as a disagreement
+CROP_DISAGREEMENT_IOU = 0.5
+
+
+class CropValidator:
+    """
+    Runs the detector on a sample of landmark-derived crops and tracks how well they agree.
+
+    Validation only feeds the statistics: the landmark crop is used either way,
+    so whether a request happens to be sampled never changes its result.
+    """
+
+    def __init__(self, rate: float):
+        """
+        Initialize the validator.
+
+        Parameters:
+        - rate (float): Fraction of faces validated, between 0 and 1.
+        """
+        self.rate: float = rate
+        self.checked: int = 0
+        self.missed: int = 0
+        self.disagreed: int = 0
+        self.iou_total: float = 0.0
+        self._lock = threading.Lock()
+
+    def should_validate(self) -> bool:
+        return self.rate > 0 and random.random() < self.rate
+
+    def record(self, landmark_box: Tuple[int, int, int, int], detected_box: Optional[Tuple[int, int, int, int]]) -> None:
+        """
+        Record the outcome of one validation.
+
+        Parameters:
+        - landmark_box (Tuple[int, int, int, int]): Box derived from the landmarks.
+        - detected_box (Optional[Tuple[int, int, int, int]]): Box found by the detector, or None.
+        """
+        with self._lock:
+            self.checked += 1
+            if not detected_box:
+                self.missed += 1
+                self.disagreed += 1
+                return
+            iou = box_iou(landmark_box, detected_box)
+            self.iou_total += iou
+            if iou < CROP_DISAGREEMENT_IOU:
+                self.disagreed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return validation counters.
+
+        Returns:
+        - Dict[str, Any]: Validated faces, those the detector missed or boxed differently, and the
+                          mean IoU of landmark and detector boxes where it found a face.
+        """
+        with self._lock:
+            found = self.checked - self.missed
+            return {
+                "rate": self.rate,
+                "checked": self.checked,
+                "missed": self.missed,
+                "disagreed": self.disagreed,
+                "mean_iou": self.iou_total / found if found else None,
+            }
+
+
+CROP_VALIDATOR = CropValidator(CROP_VALIDATION_RATE)
+
+
+def crop_aligned_face(
+    aligned_image: np.ndarray, aligned_landmarks: np.ndarray, detector: FaceDetector, crop_mode: str = CROP_MODE
+) -> np.ndarray:
+    """
+    Crop the face out of an aligned image.
+
+    Parameters:
+    - aligned_image (np.ndarray): Output of the alignment warp.
+    - aligned_landmarks (np.ndarray): Landmarks in aligned image coordinates.
+    - detector (FaceDetector): Detector used for the box, or to validate the landmark box.
+    - crop_mode (str): "detector" to detect the face box, "landmarks" to derive it from the landmarks.
+
+    Returns:
+    - np.ndarray: The cropped face.
+
+    Raises:
+    - HTTPException: If the face is cropped with the detector and it finds no face.
+    """
+    if crop_mode == "landmarks":
+        face_coords = landmark_face_box(aligned_landmarks)
+        if CROP_VALIDATOR.should_validate():
+            CROP_VALIDATOR.record(face_coords, detector.detect_face(aligned_image))
+    else:
+        face_coords = detector.detect_face(aligned_image)
+        if not face_coords:
+            raise HTTPException(status_code=400, detail="No face detected!")
+    return detector.crop_face(aligned_image, face_coords)
+
+
+def _resolve_models(models: Optional[FaceModels]) -> FaceModels:
+    # Callers serving requests pass instances checked out of FACE_MODEL_POOL
+    return models if models is not None else FaceModels(FACE_LANDMARKER, FACE_DETECTOR)
+
+
+def face_search_region(
+    image_shape: Tuple[int, ...], face_coords: Tuple[int, int, int, int], scale: float
+) -> Tuple[int, int, int, int]:
+    """
+    Square region around a face box that gives the landmarker enough context.
+
+    Parameters:
+    - image_shape (Tuple[int, ...]): Shape of the image the box refers to.
+    - face_coords (Tuple[int, int, int, int]): Face box (x, y, width, height).
+    - scale (float): Side of the region relative to the larger side of the box.
+
+    Returns:
+    - Tuple[int, int, int, int]: Region (x_start, y_start, x_end, y_end), clipped to the image.
+    """
+    x, y, w, h = face_coords
+    half_side = max(w, h) * scale / 2
+    center_x, center_y = x + w / 2, y + h / 2
+    height, width = image_shape[:2]
+    return (
+        max(int(center_x - half_side), 0),
+        max(int(center_y - half_side), 0),
+        min(int(np.ceil(center_x + half_side)), width),
+        min(int(np.ceil(center_y + half_side)), height),
+    )
+
+
+def detect_landmarks_cascade(
+    image: np.ndarray,
+    landmarker,
+    detector,
+    detect_side: int = CASCADE_DETECT_SIDE,
+    crop_scale: float = CASCADE_CROP_SCALE,
+) -> Optional[np.ndarray]:
+    """
+    Detect landmarks by finding the face first and landmarking only the region around it.
+
+    The detector runs on a copy of the image downscaled to `detect_side`, which
+    is cheap at any input resolution; the landmarker then sees the face at full
+    resolution instead of the whole frame. If the detector finds nothing, the
+    whole image is landmarked as before.
+
+    Parameters:
+    - image (np.ndarray): Input image.
+    - landmarker (FaceLandmarker): Landmarker to use.
+    - detector (FaceDetector): Detector to use.
+    - detect_side (int): Long side of the image the detector runs on.
+    - crop_scale (float): Side of the landmarked region relative to the detected face box.
+
+    Returns:
+    - Optional[np.ndarray]: Landmarks of shape (n, 2) in `image` coordinates, or None if none are found.
+    """
+    factor = max(image.shape[:2]) / detect_side
+    # Bilinear rather than area interpolation: the detector downsamples to 128 px
+    # anyway, and area interpolation of a 4K frame costs as much as the detector
+    small_image = (
+        cv2.resize(image, (round(image.shape[1] / factor), round(image.shape[0] / factor)), interpolation=cv2.INTER_LINEAR)
+        if factor > 1
+        else image
+    )
+    face_coords = detector.detect_face(small_image)
+    if not face_coords:
+        return landmarker.detect_landmarks(image)
+
+    scale = max(factor, 1.0)
+    full_coords = tuple(int(round(value * scale)) for value in face_coords)
+    x_start, y_start, x_end, y_end = face_search_region(image.shape, full_coords, crop_scale)
+    landmarks = landmarker.detect_landmarks(image[y_start:y_end, x_start:x_end])
+    if landmarks is None:
+        return landmarker.detect_landmarks(image)
+    landmarks += np.array([x_start, y_start], dtype=landmarks.dtype)
+    return landmarks
+
+
+def detect_landmarks_checked(image, landmarker=None, detector=None, cascade: bool = LANDMARK_CASCADE):
+    """
+    Detect facial landmarks, rejecting images without a usable face.
+
+    With `cascade`, landmarks are found with detect_landmarks_cascade.
+    """
+    if cascade:
+        landmarks = detect_landmarks_cascade(image, landmarker or FACE_LANDMARKER, detector or FACE_DETECTOR)
+    else:
+        landmarks = (landmarker or FACE_LANDMARKER).detect_landmarks(image)
     if landmarks is None or landmarks.size == 0 or np.any(landmarks == None):
         raise HTTPException(status_code=400, detail="No valid landmarks detected!")
+    return landmarks
 
-    aligned_image, aligned_landmarks = align_face(image, landmarks)
 
-    face_coords = FACE_DETECTOR.detect_face(aligned_image)
-    if not face_coords:
-        raise HTTPException(status_code=400, detail="No face detected!")
+def face_sharpness(face_image: np.ndarray) -> float:
+    """
+    Variance of the Laplacian of a face crop, at the resolution the embedder sees.
+
+    Blurred and motion-smeared faces have little high-frequency content and score low.
+    """
+    gray = cv2.cvtColor(face_image, cv2.COLOR_BGR2GRAY) if face_image.ndim == 3 else face_image
+    gray = cv2.resize(gray, (QUALITY_IMAGE_SIZE, QUALITY_IMAGE_SIZE), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def estimate_yaw(landmarks: np.ndarray) -> float:
+    """
+    Rough head yaw in degrees from where the nose tip sits between the cheek contours.
+
+    The nose projects to the middle of the cheek line for a frontal face and
+    towards one cheek as the head turns; the sign follows that cheek's side.
+    """
+    right, left = landmarks[YAW_LANDMARK_INDICES[0]], landmarks[YAW_LANDMARK_INDICES[1]]
+    axis = left - right
+    length_squared = float(np.dot(axis, axis))
+    if length_squared == 0:
+        return 90.0
+    position = float(np.dot(landmarks[4] - right, axis)) / length_squared
+    return float(np.degrees(np.arcsin(np.clip(2 * position - 1, -1.0, 1.0))))
+
+
+def frame_quality(face_image: np.ndarray, landmarks: np.ndarray) -> float:
+    """
+    Score how well a face suits verification, for ranking and weighting video frames.
+
+    The score is the product of three factors in [0, 1]: sharpness
+    s / (s + QUALITY_SHARPNESS_HALF), face size (iris distance relative to
+    QUALITY_FULL_EYE_DISTANCE, capped at 1) and pose (cos² of the yaw).
+
+    Parameters:
+    - face_image (np.ndarray): The cropped aligned face.
+    - landmarks (np.ndarray): Landmarks of the face in its frame.
+
+    Returns:
+    - float: The quality in [0, 1]; a blurred, tiny or profile face scores near 0.
+    """
+    sharpness = face_sharpness(face_image)
+    sharpness_factor = sharpness / (sharpness + QUALITY_SHARPNESS_HALF)
+    size_factor = min(eye_distance(landmarks) / QUALITY_FULL_EYE_DISTANCE, 1.0)
+    pose_factor = np.cos(np.radians(estimate_yaw(landmarks))) ** 2
+    return float(sharpness_factor * size_factor * pose_factor)
+
+
+def align_crop_video_faces(
+    frames: Iterable[np.ndarray],
+    models: Optional[FaceModels] = None,
+    crop_mode: str = CROP_MODE,
+    video_landmarker: Optional[FaceLandmarker] = None,
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Find, align and crop the face in each of a sequence of video frames.
+
+    Frames where no face is found, or where the detector rejects the aligned
+    crop, are skipped rather than failing the sequence.
+
+    Parameters:
+    - frames (Iterable[np.ndarray]): Frames in playback order.
+    - models (Optional[FaceModels]): Landmarker and detector to use; the shared instances by default.
+    - crop_mode (str): "detector" or "landmarks", see crop_aligned_face.
+    - video_landmarker (Optional[FaceLandmarker]): A landmarker in "video" running mode that
+      tracks the face from one frame to the next; every frame is searched whole otherwise,
+      with detect_landmarks_cascade if LANDMARK_CASCADE is set.
+
+    Yields:
+    - Tuple[int, np.ndarray, np.ndarray]: Index of the frame, the cropped aligned face and its
+      landmarks in the frame.
+    """
+    landmarker, detector = _resolve_models(models)
+    for index, frame in enumerate(frames):
+        if video_landmarker is not None:
+            landmarks = video_landmarker.detect_video_landmarks(frame)
+        elif LANDMARK_CASCADE:
+            landmarks = detect_landmarks_cascade(frame, landmarker, detector)
+        else:
+            landmarks = landmarker.detect_landmarks(frame)
+        if landmarks is None or landmarks.size == 0 or not np.all(np.isfinite(landmarks)):
+            continue
+        try:
+            aligned_image, aligned_landmarks = align_face(frame, landmarks, crop_mode == "landmarks")
+            face_image = crop_aligned_face(aligned_image, aligned_landmarks, detector, crop_mode)
+        except (HTTPException, ValueError):
+            continue
+        yield index, face_image, landmarks
+
+
+def detect_align_crop_faces(
+    images: List[np.ndarray],
+    models: Optional[FaceModels] = None,
+    crop_mode: str = CROP_MODE,
+    transform_landmarks: bool = True,
+) -> Iterator[Tuple[np.ndarray, Optional[np.ndarray]]]:
+    """
+    Detect, align and crop the face in each image of a batch.
 
-    aligned_facial_image = FACE_DETECTOR.crop_face(aligned_image, face_coords)
+    Alignment transforms are estimated for the whole batch at once and every
+    image is warped into the same preallocated buffer, so each yielded crop is
+    a view that is only valid until the next item is requested.
+
+    Parameters:
+    - images (List[np.ndarray]): Input images of equal dtype.
+    - models (Optional[FaceModels]): Landmarker and detector to use; the shared instances by default.
+    - crop_mode (str): "detector" or "landmarks", see crop_aligned_face.
+    - transform_landmarks (bool): Map the landmarks into the aligned image; None is yielded in
+                                  their place otherwise.
+
+    Yields:
+    - Tuple[np.ndarray, Optional[np.ndarray]]: The cropped aligned face and its aligned landmarks.
+    """
+    if not images:
+        return
+
+    landmarker, detector = _resolve_models(models)
+    landmarks = np.stack([detect_landmarks_checked(image, landmarker, detector) for image in images])
+    transforms = estimate_alignment_transforms(landmarks)
+    if not np.all(np.isfinite(transforms)):
+        raise ValueError("Failed to compute affine transformation matrix.")
+
+    # The landmark crop needs the aligned landmarks even if the caller does not
+    if transform_landmarks or crop_mode == "landmarks":
+        aligned_landmarks = np.einsum("nij,nkj->nki", transforms[:, :, :2], landmarks) + transforms[:, None, :, 2]
+    else:
+        aligned_landmarks = [None] * len(images)
+
+    aligned_image = np.empty((ALIGNED_IMAGE_SIZE, ALIGNED_IMAGE_SIZE, 3), dtype=images[0].dtype)
+    for image, transform, face_landmarks in zip(images, transforms, aligned_landmarks):
+        cv2.warpAffine(
+            image,
+            transform,
+            (ALIGNED_IMAGE_SIZE, ALIGNED_IMAGE_SIZE),
+            dst=aligned_image,
+            borderValue=(0, 0, 0),
+        )
+
+        yield (
+            crop_aligned_face(aligned_image, face_landmarks, detector, crop_mode),
+            face_landmarks if transform_landmarks else None,
+        )
+
+
+def eye_distance(landmarks: np.ndarray) -> float:
+    """
+    Distance in pixels between the iris centers used for alignment.
+    """
+    return float(np.linalg.norm(landmarks[ALIGNMENT_LANDMARK_INDICES[0]] - landmarks[ALIGNMENT_LANDMARK_INDICES[1]]))
+
+
+def detect_align_crop_face(
+    image,
+    models: Optional[FaceModels] = None,
+    full_resolution: Optional[Callable[[], Optional[np.ndarray]]] = None,
+    min_eye_distance: float = 0.0,
+    crop_mode: str = CROP_MODE,
+    transform_landmarks: bool = True,
+):
+    #PROPER
+    landmarker, detector = _resolve_models(models)
+    landmarks = detect_landmarks_checked(image, landmarker, detector)
+
+    # `image` may be a reduced decode: landmarks found on it are reused, but the
+    # face is warped from the full-resolution image when it is too small to keep detail
+    if full_resolution is not None and eye_distance(landmarks) < min_eye_distance:
+        full_image = full_resolution()
+        if full_image is not None:
+            scale = np.array(
+                [full_image.shape[1] / image.shape[1], full_image.shape[0] / image.shape[0]],
+                dtype=np.float32,
+            )
+            image, landmarks = full_image, landmarks * scale
+
+    aligned_image, aligned_landmarks = align_face(image, landmarks, transform_landmarks or crop_mode == "landmarks")
+
+    aligned_facial_image = crop_aligned_face(aligned_image, aligned_landmarks, detector, crop_mode)
+    if not transform_landmarks:
+        aligned_landmarks = None
 
     # # Draw landmarks
     # for x, y in aligned_landmarks:
@@ -71,6 +567,71 @@ def detect_align_crop_face(image):
 
     return aligned_facial_image, aligned_landmarks
 
+def detect_align_crop_all_faces(
+    image: np.ndarray,
+    models: Optional[FaceModels] = None,
+    full_resolution: Optional[Callable[[], Optional[np.ndarray]]] = None,
+    min_eye_distance: float = 0.0,
+    crop_mode: str = CROP_MODE,
+) -> List[Tuple[np.ndarray, Tuple[int, int, int, int]]]:
+    """
+    Detect, align and crop every face in an image, up to the landmarker's `max_faces`.
+
+    Faces are handled as in detect_align_crop_face, each one warped from the
+    full-resolution image if it is too small in a reduced decode. Faces the
+    detector rejects after alignment are left out.
+
+    Parameters:
+    - image (np.ndarray): Input image.
+    - models (Optional[FaceModels]): Landmarker and detector to use; the shared instances by default.
+    - full_resolution (Optional[Callable]): Decodes the full-resolution image when `image` is a reduced decode.
+    - min_eye_distance (float): Iris distance in pixels below which a face is warped from the full-resolution image.
+    - crop_mode (str): "detector" or "landmarks", see crop_aligned_face.
+
+    Returns:
+    - List[Tuple[np.ndarray, Tuple[int, int, int, int]]]: Each cropped aligned face with the
+      bounding box (x, y, width, height) of its landmarks in `image`.
+
+    Raises:
+    - HTTPException: If no usable face is found.
+    """
+    landmarker, detector = _resolve_models(models)
+    faces = [
+        landmarks for landmarks in landmarker.detect_all_landmarks(image)
+        if landmarks.size and np.all(np.isfinite(landmarks))
+    ]
+    if not faces:
+        raise HTTPException(status_code=400, detail="No valid landmarks detected!")
+
+    full_image = None
+    results = []
+    for landmarks in faces:
+        low, high = landmarks.min(axis=0), landmarks.max(axis=0)
+        box = (int(low[0]), int(low[1]), int(high[0] - low[0]), int(high[1] - low[1]))
+
+        source, source_landmarks = image, landmarks
+        if full_resolution is not None and eye_distance(landmarks) < min_eye_distance:
+            # Decoded once, for the first face that needs it
+            if full_image is None:
+                full_image = full_resolution()
+            if full_image is not None:
+                scale = np.array(
+                    [full_image.shape[1] / image.shape[1], full_image.shape[0] / image.shape[0]],
+                    dtype=np.float32,
+                )
+                source, source_landmarks = full_image, landmarks * scale
+
+        aligned_image, aligned_landmarks = align_face(source, source_landmarks, crop_mode == "landmarks")
+        try:
+            results.append((crop_aligned_face(aligned_image, aligned_landmarks, detector, crop_mode), box))
+        except HTTPException:
+            continue
+
+    if not results:
+        raise HTTPException(status_code=400, detail="No face detected!")
+    return results
+
+
 def cosine_similarity(embedding1, embedding2):
     """
     Calculate cosine similarity between two embeddings.
@@ -78,4 +639,4 @@ def cosine_similarity(embedding1, embedding2):
     embedding1 = np.squeeze(embedding1) 
     embedding2 = np.squeeze(embedding2)
     dot_product = np.dot(embedding1, embedding2)
-    return  dot_product / (np.linalg.norm(embedding1) * np.linalg.norm(embedding2))
\ No newline at end of file
+    return  dot_product / (np.linalg.norm(embedding1) * np.linalg.norm(embedding2))
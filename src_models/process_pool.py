@@ -0,0 +1,132 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+FACE_TENSOR_SHAPE = (3, 112, 112)
+# Keep every array in a segment aligned for vectorized access
+SEGMENT_ALIGNMENT = 64
+
+# (offset, shape, dtype string) of one array inside a shared memory segment
+ArrayLayout = Tuple[int, Tuple[int, ...], str]
+
+
+def _aligned(size: int) -> int:
+    return -(-size // SEGMENT_ALIGNMENT) * SEGMENT_ALIGNMENT
+
+
+def _init_worker() -> None:
+    # Load the MediaPipe models once per process instead of on the first request;
+    # workers never run the embedder, so it is not loaded here
+    from src_models.models import FACE_DETECTOR, FACE_LANDMARKER
+
+    FACE_LANDMARKER.load()
+    FACE_DETECTOR.load()
+
+
+def _preprocess_in_worker(segment_name: str, layouts: List[ArrayLayout], output_offset: int) -> Optional[str]:
+    """
+    Preprocess the images of a shared memory segment into its output tensor.
+
+    Runs in a worker process. Returns None on success, or the error message,
+    so that no exception object has to be pickled back.
+    """
+    from src_models.models.face_verifier import preprocess_image_direct
+    from src_models.models.utils import detect_align_crop_face, detect_align_crop_faces
+
+    segment = shared_memory.SharedMemory(name=segment_name)
+    try:
+        images = [
+            np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf, offset=offset)
+            for offset, shape, dtype in layouts
+        ]
+        output = np.ndarray(
+            (len(images),) + FACE_TENSOR_SHAPE, dtype=np.float32, buffer=segment.buf, offset=output_offset
+        )
+        try:
+            if len(images) == 1:
+                aligned_image, _ = detect_align_crop_face(images[0], transform_landmarks=False)
+                preprocess_image_direct(aligned_image, out=output[0])
+            else:
+                for i, (aligned_image, _) in enumerate(detect_align_crop_faces(images, transform_landmarks=False)):
+                    preprocess_image_direct(aligned_image, out=output[i])
+        except Exception as e:
+            return str(e)
+        finally:
+            # Views must be released before the segment can be closed
+            del images, output
+        return None
+    finally:
+        segment.close()
+
+
+class PreprocessProcessPool:
+    """
+    A pool of worker processes running face detection, alignment and preprocessing.
+
+    Each process loads its own models once, so preprocessing is not limited by
+    the GIL of the serving process. Decoded images and the resulting tensors are
+    exchanged through one shared memory segment per call; only the segment name
+    and array layout are pickled.
+    """
+
+    def __init__(self, processes: int):
+        """
+        Initialize the pool; worker processes are started on first use.
+
+        Args:
+            processes (int): Number of worker processes.
+        """
+        self.processes: int = processes
+        # Spawn rather than fork: MediaPipe and ONNX Runtime own threads that do not survive a fork
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+
+    def process_images(self, images: List[np.ndarray]) -> np.ndarray:
+        """
+        Detect, align and preprocess the face in each image in a worker process.
+
+        Blocks the calling thread until the worker is done.
+
+        Args:
+            images (List[np.ndarray]): Decoded input images.
+
+        Returns:
+            np.ndarray: The preprocessed faces of shape (N, 3, 112, 112).
+
+        Raises:
+            RuntimeError: If preprocessing fails for any image.
+        """
+        layouts: List[ArrayLayout] = []
+        offset = 0
+        for image in images:
+            layouts.append((offset, image.shape, image.dtype.str))
+            offset += _aligned(image.nbytes)
+        output_offset = offset
+        output_shape = (len(images),) + FACE_TENSOR_SHAPE
+
+        segment = shared_memory.SharedMemory(
+            create=True, size=max(output_offset + int(np.prod(output_shape)) * 4, 1)
+        )
+        try:
+            for image, (image_offset, shape, dtype) in zip(images, layouts):
+                np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf, offset=image_offset)[...] = image
+
+            error = self._executor.submit(
+                _preprocess_in_worker, segment.name, layouts, output_offset
+            ).result()
+            if error is not None:
+                raise RuntimeError(error)
+
+            return np.ndarray(output_shape, dtype=np.float32, buffer=segment.buf, offset=output_offset).copy()
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -1,14 +1,63 @@
-import cv2
+import heapq
+import threading
+from contextlib import ExitStack
+
 import magic
 import numpy as np
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
 from fastapi import HTTPException, UploadFile
 
-from src_models.models.utils import detect_align_crop_face
-from src_models.models.face_verifier import preprocess_image_direct
+from src_models.config import (
+    CASCADE_CROP_SCALE,
+    CASCADE_DETECT_SIDE,
+    CROP_MODE,
+    DECODE_MIN_EYE_DISTANCE,
+    DECODE_TARGET_SIDE,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_SIZE,
+    EMBEDDING_MODEL_VERSION,
+    LANDMARK_CASCADE,
+    PREPROCESS_PROCESSES,
+    PREPROCESS_QUEUE_SIZE,
+    PREPROCESS_WORKERS,
+)
+from src_models.embedding_cache import EmbeddingCache
+from src_models.executor import BoundedExecutor
+from src_models.image_decode import decode_image, jpeg_reduction_factor
+from src_models.models import FACE_BATCHER, FACE_EMBEDDER_PATH, FACE_MODEL_POOL, FACE_VIDEO_LANDMARKER_POOL
+from src_models.models.utils import (
+    align_crop_video_faces,
+    detect_align_crop_all_faces,
+    detect_align_crop_face,
+    detect_align_crop_faces,
+    frame_quality,
+)
+from src_models.models.face_verifier import model_file_version, preprocess_image_direct
+from src_models.process_pool import PreprocessProcessPool
 
 ALLOWED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tiff", ".webp", ".mp4", "webm")
 ALLOWED_MIME_TYPES = ("image/jpeg", "image/png", "image/tiff", "image/webp")
 
+# libmagic handles are costly to open and not safe to share, so each thread keeps one
+_MAGIC_LOCAL = threading.local()
+
+EMBEDDING_CACHE = EmbeddingCache(
+    max_entries=EMBEDDING_CACHE_SIZE,
+    disk_dir=EMBEDDING_CACHE_DIR or None,
+    model_version=EMBEDDING_MODEL_VERSION or model_file_version(FACE_EMBEDDER_PATH),
+    # Settings that change the face crop of an upload, and so its embedding
+    pipeline=(
+        f"crop={CROP_MODE};cascade={LANDMARK_CASCADE},{CASCADE_DETECT_SIDE},{CASCADE_CROP_SCALE};"
+        f"decode={DECODE_TARGET_SIDE if PREPROCESS_PROCESSES == 0 else 0},{DECODE_MIN_EYE_DISTANCE}"
+    ),
+)
+
+# CPU-bound request work (hashing, decoding, landmarking) runs here, never on the event loop
+PREPROCESS_EXECUTOR = BoundedExecutor(PREPROCESS_WORKERS, PREPROCESS_QUEUE_SIZE)
+
+# Optionally move detection, alignment and preprocessing out of the GIL of this process
+PREPROCESS_PROCESS_POOL = PreprocessProcessPool(PREPROCESS_PROCESSES) if PREPROCESS_PROCESSES > 0 else None
+
 
 def validate_file_extension(filename: str) -> None:
     """
@@ -26,6 +75,34 @@ def validate_file_extension(filename: str) -> None:
         )
 
 
+def sniff_image_mime(data: bytes) -> Optional[str]:
+    """
+    Recognize the allowed image formats from their leading magic bytes.
+
+    Args:
+        data (bytes): The binary content of the file.
+
+    Returns:
+        Optional[str]: The MIME type, or None if the signature is not recognized.
+    """
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    return None
+
+
+def _magic_handle() -> magic.Magic:
+    handle = getattr(_MAGIC_LOCAL, "handle", None)
+    if handle is None:
+        handle = _MAGIC_LOCAL.handle = magic.Magic(mime=True)
+    return handle
+
+
 def validate_file_mime(image_data: bytes) -> None:
     """
     Validate the MIME type of a file using its content.
@@ -36,19 +113,24 @@ def validate_file_mime(image_data: bytes) -> None:
     Raises:
         HTTPException: If the MIME type is not allowed.
     """
-    mime_type = magic.Magic(mime=True).from_buffer(image_data)
+    # Only content the fast path does not recognize goes through libmagic
+    mime_type = sniff_image_mime(image_data) or _magic_handle().from_buffer(image_data)
     if mime_type not in ALLOWED_MIME_TYPES:
         raise HTTPException(
             status_code=400, detail=f"Unsupported MIME type: {mime_type}"
         )
 
 
-def process_image_sync(image: np.ndarray) -> np.ndarray:
+def process_image_sync(
+    image: np.ndarray, full_resolution: Optional[Callable[[], Optional[np.ndarray]]] = None
+) -> np.ndarray:
     """
     Detect, align, and preprocess a face image.
 
     Args:
         image (np.ndarray): The input image as a NumPy array.
+        full_resolution (Optional[Callable]): Decodes the full-resolution image when `image` is a
+                                              reduced decode, used if the face is too small in it.
 
     Returns:
         np.ndarray: The preprocessed image.
@@ -57,7 +139,13 @@ def process_image_sync(image: np.ndarray) -> np.ndarray:
         ValueError: If face detection or preprocessing fails.
     """
     try:
-        aligned_image, _ = detect_align_crop_face(image)
+        if PREPROCESS_PROCESS_POOL is not None:
+            return PREPROCESS_PROCESS_POOL.process_images([image])
+
+        with FACE_MODEL_POOL.checkout() as models:
+            aligned_image, _ = detect_align_crop_face(
+                image, models, full_resolution, DECODE_MIN_EYE_DISTANCE, transform_landmarks=False
+            )
         preprocessed_image = preprocess_image_direct(aligned_image)
         return preprocessed_image
     except Exception as e:
@@ -67,6 +155,137 @@ def process_image_sync(image: np.ndarray) -> np.ndarray:
     )
 
 
+def process_images_sync(images: List[np.ndarray]) -> np.ndarray:
+    """
+    Detect, align, and preprocess the face in each image of a batch.
+
+    Args:
+        images (List[np.ndarray]): The input images, e.g. frames of one video.
+
+    Returns:
+        np.ndarray: The preprocessed faces stacked into one tensor of shape (N, 3, 112, 112).
+
+    Raises:
+        HTTPException: If face detection or preprocessing fails for any image.
+    """
+    try:
+        if PREPROCESS_PROCESS_POOL is not None:
+            return PREPROCESS_PROCESS_POOL.process_images(images)
+
+        batch = np.empty((len(images), 3, 112, 112), dtype=np.float32)
+        with FACE_MODEL_POOL.checkout() as models:
+            for i, (aligned_image, _) in enumerate(detect_align_crop_faces(images, models, transform_landmarks=False)):
+                preprocess_image_direct(aligned_image, out=batch[i])
+        return batch
+    except Exception as e:
+        raise HTTPException(
+        status_code=400,
+        detail=f"Error during image preprocessing: {str(e)}"
+    )
+
+
+# Bounding box (x, y, width, height) of a face in its image
+FaceBox = Tuple[int, int, int, int]
+
+
+def process_image_faces_sync(
+    image: np.ndarray, full_resolution: Optional[Callable[[], Optional[np.ndarray]]] = None
+) -> Tuple[np.ndarray, List[FaceBox]]:
+    """
+    Detect, align, and preprocess every face in an image.
+
+    Always runs in this process, also when PREPROCESS_PROCESSES is set.
+
+    Args:
+        image (np.ndarray): The input image as a NumPy array.
+        full_resolution (Optional[Callable]): Decodes the full-resolution image when `image` is a
+                                              reduced decode, used for faces too small in it.
+
+    Returns:
+        Tuple[np.ndarray, List[FaceBox]]: The preprocessed faces of shape (N, 3, 112, 112)
+            and the box of each face in `image`.
+
+    Raises:
+        HTTPException: If no face is found or preprocessing fails.
+    """
+    try:
+        with FACE_MODEL_POOL.checkout() as models:
+            faces = detect_align_crop_all_faces(image, models, full_resolution, DECODE_MIN_EYE_DISTANCE)
+        batch = np.empty((len(faces), 3, 112, 112), dtype=np.float32)
+        for i, (aligned_image, _) in enumerate(faces):
+            preprocess_image_direct(aligned_image, out=batch[i])
+        return batch, [box for _, box in faces]
+    except Exception as e:
+        raise HTTPException(
+        status_code=400,
+        detail=f"Error during image preprocessing: {str(e)}"
+    )
+
+
+def process_images_faces_sync(images: Sequence[np.ndarray]) -> Tuple[np.ndarray, List[List[FaceBox]]]:
+    """
+    Detect, align, and preprocess every face in each image of a batch.
+
+    Args:
+        images (Sequence[np.ndarray]): The input images, e.g. frames of one video.
+
+    Returns:
+        Tuple[np.ndarray, List[List[FaceBox]]]: The preprocessed faces of all images stacked
+            into one tensor of shape (N, 3, 112, 112), in image order, and the boxes of each image.
+
+    Raises:
+        HTTPException: If no face is found in any image or preprocessing fails.
+    """
+    batches, boxes = zip(*(process_image_faces_sync(image) for image in images))
+    return np.concatenate(batches), list(boxes)
+
+
+def select_video_faces_sync(
+    frames: Iterable[np.ndarray], count: int, tracking: bool = False
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the face in each video frame and preprocess it in the `count` best-quality frames.
+
+    Landmarking and cropping every candidate is the cheap pre-pass; only the
+    selected faces are preprocessed and go on to the embedder. Frames are
+    consumed one at a time and only the best faces so far are kept, so memory
+    does not grow with the number of candidates. Always runs in this process,
+    also when PREPROCESS_PROCESSES is set.
+
+    Args:
+        frames (Iterable[np.ndarray]): Candidate frames in playback order.
+        count (int): Number of frames to keep.
+        tracking (bool): Landmark the frames with a video-mode landmarker checked out of
+            FACE_VIDEO_LANDMARKER_POOL, which follows the face from one frame to the next.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The preprocessed faces of the selected frames of shape
+            (M, 3, 112, 112), M <= count, in playback order, and their quality scores in [0, 1].
+
+    Raises:
+        HTTPException: If no face is found in any of the frames.
+    """
+    # Min-heap of (quality, frame index, tensor); the worst kept frame is evicted first
+    best: List[Tuple[float, int, np.ndarray]] = []
+    with ExitStack() as stack:
+        models = stack.enter_context(FACE_MODEL_POOL.checkout())
+        video_landmarker = stack.enter_context(FACE_VIDEO_LANDMARKER_POOL.checkout()) if tracking else None
+        for index, face_image, landmarks in align_crop_video_faces(frames, models, video_landmarker=video_landmarker):
+            quality = frame_quality(face_image, landmarks)
+            if len(best) < count:
+                heapq.heappush(best, (quality, index, preprocess_image_direct(face_image)))
+            elif quality > best[0][0]:
+                heapq.heapreplace(best, (quality, index, preprocess_image_direct(face_image)))
+
+    if not best:
+        raise HTTPException(status_code=400, detail="No face found in the video frames.")
+    best.sort(key=lambda item: item[1])
+    return (
+        np.concatenate([tensor for _, _, tensor in best]),
+        np.array([quality for quality, _, _ in best], dtype=np.float32),
+    )
+
+
 async def process_image(file: UploadFile) -> np.ndarray:
     """
     Validate and preprocess an uploaded image file.
@@ -86,17 +305,133 @@ async def process_image(file: UploadFile) -> np.ndarray:
     # Read image binary data
     image_data = await file.read()
 
+    return await PREPROCESS_EXECUTOR.run(preprocess_image_bytes, image_data)
+
+
+def preprocess_image_bytes(image_data: bytes) -> np.ndarray:
+    """
+    Validate, decode and preprocess raw image bytes.
+
+    Args:
+        image_data (bytes): The binary content of the uploaded image.
+
+    Returns:
+        np.ndarray: The preprocessed image ready for model inference.
+
+    Raises:
+        HTTPException: If validation or processing fails.
+    """
     # Validate MIME type
     validate_file_mime(image_data)
 
-    # Decode image using OpenCV
-    image_array = np.frombuffer(image_data, dtype=np.uint8)
-    image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+    # Decode image using OpenCV, downscaling large JPEGs while decoding. Worker
+    # processes cannot call back for the full-resolution image, so they get it directly
+    target_side = DECODE_TARGET_SIDE if PREPROCESS_PROCESS_POOL is None else 0
+    image, full_resolution = decode_image(image_data, target_side)
 
     if image is None:
         raise HTTPException(status_code=400, detail="Invalid or corrupted image file")
 
     # Perform synchronous image processing
-    preprocessed_image = process_image_sync(image)
+    preprocessed_image = process_image_sync(image, full_resolution)
 
     return preprocessed_image
+
+
+def preprocess_image_faces_bytes(image_data: bytes) -> Tuple[np.ndarray, List[FaceBox]]:
+    """
+    Validate, decode and preprocess every face in raw image bytes.
+
+    Args:
+        image_data (bytes): The binary content of the uploaded image.
+
+    Returns:
+        Tuple[np.ndarray, List[FaceBox]]: The preprocessed faces of shape (N, 3, 112, 112) and
+            the box of each face in the full-resolution image.
+
+    Raises:
+        HTTPException: If validation or processing fails.
+    """
+    validate_file_mime(image_data)
+
+    image, full_resolution = decode_image(image_data, DECODE_TARGET_SIDE)
+    if image is None:
+        raise HTTPException(status_code=400, detail="Invalid or corrupted image file")
+
+    batch, boxes = process_image_faces_sync(image, full_resolution)
+    if full_resolution is not None:
+        # Report boxes in the coordinates of the uploaded image, not of the reduced decode.
+        # The decode applies EXIF orientation, so the frame header's width and height may be
+        # swapped relative to the image; the reduction factor scales both axes alike
+        scale = jpeg_reduction_factor(image_data, DECODE_TARGET_SIDE)
+        boxes = [(x * scale, y * scale, w * scale, h * scale) for x, y, w, h in boxes]
+    return batch, boxes
+
+
+def lookup_cached_embedding(image_data: bytes) -> Tuple[str, Optional[np.ndarray]]:
+    """
+    Hash an upload and look it up in the embedding cache.
+
+    Args:
+        image_data (bytes): The binary content of the uploaded image.
+
+    Returns:
+        Tuple[str, Optional[np.ndarray]]: The cache key and the cached embedding, or None on a miss.
+    """
+    cache_key = EMBEDDING_CACHE.key(image_data)
+    return cache_key, EMBEDDING_CACHE.get(cache_key)
+
+
+async def embed_image(file: UploadFile) -> np.ndarray:
+    """
+    Validate an uploaded image file and compute its face embedding.
+
+    Uploads whose exact bytes were embedded before are served from the
+    embedding cache without decoding, landmarking or running the embedder.
+
+    Args:
+        file (UploadFile): The uploaded image file.
+
+    Returns:
+        np.ndarray: The face embedding of shape (1, D).
+
+    Raises:
+        HTTPException: If validation or processing fails.
+    """
+    validate_file_extension(file.filename)
+    image_data = await file.read()
+
+    cache_key, embedding = await PREPROCESS_EXECUTOR.run(lookup_cached_embedding, image_data)
+    if embedding is not None:
+        return embedding
+
+    preprocessed_image = await PREPROCESS_EXECUTOR.run(preprocess_image_bytes, image_data)
+    embedding = await FACE_BATCHER.forward(preprocessed_image)
+    if EMBEDDING_CACHE.disk_dir:
+        # The disk tier writes a file, which must not block the event loop
+        await PREPROCESS_EXECUTOR.run(EMBEDDING_CACHE.put, cache_key, embedding)
+    else:
+        EMBEDDING_CACHE.put(cache_key, embedding)
+
+    return embedding
+
+
+async def embed_image_faces(file: UploadFile) -> Tuple[np.ndarray, List[FaceBox]]:
+    """
+    Validate an uploaded image file and embed every face in it with one embedder call.
+
+    Args:
+        file (UploadFile): The uploaded image file.
+
+    Returns:
+        Tuple[np.ndarray, List[FaceBox]]: Face embeddings of shape (N, D) and the box of each face.
+
+    Raises:
+        HTTPException: If validation or processing fails.
+    """
+    validate_file_extension(file.filename)
+    image_data = await file.read()
+
+    preprocessed_faces, boxes = await PREPROCESS_EXECUTOR.run(preprocess_image_faces_bytes, image_data)
+    embeddings = await FACE_BATCHER.forward(preprocessed_faces)
+    return embeddings, boxes
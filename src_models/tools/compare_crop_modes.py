@@ -0,0 +1,82 @@
+"""
+Compare the landmark-derived face crop with the detector crop on a set of images.
+
+For every image with a detectable face, both crop modes are run on the same
+aligned image. The report lists the IoU of the two boxes, the cosine
+similarity of the two embeddings and the time spent cropping, and counts the
+verification decisions over all image pairs that differ between the modes at
+the service threshold.
+
+Usage:
+    python -m src_models.tools.compare_crop_modes test_images /data/faces
+"""
+import argparse
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from src_models.config import SIMILARITY_THRESHOLD
+from src_models.models import FACE_DETECTOR, FACE_EMBEDDER, FACE_LANDMARKER
+from src_models.models.face_verifier import preprocess_image_direct
+from src_models.models.utils import align_face, box_iou, crop_aligned_face, detect_landmarks_checked, landmark_face_box
+from src_models.tools.quantize_embedder import IMAGE_SUFFIXES, decision_changes, embedding_drift
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Image files or folders")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD, help="Verification threshold")
+    args = parser.parse_args()
+
+    files = []
+    for path in map(Path, args.paths):
+        files.extend(sorted(p for p in path.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES) if path.is_dir() else [path])
+
+    tensors = {"detector": [], "landmarks": []}
+    crop_seconds = {"detector": 0.0, "landmarks": 0.0}
+    print(f"{'image':<40} {'iou':>6} {'cosine':>8}")
+    for path in files:
+        image = cv2.imread(str(path))
+        if image is None:
+            continue
+        try:
+            aligned_image, aligned_landmarks = align_face(image, detect_landmarks_checked(image, FACE_LANDMARKER))
+            detected_box = FACE_DETECTOR.detect_face(aligned_image)
+            if not detected_box:
+                raise ValueError("No face detected!")
+        except Exception as e:
+            print(f"{str(path):<40} skipped: {e}")
+            continue
+
+        crops = {}
+        for mode in tensors:
+            start = time.perf_counter()
+            crops[mode] = crop_aligned_face(aligned_image, aligned_landmarks, FACE_DETECTOR, mode)
+            crop_seconds[mode] += time.perf_counter() - start
+            tensors[mode].append(preprocess_image_direct(crops[mode]))
+
+        embeddings = FACE_EMBEDDER.forward_batch(np.concatenate([tensors["detector"][-1], tensors["landmarks"][-1]]))
+        cosine = float(np.dot(embeddings[0], embeddings[1]) / np.linalg.norm(embeddings, axis=1).prod())
+        iou = box_iou(landmark_face_box(aligned_landmarks), detected_box)
+        print(f"{str(path):<40} {iou:>6.3f} {cosine:>8.4f}")
+
+    count = len(tensors["detector"])
+    if count == 0:
+        print("No images with a detectable face.")
+        return
+    detector_embeddings = FACE_EMBEDDER.forward_batch(np.concatenate(tensors["detector"]))
+    landmark_embeddings = FACE_EMBEDDER.forward_batch(np.concatenate(tensors["landmarks"]))
+    drift = embedding_drift(detector_embeddings, landmark_embeddings)
+    decisions = decision_changes(detector_embeddings, landmark_embeddings, args.threshold)
+
+    print(f"\n{count} faces: mean cosine {drift['mean_cosine']:.4f}, min {drift['min_cosine']:.4f}")
+    print(f"{decisions['flipped']} of {decisions['pairs']} pair decisions differ at threshold {args.threshold} "
+          f"(largest score change {decisions['max_score_change']:.4f})")
+    for mode, seconds in crop_seconds.items():
+        print(f"crop time ({mode}): {seconds / count * 1000:.2f} ms/face")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Quantize the face embedder to INT8 and promote it only if it stays accurate.
+
+Calibration faces are the images under test_images plus optional folders,
+run through the service's own detect/align/preprocess pipeline. The quantized
+model is compared with the FP32 model on faces it was not calibrated on,
+taken from --eval-dir or else held out of the calibration faces: the
+embedding cosine drift and the number of verification decisions that flip at
+the service threshold are reported, and the model is written to
+ModelPaths.FACE_EMBEDDER_INT8 only if both are within bounds.
+
+Usage:
+    python -m src_models.tools.quantize_embedder --calibration-dir /data/faces --eval-dir /data/eval --mode static
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from itertools import combinations
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import cv2
+import numpy as np
+
+from src_models.config import SIMILARITY_THRESHOLD
+from src_models.models.face_verifier import FaceEmbedderBackbone
+from src_models.models.paths import ModelPaths
+from src_models.request_utils import process_image_sync
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".tiff", ".webp")
+
+
+def load_faces(directories: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Preprocess every image with a detectable face, in a stable order.
+
+    Args:
+        directories (List[str]): Folders to read images from.
+
+    Returns:
+        Dict[str, np.ndarray]: Preprocessed (1, 3, 112, 112) tensors keyed by image path.
+    """
+    faces = {}
+    for directory in directories:
+        for path in sorted(Path(directory).rglob("*")):
+            if path.suffix.lower() not in IMAGE_SUFFIXES:
+                continue
+            image = cv2.imread(str(path))
+            if image is None:
+                continue
+            try:
+                faces[str(path)] = process_image_sync(image)
+            except Exception as e:
+                print(f"skipping {path}: {e}")
+    return faces
+
+
+def hold_out(faces: Dict[str, np.ndarray], fraction: float) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """
+    Split faces into calibration and evaluation sets, the same way on every run.
+
+    Faces are ordered by a hash of their path, so adding an image never moves
+    an existing face from calibration into evaluation.
+
+    Args:
+        faces (Dict[str, np.ndarray]): Preprocessed faces keyed by image path.
+        fraction (float): Share of the faces held out for evaluation; at least two are, and one is kept.
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]: Calibration faces and evaluation faces.
+    """
+    ordered = sorted(faces, key=lambda path: hashlib.sha256(path.encode()).hexdigest())
+    count = min(max(2, round(len(ordered) * fraction)), len(ordered) - 1)
+    evaluation = set(ordered[:count])
+    return (
+        {path: face for path, face in faces.items() if path not in evaluation},
+        {path: face for path, face in faces.items() if path in evaluation},
+    )
+
+
+class FaceCalibrationReader:
+    """
+    Feeds calibration tensors to onnxruntime's static quantization.
+    """
+
+    def __init__(self, input_name: str, tensors: List[np.ndarray]):
+        self.input_name = input_name
+        self.tensors = tensors
+        self._iterator: Iterator[np.ndarray] = iter(tensors)
+
+    def get_next(self):
+        tensor = next(self._iterator, None)
+        return None if tensor is None else {self.input_name: tensor}
+
+    def rewind(self) -> None:
+        self._iterator = iter(self.tensors)
+
+
+def quantize(model_path: str, output_path: str, mode: str, calibration: List[np.ndarray], input_name: str) -> None:
+    """
+    Write an INT8 version of `model_path` to `output_path`.
+
+    Args:
+        model_path (str): FP32 ONNX model.
+        output_path (str): Destination of the quantized model.
+        mode (str): "dynamic" (weights only) or "static" (weights and activations, calibrated).
+        calibration (List[np.ndarray]): Calibration tensors, used in static mode.
+        input_name (str): Name of the model input.
+    """
+    # Imported lazily: quantization needs the onnx package, which serving does not
+    from onnxruntime.quantization import (
+        CalibrationMethod,
+        QuantFormat,
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+
+    if mode == "dynamic":
+        quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8, per_channel=True)
+        return
+    quantize_static(
+        model_path,
+        output_path,
+        FaceCalibrationReader(input_name, calibration),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+
+
+def embedding_drift(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """
+    Compare embeddings of the same faces from two models.
+
+    Args:
+        reference (np.ndarray): FP32 embeddings of shape (N, D).
+        candidate (np.ndarray): Quantized embeddings of shape (N, D).
+
+    Returns:
+        Dict[str, float]: Mean, minimum and 1st percentile of the per-face cosine similarity.
+    """
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosine = np.sum(reference * candidate, axis=1)
+    return {
+        "mean_cosine": float(cosine.mean()),
+        "min_cosine": float(cosine.min()),
+        "p01_cosine": float(np.percentile(cosine, 1)),
+        "max_drift": float(1.0 - cosine.min()),
+    }
+
+
+def decision_changes(reference: np.ndarray, candidate: np.ndarray, threshold: float) -> Dict[str, Any]:
+    """
+    Count verification decisions that differ between two models over all face pairs.
+
+    Scores use the service's mapping (cosine + 1) / 2.
+
+    Args:
+        reference (np.ndarray): FP32 embeddings of shape (N, D).
+        candidate (np.ndarray): Quantized embeddings of shape (N, D).
+        threshold (float): Decision threshold on the mapped score.
+
+    Returns:
+        Dict[str, Any]: Number of pairs, flipped decisions and the largest score change.
+    """
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    pairs = list(combinations(range(len(reference)), 2))
+    if not pairs:
+        return {"pairs": 0, "flipped": 0, "max_score_change": 0.0}
+    first, second = (np.array(index) for index in zip(*pairs))
+    reference_scores = (np.sum(reference[first] * reference[second], axis=1) + 1) / 2
+    candidate_scores = (np.sum(candidate[first] * candidate[second], axis=1) + 1) / 2
+    flipped = (reference_scores >= threshold) != (candidate_scores >= threshold)
+    return {
+        "pairs": len(pairs),
+        "flipped": int(flipped.sum()),
+        "max_score_change": float(np.abs(reference_scores - candidate_scores).max()),
+    }
+
+
+def passes_gate(report: Dict[str, Any], max_drift: float, max_flipped: int) -> bool:
+    """
+    Decide whether a quantized model may replace the FP32 one.
+    """
+    return report["drift"]["max_drift"] <= max_drift and report["decisions"]["flipped"] <= max_flipped
+
+
+def throughput(embedder: FaceEmbedderBackbone, tensors: np.ndarray, repeats: int = 20) -> float:
+    embedder.forward_batch(tensors)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        embedder.forward_batch(tensors)
+    return repeats * len(tensors) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=str(ModelPaths.FACE_EMBEDDER.value), help="FP32 ONNX model")
+    parser.add_argument("--output", default=str(ModelPaths.FACE_EMBEDDER_INT8.value), help="Promoted INT8 model path")
+    parser.add_argument("--calibration-dir", action="append", default=[], help="Extra folder of face images")
+    parser.add_argument("--eval-dir", action="append", default=[], help="Folder of face images the gate is measured on")
+    parser.add_argument(
+        "--eval-fraction", type=float, default=0.3, help="Calibration faces held out for the gate without --eval-dir"
+    )
+    parser.add_argument("--mode", choices=["dynamic", "static"], default="static")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD, help="Verification threshold")
+    parser.add_argument("--max-drift", type=float, default=0.02, help="Largest accepted 1 - cosine per face")
+    parser.add_argument("--max-flipped", type=int, default=0, help="Largest accepted number of flipped decisions")
+    args = parser.parse_args()
+
+    calibration = load_faces(["test_images"] + args.calibration_dir)
+    if args.eval_dir:
+        evaluation = load_faces(args.eval_dir)
+    elif len(calibration) >= 3:
+        # Measuring on the calibration faces would hide overfitted activation ranges
+        calibration, evaluation = hold_out(calibration, args.eval_fraction)
+    else:
+        sys.exit("Need at least three images with a detectable face, or an --eval-dir.")
+    if not calibration or len(evaluation) < 2:
+        sys.exit("Need calibration faces and at least two evaluation images with a detectable face.")
+    tensors = np.concatenate(list(evaluation.values()), axis=0)
+
+    fp32 = FaceEmbedderBackbone(args.model)
+    # Work next to the output so that promotion is an atomic rename
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(args.output))) as work_dir:
+        candidate_path = os.path.join(work_dir, "candidate.onnx")
+        quantize(args.model, candidate_path, args.mode, list(calibration.values()), fp32.input_name)
+        int8 = FaceEmbedderBackbone(candidate_path)
+
+        reference = fp32.forward_batch(tensors)
+        candidate = int8.forward_batch(tensors)
+        report = {
+            "mode": args.mode,
+            "calibration_images": list(calibration),
+            "evaluation_images": list(evaluation),
+            "evaluation_sha256": hashlib.sha256(tensors.tobytes()).hexdigest(),
+            "threshold": args.threshold,
+            "drift": embedding_drift(reference, candidate),
+            "decisions": decision_changes(reference, candidate, args.threshold),
+            "throughput_fp32": throughput(fp32, tensors),
+            "throughput_int8": throughput(int8, tensors),
+        }
+        report["promoted"] = passes_gate(report, args.max_drift, args.max_flipped)
+        print(json.dumps(report, indent=2))
+
+        if not report["promoted"]:
+            sys.exit(
+                f"Not promoting: drift {report['drift']['max_drift']:.4f} (max {args.max_drift}), "
+                f"{report['decisions']['flipped']} flipped decisions (max {args.max_flipped})."
+            )
+        os.replace(candidate_path, args.output)
+    with open(f"{args.output}.report.json", "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Promoted {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+import heapq
+import itertools
+import tempfile
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+
+def sample_frame_indices(total_frames: int, sample_count: int) -> List[int]:
+    """
+    Choose evenly spaced frame indices covering the whole clip.
+
+    Args:
+        total_frames (int): Number of frames in the video.
+        sample_count (int): Number of frames to sample.
+
+    Returns:
+        List[int]: Sorted, unique frame indices.
+    """
+    indices = np.linspace(0, total_frames - 1, sample_count, dtype=int)
+    return np.unique(indices).tolist()
+
+
+def refinement_order(count: int, first: int) -> List[int]:
+    """
+    Order sample positions coarse to fine, so that every prefix covers the whole clip.
+
+    The first `first` positions are spread evenly over all `count`; each
+    following position halves the widest gap left between positions already taken.
+
+    Args:
+        count (int): Number of planned samples.
+        first (int): Number of samples spread over the whole clip before refining.
+
+    Returns:
+        List[int]: A permutation of range(count).
+    """
+    order = sample_frame_indices(count, max(first, 1))
+    taken = sorted(order)
+    gaps = [(low - high, low, high) for low, high in zip(taken, taken[1:] + [count]) if high - low > 1]
+    heapq.heapify(gaps)
+    while gaps:
+        _, low, high = heapq.heappop(gaps)
+        middle = (low + high) // 2
+        order.append(middle)
+        for gap_low, gap_high in ((low, middle), (middle, high)):
+            if gap_high - gap_low > 1:
+                heapq.heappush(gaps, (gap_low - gap_high, gap_low, gap_high))
+    return order
+
+
+def sample_frame_timestamps(total_frames: int, fps: float, sample_count: int) -> List[float]:
+    """
+    Choose evenly spaced timestamps covering the whole clip.
+
+    Args:
+        total_frames (int): Number of frames in the video.
+        fps (float): Nominal frame rate of the video.
+        sample_count (int): Number of frames to sample.
+
+    Returns:
+        List[float]: Sorted timestamps in milliseconds.
+    """
+    duration_ms = (total_frames - 1) / fps * 1000.0
+    return np.linspace(0.0, duration_ms, sample_count).tolist()
+
+
+def iter_frames_at_indices(
+    cap: cv2.VideoCapture, frame_indices: List[int], max_grab_gap: Optional[int] = None, start: int = 0
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Decode the requested frames in one forward pass, seeking over long gaps.
+
+    Frames that are not requested are only grabbed, which skips the colour
+    conversion and copy of `retrieve`, but still decodes them. A seek decodes
+    from the previous keyframe instead, so it is cheaper once the gap exceeds
+    about one keyframe interval. Decoding stops right after the last requested frame.
+
+    Args:
+        cap (cv2.VideoCapture): An opened video positioned at frame `start`.
+        frame_indices (List[int]): Sorted frame indices to return, none before `start`.
+        max_grab_gap (Optional[int]): Seek instead of grabbing when the next requested
+                                      frame is further ahead than this; None never seeks,
+                                      which only pays off for very long keyframe intervals.
+        start (int): Index of the frame the next grab decodes.
+
+    Yields:
+        Tuple[int, np.ndarray]: Frame index and the decoded BGR frame.
+    """
+    wanted = iter(frame_indices)
+    target = next(wanted, None)
+    index = start
+    while target is not None:
+        if max_grab_gap is not None and target - index > max_grab_gap:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            index = target
+        if not cap.grab():
+            return
+        if index == target:
+            ret, frame = cap.retrieve()
+            if ret:
+                yield index, frame
+            target = next(wanted, None)
+        index += 1
+
+
+def iter_frames_at_timestamps(
+    cap: cv2.VideoCapture, timestamps_ms: List[float]
+) -> Iterator[Tuple[float, np.ndarray]]:
+    """
+    Decode the first frame at or after each requested timestamp in a single pass.
+
+    Sampling by presentation timestamp keeps samples evenly spaced in time for
+    variable frame rate clips, where frame indices and time are not proportional.
+
+    Args:
+        cap (cv2.VideoCapture): An opened video positioned at its first frame.
+        timestamps_ms (List[float]): Sorted timestamps in milliseconds.
+
+    Yields:
+        Tuple[float, np.ndarray]: Frame timestamp in milliseconds and the decoded BGR frame.
+    """
+    pending = list(timestamps_ms)
+    while pending:
+        if not cap.grab():
+            return
+        timestamp = cap.get(cv2.CAP_PROP_POS_MSEC)
+        if timestamp + 1e-3 < pending[0]:
+            continue
+
+        # One frame may satisfy several targets when the frame rate is lower than assumed
+        while pending and pending[0] <= timestamp + 1e-3:
+            pending.pop(0)
+        ret, frame = cap.retrieve()
+        if ret:
+            yield timestamp, frame
+
+
+class VideoFrameSampler:
+    """
+    Hands out evenly spaced frames of a video progressively.
+
+    By default the samples are decoded in order in one pass. With `first_pass`,
+    samples are handed out coarse to fine instead: the first `first_pass`
+    span the whole clip and later ones fill the gaps between them, so a caller
+    that stops early has still seen all of the clip. Each `read` then decodes
+    its frames in one forward pass, seeking to the first of them.
+    """
+
+    def __init__(
+        self,
+        video_path: str,
+        sample_count: int,
+        by_timestamp: bool = False,
+        max_grab_gap: Optional[int] = None,
+        first_pass: Optional[int] = None,
+    ):
+        """
+        Open the video and plan the sampled frames.
+
+        Args:
+            video_path (str): Path of the video file.
+            sample_count (int): Number of frames to sample.
+            by_timestamp (bool): Space samples by timestamp instead of by frame index.
+            max_grab_gap (Optional[int]): See `iter_frames_at_indices`.
+            first_pass (Optional[int]): Number of samples spread over the whole clip before
+                                        the rest refine it; None hands samples out in order.
+        """
+        self.cap = cv2.VideoCapture(video_path)
+        self.total_frames: int = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.max_grab_gap: Optional[int] = max_grab_gap
+        self._frames: Iterator[Tuple[float, np.ndarray]] = iter(())
+        # Samples still to hand out coarse to fine, or None when they are read in order
+        self._pending: Optional[list] = None
+        self._by_timestamp: bool = False
+        self._rewind: bool = False
+        if self.total_frames <= 0:
+            return
+
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self._by_timestamp = by_timestamp and fps > 0
+        if self._by_timestamp:
+            plan = sample_frame_timestamps(self.total_frames, fps, sample_count)
+        else:
+            plan = sample_frame_indices(self.total_frames, sample_count)
+
+        if first_pass is not None and first_pass < len(plan):
+            self._pending = [plan[position] for position in refinement_order(len(plan), first_pass)]
+        elif self._by_timestamp:
+            self._frames = iter_frames_at_timestamps(self.cap, plan)
+        else:
+            self._frames = iter_frames_at_indices(self.cap, plan, max_grab_gap)
+
+    def read(self, count: int) -> List[np.ndarray]:
+        """
+        Decode the next sampled frames.
+
+        Args:
+            count (int): Maximum number of frames to return.
+
+        Returns:
+            List[np.ndarray]: Up to `count` BGR frames; empty once the samples are exhausted.
+        """
+        if self._pending is None:
+            return [frame for _, frame in itertools.islice(self._frames, count)]
+
+        frames: List[np.ndarray] = []
+        while self._pending and not frames:
+            batch, self._pending = sorted(self._pending[:count]), self._pending[count:]
+            frames = [frame for _, frame in self._decode(batch)]
+        return frames
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        """
+        Decode the remaining sampled frames one at a time.
+        """
+        if self._pending is None:
+            return (frame for _, frame in self._frames)
+        return itertools.chain.from_iterable(iter(lambda: self.read(1), []))
+
+    def _decode(self, batch: list) -> Iterator[Tuple[float, np.ndarray]]:
+        # Later batches lie anywhere in the clip, so seek back or ahead to their first sample
+        start = 0
+        if self._rewind:
+            if self._by_timestamp:
+                self.cap.set(cv2.CAP_PROP_POS_MSEC, batch[0])
+            else:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, batch[0])
+                start = batch[0]
+        self._rewind = True
+        if self._by_timestamp:
+            return iter_frames_at_timestamps(self.cap, batch)
+        return iter_frames_at_indices(self.cap, batch, self.max_grab_gap, start)
+
+    def close(self) -> None:
+        self.cap.release()
+
+    def __enter__(self) -> "VideoFrameSampler":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def sample_video_frames(
+    video_path: str,
+    sample_count: int,
+    by_timestamp: bool = False,
+    max_grab_gap: Optional[int] = None,
+) -> Tuple[int, List[np.ndarray]]:
+    """
+    Open a video file and decode evenly spaced sample frames in one pass.
+
+    Args:
+        video_path (str): Path of the video file.
+        sample_count (int): Number of frames to sample.
+        by_timestamp (bool): Space samples by timestamp instead of by frame index.
+        max_grab_gap (Optional[int]): See `iter_frames_at_indices`.
+
+    Returns:
+        Tuple[int, List[np.ndarray]]: Frame count reported by the container and the decoded frames.
+    """
+    with VideoFrameSampler(video_path, sample_count, by_timestamp, max_grab_gap) as sampler:
+        return sampler.total_frames, sampler.read(sample_count)
+
+
+class SequentialSimilarityTest:
+    """
+    A sequential test deciding whether per-frame similarity scores lie above a threshold.
+
+    Scores are added as frames are processed. The test stops as soon as the
+    running mean is more than `z_score` standard errors away from the threshold
+    (after at least `min_frames` scores), or when `max_frames` scores are in.
+    Scores may carry weights, e.g. frame quality, which the mean then honours.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        min_frames: int,
+        max_frames: int,
+        z_score: float = 2.0,
+        min_std: float = 0.02,
+    ):
+        """
+        Initialize the test.
+
+        Args:
+            threshold (float): Decision threshold of the mean similarity.
+            min_frames (int): Scores required before stopping early.
+            max_frames (int): Scores after which the test always stops.
+            z_score (float): Standard errors between mean and threshold needed to stop early.
+            min_std (float): Lower bound of the score standard deviation, so that a few
+                             near-identical frames do not look infinitely certain.
+        """
+        self.threshold: float = threshold
+        self.min_frames: int = min_frames
+        self.max_frames: int = max(max_frames, min_frames)
+        self.z_score: float = z_score
+        self.min_std: float = min_std
+        self.scores: List[float] = []
+        self.weights: List[float] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.scores)
+
+    @property
+    def mean(self) -> float:
+        if not self.scores:
+            return 0.0
+        # All-zero weights would leave the weighted mean undefined
+        if sum(self.weights) <= 0:
+            return float(np.mean(self.scores))
+        return float(np.average(self.scores, weights=self.weights))
+
+    @property
+    def confident(self) -> bool:
+        """
+        Whether the mean is significantly above or below the threshold.
+        """
+        if self.count < max(self.min_frames, 2):
+            return False
+        std = max(float(np.std(self.scores, ddof=1)), self.min_std)
+        return abs(self.mean - self.threshold) > self.z_score * std / np.sqrt(self.count)
+
+    @property
+    def done(self) -> bool:
+        return self.count >= self.max_frames or self.confident
+
+    def add(self, scores: List[float], weights: Optional[Sequence[float]] = None) -> None:
+        self.scores.extend(scores)
+        self.weights.extend([1.0] * len(scores) if weights is None else [float(weight) for weight in weights])
+
+    def next_batch_size(self, step: int) -> int:
+        """
+        Number of frames to process before the test is consulted again.
+
+        Args:
+            step (int): Frames per batch once `min_frames` scores are in.
+
+        Returns:
+            int: The batch size, never taking the count past `max_frames`.
+        """
+        if self.count < self.min_frames:
+            return self.min_frames - self.count
+        return min(step, self.max_frames - self.count)
+
+
+@asynccontextmanager
+async def spooled_upload(
+    upload: UploadFile, max_bytes: int, suffix: str = ".mp4"
+) -> AsyncIterator[str]:
+    """
+    Copy an upload to a temporary file chunk by chunk.
+
+    Only one chunk is held in memory at a time, and the size limit is enforced
+    while copying, so an oversized upload is rejected before it is fully written.
+    Chunks are written to disk in the thread pool, off the event loop.
+
+    Args:
+        upload (UploadFile): The uploaded file.
+        max_bytes (int): Largest accepted upload size in bytes.
+        suffix (str): Suffix of the temporary file, used by OpenCV to pick a demuxer.
+
+    Yields:
+        str: Path of the temporary file, removed on exit.
+
+    Raises:
+        HTTPException: If the upload exceeds `max_bytes`.
+    """
+    with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+        written = 0
+        while chunk := await upload.read(SPOOL_CHUNK_SIZE):
+            written += len(chunk)
+            if written > max_bytes:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Upload exceeds the maximum size of {max_bytes} bytes.",
+                )
+            await run_in_threadpool(tmp.write, chunk)
+        await run_in_threadpool(tmp.flush)
+        yield tmp.name
@@ -0,0 +1,100 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from src_models.models import FACE_EMBEDDER, FACE_MODEL_POOL
+from src_models.models.face_verifier import preprocess_image_direct
+from src_models.models.utils import detect_align_crop_face
+from src_models.request_utils import PREPROCESS_PROCESS_POOL
+
+# Used when the warm-up image is unavailable, e.g. in the container image
+SYNTHETIC_IMAGE_SHAPE = (480, 640, 3)
+
+
+def warm_up_batch_sizes(max_batch_size: int) -> List[int]:
+    """
+    Batch sizes the embedder sees under micro-batching: powers of two up to the largest batch.
+
+    Args:
+        max_batch_size (int): EMBEDDER_MAX_BATCH_SIZE.
+
+    Returns:
+        List[int]: Ascending batch sizes, ending with `max_batch_size`.
+    """
+    sizes = [1]
+    while sizes[-1] * 2 < max_batch_size:
+        sizes.append(sizes[-1] * 2)
+    if sizes[-1] != max_batch_size:
+        sizes.append(max_batch_size)
+    return sizes
+
+
+def _warm_up_face_pipeline(image: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Run every MediaPipe pipeline of the model pool once, creating them if needed.
+
+    Returns the preprocessed face, or None if the image shows none.
+    """
+    tensor = None
+    with ExitStack() as stack:
+        # Hold all instances at once so each one is created and used
+        pipelines = [stack.enter_context(FACE_MODEL_POOL.checkout()) for _ in range(FACE_MODEL_POOL.size)]
+        for models in pipelines:
+            try:
+                aligned_image, _ = detect_align_crop_face(image, models, transform_landmarks=False)
+                tensor = preprocess_image_direct(aligned_image)
+            except Exception:
+                # Detection ran even though nothing was found, which is all that is needed
+                pass
+    return tensor
+
+
+def _warm_up_process_pool(image: np.ndarray) -> None:
+    # One call per worker process, concurrently, so that all of them are started
+    processes = PREPROCESS_PROCESS_POOL.processes
+    with ThreadPoolExecutor(max_workers=processes) as threads:
+        for future in [threads.submit(PREPROCESS_PROCESS_POOL.process_images, [image]) for _ in range(processes)]:
+            try:
+                future.result()
+            except RuntimeError:
+                pass
+
+
+def warm_up(image_path: str, batch_sizes: List[int]) -> Dict[str, float]:
+    """
+    Run the inference pipeline once so that the first requests do not pay for lazy initialization.
+
+    ONNX Runtime and MediaPipe allocate memory arenas and pick kernels on their
+    first runs. This runs face detection and alignment on every pipeline of the
+    model pool (and in every preprocessing worker process), then the embedder
+    at each batch size.
+
+    Args:
+        image_path (str): Face image to warm up with; a blank image is used if it cannot be read.
+        batch_sizes (List[int]): Embedder batch sizes to run.
+
+    Returns:
+        Dict[str, float]: Seconds spent warming up the face pipeline and the embedder.
+    """
+    image = cv2.imread(image_path) if image_path else None
+    if image is None:
+        image = np.full(SYNTHETIC_IMAGE_SHAPE, 127, dtype=np.uint8)
+
+    start = time.perf_counter()
+    tensor = _warm_up_face_pipeline(image)
+    if PREPROCESS_PROCESS_POOL is not None:
+        _warm_up_process_pool(image)
+    face_pipeline_seconds = time.perf_counter() - start
+
+    if tensor is None:
+        tensor = np.zeros((1, 3, 112, 112), dtype=np.float32)
+    start = time.perf_counter()
+    for batch_size in batch_sizes:
+        FACE_EMBEDDER.forward_batch(np.repeat(tensor, batch_size, axis=0))
+    embedder_seconds = time.perf_counter() - start
+
+    return {"face_pipeline_seconds": face_pipeline_seconds, "embedder_seconds": embedder_seconds}
@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+from src_models.ann_index import IVFIndex
+import src_models.gallery as gallery_module
+from src_models.gallery import FaceGallery
+
+
+def clustered_vectors(count, dimension=16, clusters=8, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension))
+    labels = rng.integers(0, clusters, count)
+    vectors = centers[labels] + 0.3 * rng.standard_normal((count, dimension))
+    return vectors.astype(np.float32)
+
+
+@pytest.fixture
+def index():
+    vectors = clustered_vectors(400)
+    index = IVFIndex(nlist=8, nprobe=8)
+    index.train(vectors)
+    index.add(np.arange(len(vectors)), vectors)
+    return index, vectors
+
+
+def test_exhaustive_probe_matches_brute_force(index):
+    """Test that probing every list returns the exact nearest neighbours."""
+    index, vectors = index
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    query = vectors[17] + 0.01
+    expected = np.argsort(normalized @ (query / np.linalg.norm(query)))[::-1][:5]
+    ids, scores = index.search(query, top_k=5)
+    np.testing.assert_array_equal(ids, expected)
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_untrained_index_raises():
+    """Test that adding to or searching an untrained index fails."""
+    index = IVFIndex(nlist=4)
+    with pytest.raises(RuntimeError):
+        index.search(np.ones(4))
+    with pytest.raises(RuntimeError):
+        index.add([0], np.ones((1, 4)))
+    with pytest.raises(ValueError):
+        index.train(np.ones((2, 4)))
+
+
+def test_incremental_insert_and_delete(index):
+    """Test that inserted vectors are found and deleted ones are not."""
+    index, vectors = index
+    assert len(index) == 400
+    assert index.remove([17, 9999]) == 1
+    assert 17 not in index
+    ids, _ = index.search(vectors[17], top_k=400)
+    assert 17 not in ids.tolist()
+
+    index.add([1000], vectors[17:18])
+    ids, scores = index.search(vectors[17], top_k=1)
+    assert ids[0] == 1000
+    assert scores[0] == pytest.approx(1.0)
+
+
+def test_add_replaces_existing_id(index):
+    """Test that re-adding an id replaces its vector instead of duplicating it."""
+    index, vectors = index
+    index.add([3], vectors[5:6])
+    assert len(index) == 400
+    ids, _ = index.search(vectors[5], top_k=2)
+    assert set(ids.tolist()) == {3, 5}
+
+
+def test_save_and_memory_mapped_load(index, tmp_path):
+    """Test that a saved index loads memory-mapped and stays mutable."""
+    index, vectors = index
+    index.save(str(tmp_path))
+    loaded = IVFIndex.load(str(tmp_path), mmap=True)
+    assert len(loaded) == 400
+    assert isinstance(loaded._vectors[0].base, np.memmap)
+
+    query = vectors[42]
+    np.testing.assert_array_equal(loaded.search(query)[0], index.search(query)[0])
+
+    loaded.remove([42])
+    loaded.add([500], vectors[42:43])
+    assert loaded.search(query, top_k=1)[0][0] == 500
+    loaded.save(str(tmp_path))
+    assert len(IVFIndex.load(str(tmp_path))) == 401 - 1
+
+
+def test_gallery_switches_to_index_when_large_enough(tmp_path):
+    """Test that the gallery trains its index at the minimum size and keeps it in sync."""
+    vectors = clustered_vectors(64)
+    gallery = FaceGallery(
+        storage_dir=str(tmp_path), index=IVFIndex(nlist=4, nprobe=4), index_min_size=32
+    )
+    for i in range(31):
+        gallery.enroll(f"subject-{i}", vectors[i])
+    assert not gallery.stats()["indexed"]
+
+    for i in range(31, 64):
+        gallery.enroll(f"subject-{i}", vectors[i])
+    gallery._index_thread.join()
+    assert gallery.stats()["indexed"]
+    assert gallery.search(vectors[40], top_k=1)[0][0] == "subject-40"
+
+    gallery.remove("subject-0")
+    assert gallery.search(vectors[63], top_k=1)[0][0] == "subject-63"
+
+    gallery.save()
+    reloaded = FaceGallery(storage_dir=str(tmp_path), index=IVFIndex(nlist=4, nprobe=4))
+    assert reloaded.stats()["indexed"]
+    assert reloaded.search(vectors[63], top_k=1)[0][0] == "subject-63"
+
+
+
+def test_gallery_applies_changes_made_while_index_builds(monkeypatch):
+    """Test that enrollments and removals made during training reach the new index."""
+    vectors = clustered_vectors(64)
+    gallery = FaceGallery(index=IVFIndex(nlist=4, nprobe=4), index_min_size=1000)
+    for i in range(32):
+        gallery.enroll(f"subject-{i}", vectors[i])
+
+    class ChangingIndex(IVFIndex):
+        def train(self, *args, **kwargs):
+            super().train(*args, **kwargs)
+            gallery.remove("subject-0")
+            gallery.enroll("subject-40", vectors[40])
+            gallery.enroll("subject-5", vectors[50])
+
+    monkeypatch.setattr(gallery_module, "IVFIndex", ChangingIndex)
+    gallery.build_index()
+    assert gallery.stats()["indexed"]
+    assert len(gallery.index) == len(gallery) == 32
+    assert gallery.search(vectors[40], top_k=1)[0][0] == "subject-40"
+    assert gallery.search(vectors[50], top_k=1)[0][0] == "subject-5"
+    assert "subject-0" not in [subject_id for subject_id, _ in gallery.search(vectors[0], top_k=32)]
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+import numpy as np
+import pytest
+from src_models.models.batching import BatchingEmbedder, Histogram
+
+
+class DummyBackbone:
+    """Backbone that records batch sizes and embeds each image as its mean value."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def forward_batch(self, images):
+        self.batch_sizes.append(images.shape[0])
+        return images.reshape(images.shape[0], -1).mean(axis=1, keepdims=True)
+
+
+class SlowBackbone(DummyBackbone):
+    """Backbone taking a fixed time per run that records how many runs overlap."""
+
+    def __init__(self, seconds):
+        super().__init__()
+        self.seconds = seconds
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def forward_batch(self, images):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.seconds)
+        with self._lock:
+            self.active -= 1
+        return super().forward_batch(images)
+
+
+class FailingBackbone:
+    def forward_batch(self, images):
+        raise RuntimeError("Backbone failure")
+
+
+def make_image(value, rows=1):
+    return np.full((rows, 3, 112, 112), value, dtype=np.float32)
+
+
+def test_histogram_buckets():
+    """Test that observations land in the expected buckets."""
+    histogram = Histogram([1, 2, 4])
+    for value in (1, 2, 3, 4, 9):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"le_1": 1, "le_2": 1, "le_4": 2, "overflow": 1}
+    assert snapshot["count"] == 5
+    assert snapshot["mean"] == pytest.approx(19 / 5)
+
+
+def test_concurrent_requests_share_one_batch():
+    """Test that concurrent submissions are stacked into a single backbone run."""
+    backbone = DummyBackbone()
+    batcher = BatchingEmbedder(backbone, max_batch_size=32, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.forward(make_image(i)) for i in range(5)))
+
+    embeddings = asyncio.run(run())
+    assert backbone.batch_sizes == [5]
+    for i, embedding in enumerate(embeddings):
+        np.testing.assert_allclose(embedding, [[i]])
+
+
+def test_full_batch_flushes_without_waiting():
+    """Test that reaching max_batch_size triggers a run before max_wait elapses."""
+    backbone = DummyBackbone()
+    batcher = BatchingEmbedder(backbone, max_batch_size=4, max_wait_ms=10_000)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.forward(make_image(i)) for i in range(8))), timeout=5
+        )
+
+    asyncio.run(run())
+    assert backbone.batch_sizes == [4, 4]
+    assert batcher.stats()["batch_size"]["buckets"]["le_4"] == 2
+
+
+def test_multi_row_submission_is_split_back():
+    """Test that a submission with several rows gets all of its rows back."""
+    batcher = BatchingEmbedder(DummyBackbone(), max_batch_size=32, max_wait_ms=1)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.forward(make_image(1, rows=3)), batcher.forward(make_image(2))
+        )
+
+    first, second = asyncio.run(run())
+    assert first.shape == (3, 1)
+    np.testing.assert_allclose(second, [[2]])
+
+
+def test_batches_never_exceed_max_batch_size():
+    """Test that multi-row submissions neither overfill a batch nor run larger than the maximum."""
+    backbone = DummyBackbone()
+    batcher = BatchingEmbedder(backbone, max_batch_size=32, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.forward(make_image(1, rows=31)),
+            batcher.forward(make_image(2, rows=30)),
+            batcher.forward(make_image(3, rows=70)),
+        )
+
+    first, second, third = asyncio.run(run())
+    assert max(backbone.batch_sizes) <= 32
+    assert sum(backbone.batch_sizes) == 131
+    assert (first.shape, second.shape, third.shape) == ((31, 1), (30, 1), (70, 1))
+    np.testing.assert_allclose(third, 3)
+    np.testing.assert_allclose(second, 2)
+
+
+def test_backbone_error_propagates():
+    """Test that a failing batch raises in every awaiting coroutine."""
+    batcher = BatchingEmbedder(FailingBackbone(), max_batch_size=32, max_wait_ms=1)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.forward(make_image(0)),
+            batcher.forward(make_image(1)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_batcher_survives_event_loop_change():
+    """Test that the batcher keeps working when used from a new event loop."""
+    backbone = DummyBackbone()
+    batcher = BatchingEmbedder(backbone, max_batch_size=32, max_wait_ms=1)
+    asyncio.run(batcher.forward(make_image(1)))
+    embedding = asyncio.run(batcher.forward(make_image(2)))
+    np.testing.assert_allclose(embedding, [[2]])
+    assert batcher.stats()["batch_size"]["count"] == 2
+
+
+def test_runs_never_overlap_and_queue_fills_while_busy():
+    """Test that only one run is in flight and submissions arriving meanwhile form full batches."""
+    backbone = SlowBackbone(0.03)
+    batcher = BatchingEmbedder(backbone, max_batch_size=16, max_wait_ms=1)
+
+    async def client(i):
+        # Staggered arrivals that would each start a small run without the limit
+        await asyncio.sleep(i * 0.002)
+        return await batcher.forward(make_image(i))
+
+    async def run():
+        return await asyncio.gather(*(client(i) for i in range(50)))
+
+    embeddings = asyncio.run(run())
+    assert backbone.max_active == 1
+    assert sum(backbone.batch_sizes) == 50
+    assert np.mean(backbone.batch_sizes) >= 8
+    for i, embedding in enumerate(embeddings):
+        np.testing.assert_allclose(embedding, [[i]])
@@ -0,0 +1,74 @@
+import numpy as np
+from src_models.embedding_cache import EmbeddingCache
+
+
+def test_key_depends_on_content_and_model_version():
+    """Test that keys change with the upload bytes and the model version."""
+    cache = EmbeddingCache(model_version="v1")
+    assert cache.key(b"image") == cache.key(b"image")
+    assert cache.key(b"image") != cache.key(b"other image")
+    assert cache.key(b"image") != EmbeddingCache(model_version="v2").key(b"image")
+
+
+def test_key_depends_on_pipeline_settings():
+    """Test that uploads preprocessed with different settings do not share entries."""
+    detector = EmbeddingCache(model_version="v1", pipeline="crop=detector")
+    landmarks = EmbeddingCache(model_version="v1", pipeline="crop=landmarks")
+    assert detector.key(b"image") != landmarks.key(b"image")
+    assert detector.key(b"image") == EmbeddingCache(model_version="v1", pipeline="crop=detector").key(b"image")
+
+
+def test_get_put_counts_hits_and_misses():
+    """Test that lookups update the hit and miss counters."""
+    cache = EmbeddingCache(max_entries=4)
+    key = cache.key(b"image")
+    assert cache.get(key) is None
+    cache.put(key, np.array([[1.0, 2.0]]))
+    np.testing.assert_array_equal(cache.get(key), [[1.0, 2.0]])
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_cached_embeddings_are_read_only():
+    """Test that callers cannot mutate a cached embedding in place."""
+    cache = EmbeddingCache()
+    key = cache.key(b"image")
+    cache.put(key, np.ones((1, 3)))
+    assert not cache.get(key).flags.writeable
+
+
+def test_lru_eviction():
+    """Test that the least recently used entry is evicted first."""
+    cache = EmbeddingCache(max_entries=2)
+    keys = [cache.key(bytes([i])) for i in range(3)]
+    cache.put(keys[0], np.zeros(1))
+    cache.put(keys[1], np.zeros(1))
+    cache.get(keys[0])
+    cache.put(keys[2], np.zeros(1))
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disabled_cache():
+    """Test that a zero-sized cache never stores entries."""
+    cache = EmbeddingCache(max_entries=0)
+    key = cache.key(b"image")
+    cache.put(key, np.ones(3))
+    assert cache.get(key) is None
+    assert cache.stats()["misses"] == 0
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    """Test that entries written to disk are found by a fresh cache instance."""
+    cache = EmbeddingCache(max_entries=1, disk_dir=str(tmp_path), model_version="v1")
+    key = cache.key(b"image")
+    cache.put(key, np.array([[0.5, 0.25]]))
+
+    restarted = EmbeddingCache(max_entries=1, disk_dir=str(tmp_path), model_version="v1")
+    np.testing.assert_array_equal(restarted.get(key), [[0.5, 0.25]])
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.get(key) is not None
+    assert restarted.stats()["hits"] == 1
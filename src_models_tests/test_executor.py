@@ -0,0 +1,52 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from src_models.executor import BoundedExecutor
+
+
+def test_run_uses_worker_thread():
+    """Test that calls run off the event loop thread and return their result."""
+    executor = BoundedExecutor(max_workers=2, max_queue=0)
+
+    async def run():
+        return await executor.run(lambda x: (x * 2, threading.current_thread().name), 21)
+
+    result, thread_name = asyncio.run(run())
+    assert result == 42
+    assert thread_name.startswith("preprocess")
+
+
+def test_admit_rejects_when_saturated():
+    """Test that requests beyond workers plus queue are rejected with 503."""
+    executor = BoundedExecutor(max_workers=1, max_queue=1)
+    with executor.admit(), executor.admit():
+        with pytest.raises(HTTPException) as exc_info:
+            with executor.admit():
+                pass
+        assert executor.stats()["in_flight"] == 2
+
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers == {"Retry-After": "1"}
+    stats = executor.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["in_flight"] == 0
+
+
+def test_admit_released_on_error():
+    """Test that a failing request frees its slot and its error reaches the caller."""
+    executor = BoundedExecutor(max_workers=1, max_queue=0)
+
+    def fail():
+        raise ValueError("boom")
+
+    async def run():
+        with executor.admit():
+            await executor.run(fail)
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+    assert executor.stats()["in_flight"] == 0
+    with executor.admit():
+        pass
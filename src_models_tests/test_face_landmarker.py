@@ -1,5 +1,7 @@
+import cv2
 import numpy as np
 import pytest
+import mediapipe as mp
 from src_models.models.face_landmarker import FaceLandmarker, Landmark
 
 
@@ -57,3 +59,58 @@ def test_detect_landmarks_invalid_input(face_landmarker):
     """Test that invalid input raises ValueError."""
     with pytest.raises(ValueError):
         face_landmarker.detect_landmarks(None)
+
+
+def test_detect_all_landmarks_matches_detect():
+    """Test that the landmark arrays hold exactly the coordinates of the detect() result."""
+    image = cv2.cvtColor(cv2.imread("test_images/clear_face.png"), cv2.COLOR_BGR2RGB)
+    landmarker = FaceLandmarker(max_faces=2)
+    faces = landmarker.detect_all_landmarks(image)
+    result = landmarker.landmarker.detect(mp.Image(image_format=mp.ImageFormat.SRGB, data=image))
+
+    assert len(faces) == len(result.face_landmarks) == 1
+    expected = np.array([(point.x, point.y) for point in result.face_landmarks[0]], dtype=np.float32)
+    expected *= np.array([image.shape[1], image.shape[0]], dtype=np.float32)
+    assert faces[0].dtype == np.float32 and faces[0].flags.c_contiguous
+    np.testing.assert_array_equal(faces[0], expected)
+
+
+def test_detect_video_landmarks_retries_lost_face(face_landmarker):
+    """Test that a face lost by tracking is searched for again on the same frame, with increasing timestamps."""
+    timestamps = []
+    results = [[], [], [Landmark(0.1, 0.2)], [], [Landmark(0.5, 0.5)]]
+
+    def detect_for_video(mp_image, timestamp_ms):
+        timestamps.append(timestamp_ms)
+
+        class DummyResult:
+            face_landmarks = [results[len(timestamps) - 1]] if results[len(timestamps) - 1] else []
+
+        return DummyResult()
+
+    face_landmarker.landmarker.detect_for_video = detect_for_video
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    # Nothing tracked yet: one search; then a found face; then a lost face is searched for again
+    assert face_landmarker.detect_video_landmarks(frame) is None
+    assert face_landmarker.detect_video_landmarks(frame) is None
+    np.testing.assert_allclose(face_landmarker.detect_video_landmarks(frame), [[10, 20]], rtol=1e-6)
+    np.testing.assert_allclose(face_landmarker.detect_video_landmarks(frame), [[50, 50]], rtol=1e-6)
+    assert timestamps == [1000, 2000, 3000, 4000, 5000]
+
+
+def test_detect_video_landmarks_matches_image_mode():
+    """Test that video running mode finds the face of spread-out video frames where image mode does."""
+    capture = cv2.VideoCapture("test_images/test_video.mp4")
+    total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    image_landmarker, video_landmarker = FaceLandmarker(), FaceLandmarker(running_mode="video")
+    for index in np.linspace(0, total - 1, 5).astype(int):
+        capture.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+        ok, frame = capture.read()
+        assert ok
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        expected = image_landmarker.detect_landmarks(frame)
+        landmarks = video_landmarker.detect_video_landmarks(frame)
+        assert landmarks.shape == expected.shape
+        # Tracked landmarks come from the previous frame's region, not a fresh detection
+        assert np.median(np.linalg.norm(landmarks - expected, axis=1)) < 0.005 * frame.shape[0]
+    capture.release()
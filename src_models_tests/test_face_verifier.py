@@ -1,8 +1,10 @@
+import cv2
 import numpy as np
 import pytest
 from src_models.models.face_verifier import (
     FaceEmbedderBackbone,
     SiameseNetwork,
+    cosine_similarities,
     preprocess_image_direct,
 )
 
@@ -49,9 +51,129 @@ def test_siamese_network_forward(face_embedder):
     np.testing.assert_array_equal(emb2, np.array([1, 2, 3]))
 
 
+def test_siamese_network_forward_one_to_many():
+    """Test that the reference and all images are embedded in one batch and compared to the reference."""
+
+    class BatchEmbedder:
+        def __init__(self):
+            self.batches = []
+
+        def forward_batch(self, images):
+            self.batches.append(images.shape[0])
+            # Embedding i points along the axis given by the image's fill value
+            return np.eye(3, dtype=np.float32)[images[:, 0, 0, 0].astype(int)] * 2
+
+    embedder = BatchEmbedder()
+    siamese = SiameseNetwork(embedder)
+    reference = np.zeros((1, 3, 112, 112), dtype=np.float32)
+    images = np.stack([np.full((3, 112, 112), value, dtype=np.float32) for value in (0, 1, 0, 2)])
+    similarities = siamese.forward_one_to_many(reference, images)
+    np.testing.assert_allclose(similarities, [1, 0, 1, 0])
+    assert embedder.batches == [5]
+
+
+def test_cosine_similarities_matches_pairwise():
+    """Test that the matrix-vector form matches the per-row cosine similarity."""
+    rng = np.random.default_rng(0)
+    reference, embeddings = rng.standard_normal(512), rng.standard_normal((7, 512))
+    expected = [np.dot(reference, e) / (np.linalg.norm(reference) * np.linalg.norm(e)) for e in embeddings]
+    np.testing.assert_allclose(cosine_similarities(reference[None], embeddings), expected, rtol=1e-5)
+
+
 def test_preprocess_image_direct():
     """Test that preprocess_image_direct returns the correct shape and type."""
     dummy_image = np.random.randint(0, 255, (200, 200, 3), dtype=np.uint8)
     preprocessed = preprocess_image_direct(dummy_image)
     assert preprocessed.shape == (1, 3, 112, 112)
     assert preprocessed.dtype == np.float32
+
+
+def test_preprocess_image_direct_matches_reference():
+    """Test that the in-place float32 path is bit-identical to the float64 formula."""
+    dummy_image = np.random.randint(0, 256, (173, 151, 3), dtype=np.uint8)
+    resized = cv2.resize(dummy_image, (112, 112))
+    expected = np.expand_dims(np.transpose((resized - 127.5) / 128.0, (2, 0, 1)), 0).astype(np.float32)
+    np.testing.assert_array_equal(preprocess_image_direct(dummy_image), expected)
+
+
+def test_preprocess_image_direct_into_batch_slot():
+    """Test that preprocessing writes into a slot of a batch tensor without touching the others."""
+    images = [np.full((64, 48, 3), value, dtype=np.uint8) for value in (0, 255)]
+    batch = np.full((3, 3, 112, 112), 7, dtype=np.float32)
+    for i, image in enumerate(images):
+        preprocess_image_direct(image, out=batch[i])
+    assert np.all(batch[0] == -127.5 / 128.0)
+    assert np.all(batch[1] == 127.5 / 128.0)
+    assert np.all(batch[2] == 7)
+
+
+def test_face_embedder_forward_batch_static_graph():
+    """Test that forward_batch runs image by image when the graph has a fixed batch size."""
+
+    class RowSession(DummySession):
+        def run(self, _, inputs):
+            return [inputs["input"].reshape(inputs["input"].shape[0], -1)[:, :2]]
+
+    embedder = FaceEmbedderBackbone.__new__(FaceEmbedderBackbone)
+    embedder.session = RowSession(None)
+    embedder.input_name = "input"
+    embedder.fixed_batch_size = 1
+    images = np.stack([np.full((3, 112, 112), i, dtype=np.float32) for i in range(3)])
+    output = embedder.forward_batch(images)
+    assert output.shape == (3, 2)
+    np.testing.assert_array_equal(output[:, 0], [0, 1, 2])
+
+
+def _varint(value):
+    encoded = b""
+    while value > 0x7F:
+        encoded += bytes([value & 0x7F | 0x80])
+        value >>= 7
+    return encoded + bytes([value])
+
+
+def _message(number, payload):
+    if isinstance(payload, int):
+        return _varint(number << 3) + _varint(payload)
+    if isinstance(payload, str):
+        payload = payload.encode()
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _tensor_info(name, dims):
+    # ValueInfoProto of a float tensor; string dimensions are symbolic
+    shape = b"".join(_message(1, _message(2 if isinstance(dim, str) else 1, dim)) for dim in dims)
+    tensor_type = _message(1, 1) + _message(2, shape)
+    return _message(1, name) + _message(2, _message(1, tensor_type))
+
+
+def write_tiny_embedder(path):
+    """Write a stand-in embedder ONNX model averaging each channel of a (N, 3, 112, 112) batch."""
+    nodes = _message(1, _message(1, "input") + _message(2, "pooled") + _message(4, "GlobalAveragePool"))
+    nodes += _message(1, _message(1, "pooled") + _message(2, "output") + _message(4, "Flatten"))
+    graph = (
+        nodes
+        + _message(2, "tiny_embedder")
+        + _message(11, _tensor_info("input", ["batch", 3, 112, 112]))
+        + _message(12, _tensor_info("output", ["batch", 3]))
+    )
+    model = _message(1, 8) + _message(8, _message(2, 13)) + _message(7, graph)
+    path.write_bytes(model)
+    return str(path)
+
+
+def test_face_embedder_optimized_model_cache(tmp_path):
+    """Test that the optimized graph is saved once and reused by later sessions."""
+    model_path = write_tiny_embedder(tmp_path / "tiny_embedder.onnx")
+    cache_dir = tmp_path / "optimized"
+    first = FaceEmbedderBackbone(model_path, optimized_model_dir=str(cache_dir))
+    cached = list(cache_dir.iterdir())
+    assert len(cached) == 1
+    assert cached[0].name.endswith(".all.opt.onnx")
+    mtime = cached[0].stat().st_mtime_ns
+
+    second = FaceEmbedderBackbone(model_path, optimized_model_dir=str(cache_dir), intra_op_num_threads=1)
+    assert [path.stat().st_mtime_ns for path in cache_dir.iterdir()] == [mtime]
+
+    image = np.random.default_rng(0).standard_normal((2, 3, 112, 112)).astype(np.float32)
+    np.testing.assert_allclose(first.forward(image), second.forward(image), rtol=1e-5, atol=1e-5)
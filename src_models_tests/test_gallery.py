@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from src_models.gallery import FaceGallery
+
+
+def unit(*values):
+    return np.array(values, dtype=np.float32)
+
+
+@pytest.fixture
+def gallery():
+    gallery = FaceGallery(initial_capacity=2)
+    gallery.enroll("alice", unit(1, 0, 0))
+    gallery.enroll("bob", unit(0, 1, 0))
+    gallery.enroll("carol", unit(0, 0, 2))
+    return gallery
+
+
+def test_search_ranks_by_cosine_similarity(gallery):
+    """Test that search returns the best matches first with cosine scores."""
+    results = gallery.search(unit(0.9, 0.1, 0), top_k=2)
+    assert [subject_id for subject_id, _ in results] == ["alice", "bob"]
+    assert results[0][1] == pytest.approx(0.9 / np.linalg.norm([0.9, 0.1]))
+
+
+def test_search_top_k_larger_than_gallery(gallery):
+    """Test that asking for more matches than enrolled subjects returns all of them."""
+    results = gallery.search(unit(0, 0, 1), top_k=10)
+    assert len(results) == 3
+    assert results[0] == ("carol", pytest.approx(1.0))
+
+
+def test_search_empty_gallery():
+    """Test that searching an empty gallery returns no matches."""
+    assert FaceGallery().search(unit(1, 0, 0)) == []
+
+
+def test_enroll_replaces_existing_template(gallery):
+    """Test that re-enrolling a subject replaces its template instead of adding a row."""
+    assert gallery.enroll("alice", unit(0, 1, 1)) is False
+    assert len(gallery) == 3
+    assert gallery.search(unit(1, 0, 0), top_k=1)[0][0] != "alice"
+
+
+def test_remove_keeps_matrix_dense(gallery):
+    """Test that removing a subject keeps the remaining subjects searchable."""
+    assert gallery.remove("alice") is True
+    assert gallery.remove("alice") is False
+    assert "alice" not in gallery
+    assert gallery.search(unit(0, 0, 1), top_k=1)[0][0] == "carol"
+    assert sorted(gallery.subject_ids) == ["bob", "carol"]
+
+
+def test_dimension_mismatch_raises(gallery):
+    """Test that an embedding of a different size is rejected."""
+    with pytest.raises(ValueError):
+        gallery.enroll("dave", unit(1, 0))
+
+
+def test_persistence_round_trip(tmp_path):
+    """Test that an enrolled gallery is reloaded from its storage directory."""
+    gallery = FaceGallery(storage_dir=str(tmp_path))
+    gallery.enroll("alice", unit(1, 0, 0))
+    gallery.enroll("bob", unit(0, 1, 0))
+    gallery.remove("alice")
+
+    reloaded = FaceGallery(storage_dir=str(tmp_path))
+    assert reloaded.subject_ids == ["bob"]
+    assert reloaded.search(unit(0, 1, 0), top_k=1)[0] == ("bob", pytest.approx(1.0))
+
+
+def test_changes_are_journaled_between_snapshots(tmp_path):
+    """Test that changes append to the journal and a snapshot folds them in."""
+    gallery = FaceGallery(storage_dir=str(tmp_path), snapshot_every=1000)
+    gallery.enroll("alice", unit(1, 0, 0))
+    gallery.enroll("bob", unit(0, 1, 0))
+    assert not (tmp_path / "CURRENT").exists()
+    assert len((tmp_path / "journal-00000000.log").read_text().splitlines()) == 2
+
+    gallery.save()
+    gallery.enroll("carol", unit(0, 0, 1))
+    gallery.remove("alice")
+    assert (tmp_path / "CURRENT").read_text() == "1"
+    assert not (tmp_path / "journal-00000000.log").exists()
+
+    reloaded = FaceGallery(storage_dir=str(tmp_path))
+    assert sorted(reloaded.subject_ids) == ["bob", "carol"]
+    assert reloaded.search(unit(0, 0, 1), top_k=1)[0] == ("carol", pytest.approx(1.0))
+
+
+def test_snapshot_is_written_in_background(tmp_path):
+    """Test that a snapshot is taken once enough changes are journaled."""
+    gallery = FaceGallery(storage_dir=str(tmp_path), snapshot_every=2)
+    gallery.enroll("alice", unit(1, 0, 0))
+    gallery.enroll("bob", unit(0, 1, 0))
+    gallery._snapshot_thread.join()
+    assert (tmp_path / "CURRENT").read_text() == "1"
+    assert FaceGallery(storage_dir=str(tmp_path)).subject_ids == ["alice", "bob"]
+
+
+def test_torn_journal_record_is_skipped(tmp_path):
+    """Test that a record cut short by a crash neither fails loading nor swallows later records."""
+    gallery = FaceGallery(storage_dir=str(tmp_path))
+    gallery.enroll("alice", unit(1, 0, 0))
+    with open(tmp_path / "journal-00000000.log", "ab") as f:
+        f.write(b'{"op": "enroll", "subject_id": "bo')
+
+    reloaded = FaceGallery(storage_dir=str(tmp_path))
+    reloaded.enroll("carol", unit(0, 0, 1))
+    assert FaceGallery(storage_dir=str(tmp_path)).subject_ids == ["alice", "carol"]
+
+
+def test_changes_do_not_alter_searched_views(gallery):
+    """Test that changes after a search took its view copy rows instead of writing through it."""
+    with gallery._lock:
+        matrix, subject_ids = gallery._share()
+    before = matrix.copy()
+    gallery.enroll("alice", unit(0, 1, 1))
+    gallery.remove("bob")
+    np.testing.assert_array_equal(matrix, before)
+    assert subject_ids == ["alice", "bob", "carol"]
+    assert gallery.search(unit(0, 0, 1), top_k=1)[0][0] == "carol"
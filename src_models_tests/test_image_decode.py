@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+import pytest
+from src_models.image_decode import decode_image, jpeg_dimensions, jpeg_reduction_factor
+
+
+def encode(width, height, ext=".jpg"):
+    image = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode(ext, image)[1].tobytes()
+
+
+@pytest.mark.parametrize("width, height", [(640, 480), (33, 1000), (4032, 3024)])
+def test_jpeg_dimensions(width, height):
+    """Test that JPEG dimensions are read from the frame header."""
+    assert jpeg_dimensions(encode(width, height)) == (width, height)
+
+
+def test_jpeg_dimensions_other_formats():
+    """Test that non-JPEG or truncated data yields no dimensions."""
+    assert jpeg_dimensions(encode(64, 64, ".png")) is None
+    assert jpeg_dimensions(encode(64, 64)[:20]) is None
+    assert jpeg_dimensions(b"") is None
+
+
+@pytest.mark.parametrize(
+    "long_side, target_side, expected",
+    [(800, 1024, 1), (2048, 1024, 2), (4032, 1024, 2), (4096, 1024, 4), (12000, 1024, 8), (4032, 0, 1)],
+)
+def test_jpeg_reduction_factor(long_side, target_side, expected):
+    """Test that the largest factor keeping the long side above the target is chosen."""
+    assert jpeg_reduction_factor(encode(long_side, 16), target_side) == expected
+
+
+def test_decode_image_reduced():
+    """Test that large JPEGs are decoded reduced, with a full-resolution fallback."""
+    image, full_resolution = decode_image(encode(2048, 1536), target_side=1024)
+    assert image.shape == (768, 1024, 3)
+    assert full_resolution().shape == (1536, 2048, 3)
+
+
+def test_decode_image_full():
+    """Test that small images and other formats are decoded as is."""
+    image, full_resolution = decode_image(encode(640, 480), target_side=1024)
+    assert image.shape == (480, 640, 3)
+    assert full_resolution is None
+
+    image, full_resolution = decode_image(encode(2048, 1536, ".png"), target_side=1024)
+    assert image.shape == (1536, 2048, 3)
+    assert full_resolution is None
+
+    image, full_resolution = decode_image(b"not an image", target_side=1024)
+    assert image is None
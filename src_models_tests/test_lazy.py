@@ -0,0 +1,70 @@
+import threading
+import time
+import pytest
+from src_models.models.lazy import LazyModel
+
+
+class DummyModel:
+    instances = 0
+
+    def __init__(self):
+        time.sleep(0.05)
+        DummyModel.instances += 1
+        self.value = 42
+
+    def predict(self, x):
+        return x + self.value
+
+
+def test_lazy_model_loads_on_first_use():
+    """Test that the model is constructed on first attribute access and then forwarded to."""
+    DummyModel.instances = 0
+    model = LazyModel("dummy", DummyModel)
+    assert not model.loaded
+    assert model.status()["state"] == "pending"
+    assert model.predict(1) == 43
+    assert model.value == 42
+    assert DummyModel.instances == 1
+    status = model.status()
+    assert status["state"] == "ready"
+    assert status["load_seconds"] > 0
+
+
+def test_lazy_model_loads_once_under_concurrency():
+    """Test that concurrent callers share a single construction."""
+    DummyModel.instances = 0
+    model = LazyModel("dummy", DummyModel)
+    loaded = []
+    threads = [threading.Thread(target=lambda: loaded.append(model.load())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert DummyModel.instances == 1
+    assert all(instance is loaded[0] for instance in loaded)
+
+
+def test_lazy_model_records_and_retries_failures():
+    """Test that a failed load is reported and retried on the next use."""
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("checkpoint missing")
+        return DummyModel()
+
+    model = LazyModel("dummy", factory)
+    with pytest.raises(RuntimeError):
+        model.load()
+    assert model.status() == {"state": "failed", "load_seconds": None, "error": "checkpoint missing"}
+    assert model.predict(0) == 42
+    assert model.status()["error"] is None
+
+
+def test_lazy_model_private_attributes_are_not_forwarded():
+    """Test that private attribute lookups do not trigger a load."""
+    model = LazyModel("dummy", DummyModel)
+    with pytest.raises(AttributeError):
+        model._missing
+    assert not model.loaded
@@ -7,6 +7,7 @@ import contextlib
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
+from src_models.gallery import FaceGallery
 from src_models.main import app, lifespan
 import src_models.main as main_mod
 
@@ -19,20 +20,31 @@ class DummyFaceVerifier:
         return np.array([1, 0, 0]), np.array([1, 0, 0])
 
 
+# Dummy batching embedder returning the same predictable embedding.
+class DummyFaceBatcher:
+    async def forward(self, image):
+        return np.tile([1, 0, 0], (image.shape[0], 1))
+
+    def stats(self):
+        return {"pending_rows": 0}
+
+
 @pytest.fixture(autouse=True)
 def patch_face_verifier(monkeypatch):
     """Patch FACE_VERIFIER and image processing functions to avoid external dependencies."""
     monkeypatch.setattr(main_mod, "FACE_VERIFIER", DummyFaceVerifier())
+    monkeypatch.setattr(main_mod, "FACE_BATCHER", DummyFaceBatcher())
+    monkeypatch.setattr(main_mod, "FACE_GALLERY", FaceGallery())
 
-    async def fake_process_image(file):
-        return np.ones((1, 3, 112, 112), dtype=np.float32)
+    async def fake_embed_image(file):
+        return np.array([[1, 0, 0]])
 
-    monkeypatch.setattr(main_mod, "process_image", fake_process_image)
+    monkeypatch.setattr(main_mod, "embed_image", fake_embed_image)
 
     monkeypatch.setattr(
         main_mod,
-        "process_image_sync",
-        lambda frame: np.ones((1, 3, 112, 112), dtype=np.float32),
+        "process_images_sync",
+        lambda frames: np.ones((len(frames), 3, 112, 112), dtype=np.float32),
     )
 
 
@@ -50,6 +62,18 @@ def test_set_threshold_invalid():
     assert response.status_code == 400
 
 
+def test_get_stats():
+    """Test that the stats endpoint exposes the batching statistics."""
+    response = client.get("/faceapp/stats/")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["embedder_batching"] == {"pending_rows": 0}
+    assert "hits" in data["embedding_cache"]
+    assert "in_use" in data["model_pool"]
+    assert "rejected" in data["preprocess_executor"]
+    assert "mean_iou" in data["crop_validation"]
+
+
 # compare_faces endpoint tests
 def test_compare_faces():
     """Test compare_faces endpoint returns correct similarity score."""
@@ -67,10 +91,10 @@ def test_compare_faces():
 def test_compare_faces_internal_error(monkeypatch):
     """Test compare_faces endpoint handling of internal errors."""
 
-    def fake_process_image(file):
+    def fake_embed_image(file):
         raise Exception("Test compare_faces error")
 
-    monkeypatch.setattr(main_mod, "process_image", fake_process_image)
+    monkeypatch.setattr(main_mod, "embed_image", fake_embed_image)
     files = {
         "image1": ("test.jpg", b"fake image data", "image/jpeg"),
         "image2": ("test.jpg", b"fake image data", "image/jpeg"),
@@ -99,7 +123,13 @@ def test_compare_video_no_frames(monkeypatch):
         def read(self):
             return False, None
 
-    monkeypatch.setattr("src_models.main.cv2.VideoCapture", lambda x: DummyCapZero(x))
+        def grab(self):
+            return False
+
+        def release(self):
+            pass
+
+    monkeypatch.setattr("src_models.video_utils.cv2.VideoCapture", lambda x: DummyCapZero(x))
     files = {
         "image": ("test.jpg", b"fake image data", "image/jpeg"),
         "video": ("test.mp4", b"fake video data", "video/mp4"),
@@ -126,8 +156,17 @@ def test_compare_video_no_valid_frames(monkeypatch):
         def read(self):
             return False, None
 
+        def grab(self):
+            return True
+
+        def retrieve(self):
+            return False, None
+
+        def release(self):
+            pass
+
     monkeypatch.setattr(
-        "src_models.main.cv2.VideoCapture", lambda x: DummyCapNoValid(x)
+        "src_models.video_utils.cv2.VideoCapture", lambda x: DummyCapNoValid(x)
     )
     files = {
         "image": ("test.jpg", b"fake image data", "image/jpeg"),
@@ -143,8 +182,8 @@ def test_compare_video_internal_error(monkeypatch):
     """Test compare_video endpoint handling of internal errors during frame processing."""
     monkeypatch.setattr(
         main_mod,
-        "process_image_sync",
-        lambda frame: (_ for _ in ()).throw(Exception("Video frame error")),
+        "process_images_sync",
+        lambda frames: (_ for _ in ()).throw(Exception("Video frame error")),
     )
 
     class DummyCapValid:
@@ -160,7 +199,16 @@ def test_compare_video_internal_error(monkeypatch):
         def read(self):
             return True, self.frames[0]
 
-    monkeypatch.setattr("src_models.main.cv2.VideoCapture", lambda x: DummyCapValid(x))
+        def grab(self):
+            return True
+
+        def retrieve(self):
+            return True, self.frames[0]
+
+        def release(self):
+            pass
+
+    monkeypatch.setattr("src_models.video_utils.cv2.VideoCapture", lambda x: DummyCapValid(x))
     files = {
         "image": ("test.jpg", b"fake image data", "image/jpeg"),
         "video": ("test.mp4", b"fake video data", "video/mp4"),
@@ -172,13 +220,196 @@ def test_compare_video_internal_error(monkeypatch):
     assert "Video frame error" in json_data["details"]
 
 
+def test_compare_video_adaptive_early_exit(monkeypatch):
+    """Test adaptive sampling stops after the minimum frames for a clear-cut clip."""
+
+    class DummyCapLong:
+        def __init__(self, filename):
+            self.frame = np.ones((100, 100, 3), dtype=np.uint8)
+
+        def get(self, prop):
+            return 1000 if prop == cv2.CAP_PROP_FRAME_COUNT else 0
+
+        def set(self, prop, value):
+            return True
+
+        def grab(self):
+            return True
+
+        def retrieve(self):
+            return True, self.frame
+
+        def release(self):
+            pass
+
+    monkeypatch.setattr("src_models.video_utils.cv2.VideoCapture", lambda x: DummyCapLong(x))
+    monkeypatch.setattr(main_mod, "VIDEO_ADAPTIVE_MIN_FRAMES", 3)
+    monkeypatch.setattr(main_mod, "VIDEO_ADAPTIVE_MAX_FRAMES", 15)
+    files = {
+        "image": ("test.jpg", b"fake image data", "image/jpeg"),
+        "video": ("test.mp4", b"fake video data", "video/mp4"),
+    }
+    response = client.post("/faceapp/compare_video/?adaptive=true", files=files)
+    json_data = response.json()
+    assert response.status_code == 200
+    assert json_data["frames_used"] == 3
+    assert json_data["similarity_score"] == 1.0
+    assert json_data["is_similar"] is True
+
+    response = client.post("/faceapp/compare_video/?adaptive=false", files=files)
+    assert response.json()["frames_used"] == main_mod.VIDEO_FRAME_SAMPLE_COUNT
+
+
+def test_compare_video_tracking(monkeypatch):
+    """Test that tracking embeds only the frames selected from the candidates."""
+    sampled = {}
+
+    class DummySampler:
+        def __init__(self, video_path, sample_count, *args):
+            sampled["count"] = sample_count
+            self.total_frames = 100
+
+        def close(self):
+            pass
+
+    def fake_select_video_faces_sync(frames, count, tracking):
+        sampled["selected"], sampled["tracking"] = count, tracking
+        return np.ones((count - 1, 3, 112, 112), dtype=np.float32), np.full(count - 1, 0.5)
+
+    monkeypatch.setattr(main_mod, "VideoFrameSampler", DummySampler)
+    monkeypatch.setattr(main_mod, "select_video_faces_sync", fake_select_video_faces_sync)
+    files = {
+        "image": ("test.jpg", b"fake image data", "image/jpeg"),
+        "video": ("test.mp4", b"fake video data", "video/mp4"),
+    }
+    response = client.post("/faceapp/compare_video/?tracking=true&adaptive=true", files=files)
+    json_data = response.json()
+    assert response.status_code == 200
+    assert sampled == {"count": main_mod.VIDEO_CANDIDATE_FRAMES, "selected": main_mod.VIDEO_QUALITY_TOP_K, "tracking": True}
+    assert json_data["frames_used"] == main_mod.VIDEO_QUALITY_TOP_K - 1
+    assert json_data["similarity_score"] == 1.0
+
+
+def test_compare_video_quality_weighted_mean(monkeypatch):
+    """Test that selected frames are averaged with their quality as weight."""
+
+    class DummySampler:
+        def __init__(self, *args):
+            self.total_frames = 100
+
+        def close(self):
+            pass
+
+    class QualityBatcher(DummyFaceBatcher):
+        async def forward(self, image):
+            # Scores 1.0 and 0.5 after mapping cosine similarity to [0, 1]
+            return np.array([[1, 0, 0], [0, 1, 0]])
+
+    monkeypatch.setattr(main_mod, "VideoFrameSampler", DummySampler)
+    monkeypatch.setattr(main_mod, "FACE_BATCHER", QualityBatcher())
+    monkeypatch.setattr(
+        main_mod,
+        "select_video_faces_sync",
+        lambda frames, count, tracking: (np.ones((2, 3, 112, 112), dtype=np.float32), np.array([0.9, 0.1])),
+    )
+    files = {
+        "image": ("test.jpg", b"fake image data", "image/jpeg"),
+        "video": ("test.mp4", b"fake video data", "video/mp4"),
+    }
+    response = client.post("/faceapp/compare_video/?quality=true", files=files)
+    json_data = response.json()
+    assert response.status_code == 200
+    assert json_data["similarity_score"] == pytest.approx(0.95)
+    assert json_data["frames_used"] == 2
+
+
+def test_compare_video_multi_face(monkeypatch):
+    """Test that each frame scores its best-matching face from one batched embedder call."""
+
+    class DummyCapLong:
+        def __init__(self, filename):
+            self.frame = np.ones((100, 100, 3), dtype=np.uint8)
+
+        def get(self, prop):
+            return 1000 if prop == cv2.CAP_PROP_FRAME_COUNT else 0
+
+        def set(self, prop, value):
+            return True
+
+        def grab(self):
+            return True
+
+        def retrieve(self):
+            return True, self.frame
+
+        def release(self):
+            pass
+
+    class AlternatingBatcher(DummyFaceBatcher):
+        calls = 0
+
+        async def forward(self, image):
+            AlternatingBatcher.calls += 1
+            # A bystander, then the reference face
+            return np.tile([[0, 1, 0], [1, 0, 0]], (image.shape[0] // 2, 1))
+
+    monkeypatch.setattr("src_models.video_utils.cv2.VideoCapture", lambda x: DummyCapLong(x))
+    monkeypatch.setattr(main_mod, "FACE_BATCHER", AlternatingBatcher())
+    monkeypatch.setattr(
+        main_mod,
+        "process_images_faces_sync",
+        lambda frames: (np.ones((2 * len(frames), 3, 112, 112), dtype=np.float32), [[(0, 0, 1, 1)] * 2] * len(frames)),
+    )
+    files = {
+        "image": ("test.jpg", b"fake image data", "image/jpeg"),
+        "video": ("test.mp4", b"fake video data", "video/mp4"),
+    }
+    response = client.post("/faceapp/compare_video/?multi_face=true&adaptive=false", files=files)
+    json_data = response.json()
+    assert response.status_code == 200
+    assert json_data["similarity_score"] == 1.0
+    assert json_data["frames_used"] == main_mod.VIDEO_FRAME_SAMPLE_COUNT
+    assert AlternatingBatcher.calls == 1
+
+
+def test_compare_video_too_large(monkeypatch):
+    """Test compare_video endpoint rejects a video above the upload limit."""
+    monkeypatch.setattr(main_mod, "MAX_UPLOAD_BYTES", 4)
+    files = {
+        "image": ("test.jpg", b"fake image data", "image/jpeg"),
+        "video": ("test.mp4", b"fake video data", "video/mp4"),
+    }
+    response = client.post("/faceapp/compare_video/", files=files)
+    assert response.status_code == 413
+    assert "maximum size" in response.json()["error"]
+
+
+def test_compare_faces_multi_face(monkeypatch):
+    """Test that multi-face mode reports the best-matching face and its box."""
+
+    async def fake_embed_image_faces(file):
+        return np.array([[0, 1, 0], [1, 0, 0], [0, 0, 1]]), [(0, 0, 10, 10), (20, 30, 40, 50), (5, 5, 5, 5)]
+
+    monkeypatch.setattr(main_mod, "embed_image_faces", fake_embed_image_faces)
+    files = {
+        "image1": ("test.jpg", b"fake image data", "image/jpeg"),
+        "image2": ("group.jpg", b"fake image data", "image/jpeg"),
+    }
+    response = client.post("/faceapp/compare/?multi_face=true", files=files)
+    json_data = response.json()
+    assert response.status_code == 200
+    assert json_data["similarity_score"] == 1.0
+    assert json_data["face_box"] == {"x": 20, "y": 30, "width": 40, "height": 50}
+    assert json_data["faces_detected"] == 3
+
+
 def test_compare_faces_http_exception(monkeypatch):
     """Test compare_faces endpoint HTTP exception branch."""
 
-    def fake_process_image(file):
+    def fake_embed_image(file):
         raise HTTPException(status_code=400, detail="Forced HTTP error")
 
-    monkeypatch.setattr(main_mod, "process_image", fake_process_image)
+    monkeypatch.setattr(main_mod, "embed_image", fake_embed_image)
     files = {
         "image1": ("test.jpg", b"fake image data", "image/jpeg"),
         "image2": ("test.jpg", b"fake image data", "image/jpeg"),
@@ -189,6 +420,47 @@ def test_compare_faces_http_exception(monkeypatch):
     assert "Forced HTTP error" in json_data["error"]
 
 
+# gallery and identify endpoint tests
+def test_enroll_and_identify():
+    """Test that an enrolled subject is returned as the best identification match."""
+    files = {"image": ("test.jpg", b"fake image data", "image/jpeg")}
+    response = client.post("/faceapp/gallery/alice", files=files)
+    assert response.status_code == 201
+    assert response.json()["gallery_size"] == 1
+
+    response = client.post("/faceapp/gallery/alice", files=files)
+    assert response.status_code == 200
+
+    response = client.post("/faceapp/identify/?top_k=3", files=files)
+    json_data = response.json()
+    assert response.status_code == 200
+    assert json_data["matches"] == [
+        {"subject_id": "alice", "similarity_score": 1.0, "is_similar": True}
+    ]
+    assert client.get("/faceapp/gallery/").json()["subjects"] == 1
+
+
+def test_remove_subject():
+    """Test removing an enrolled subject and removing an unknown one."""
+    files = {"image": ("test.jpg", b"fake image data", "image/jpeg")}
+    client.post("/faceapp/gallery/alice", files=files)
+    response = client.delete("/faceapp/gallery/alice")
+    assert response.status_code == 200
+    assert response.json()["gallery_size"] == 0
+
+    response = client.delete("/faceapp/gallery/alice")
+    assert response.status_code == 404
+    assert "not enrolled" in response.json()["error"]
+
+
+def test_identify_empty_gallery():
+    """Test that identification against an empty gallery returns no matches."""
+    files = {"image": ("test.jpg", b"fake image data", "image/jpeg")}
+    response = client.post("/faceapp/identify/", files=files)
+    assert response.status_code == 200
+    assert response.json()["matches"] == []
+
+
 def test_lifespan_startup_error(monkeypatch):
     """Test that the lifespan context manager raises an exception if FACE_VERIFIER is None."""
     monkeypatch.setattr(main_mod, "FACE_VERIFIER", None)
@@ -213,3 +485,48 @@ def test_lifespan_shutdown_print():
         asyncio.run(run_lifespan())
     output = f.getvalue()
     assert "Cleaning up resources during shutdown..." in output
+
+
+def test_compare_faces_busy(monkeypatch):
+    """Test that a saturated preprocessing executor answers 503 with Retry-After."""
+    monkeypatch.setattr(main_mod.PREPROCESS_EXECUTOR, "in_flight", main_mod.PREPROCESS_EXECUTOR.capacity)
+    files = {
+        "image1": ("img1.jpg", b"dummy image data", "image/jpeg"),
+        "image2": ("img2.jpg", b"dummy image data", "image/jpeg"),
+    }
+    response = client.post("/faceapp/compare/", files=files)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_readiness_reports_model_state(monkeypatch):
+    """Test that the readiness probe answers 503 until every model is loaded."""
+    from src_models.models.lazy import LazyModel
+
+    models = {"a": LazyModel("a", object), "b": LazyModel("b", object)}
+    monkeypatch.setattr(main_mod, "MODELS", models)
+    monkeypatch.setitem(main_mod.WARMUP_STATUS, "state", "done")
+    models["a"].load()
+
+    response = client.get("/faceapp/ready/")
+    assert response.status_code == 503
+    assert response.json()["models"]["a"]["state"] == "ready"
+    assert response.json()["models"]["b"]["state"] == "pending"
+
+    asyncio.run(main_mod.load_models())
+    response = client.get("/faceapp/ready/")
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
+
+
+def test_readiness_waits_for_warmup(monkeypatch):
+    """Test that loaded models are not reported ready before warm-up has finished."""
+    from src_models.models.lazy import LazyModel
+
+    models = {"a": LazyModel("a", object)}
+    models["a"].load()
+    monkeypatch.setattr(main_mod, "MODELS", models)
+    monkeypatch.setitem(main_mod.WARMUP_STATUS, "state", "running")
+    response = client.get("/faceapp/ready/")
+    assert response.status_code == 503
+    assert response.json()["warmup"]["state"] == "running"
@@ -0,0 +1,71 @@
+import threading
+import time
+import pytest
+from src_models.models.pool import ModelPool
+
+
+class DummyModel:
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+
+def test_pool_reuses_instances():
+    """Test that sequential checkouts reuse the seeded instance."""
+    seed = DummyModel()
+    pool = ModelPool(DummyModel, size=2, initial=[seed])
+    for _ in range(3):
+        with pool.checkout() as model:
+            assert model is seed
+    assert pool.stats() == {"size": 2, "created": 1, "in_use": 0, "waits": 0}
+
+
+def test_pool_creates_up_to_size_and_blocks():
+    """Test that concurrent checkouts get distinct instances and wait at the limit."""
+    pool = ModelPool(DummyModel, size=2)
+    seen = []
+    lock = threading.Lock()
+
+    def work():
+        with pool.checkout() as model:
+            with lock:
+                seen.append(model)
+                model.active += 1
+                model.max_active = max(model.max_active, model.active)
+            time.sleep(0.05)
+            with lock:
+                model.active -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    instances = {id(model): model for model in seen}
+    stats = pool.stats()
+    assert len(instances) == 2
+    assert stats["created"] == 2
+    assert stats["in_use"] == 0
+    assert stats["waits"] >= 1
+    # No instance is ever used by two threads at once
+    assert all(model.max_active == 1 for model in instances.values())
+
+
+def test_pool_failed_creation_frees_slot():
+    """Test that a failing factory does not consume pool capacity."""
+    calls = []
+
+    def factory():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("Model load failed")
+        return DummyModel()
+
+    pool = ModelPool(factory, size=1)
+    with pytest.raises(RuntimeError):
+        with pool.checkout():
+            pass
+    with pool.checkout() as model:
+        assert isinstance(model, DummyModel)
+    assert pool.stats()["created"] == 1
@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from fastapi import HTTPException
+import src_models.process_pool as process_pool
+from src_models.process_pool import PreprocessProcessPool
+
+
+@pytest.fixture
+def inline_pool(monkeypatch):
+    """A pool whose worker function runs on a thread of this process."""
+    monkeypatch.setattr(
+        "src_models.models.utils.detect_align_crop_face",
+        lambda image, **kwargs: (image, np.zeros((1, 2))),
+    )
+    monkeypatch.setattr(
+        "src_models.models.utils.detect_align_crop_faces",
+        lambda images, **kwargs: ((image, np.zeros((1, 2))) for image in images),
+    )
+    monkeypatch.setattr(
+        "src_models.models.face_verifier.preprocess_image_direct",
+        lambda image, out: np.copyto(out, image.mean()),
+    )
+    pool = PreprocessProcessPool(1)
+    pool._executor.shutdown()
+    pool._executor = ThreadPoolExecutor(1)
+    yield pool
+    pool.shutdown()
+
+
+def test_process_images_through_shared_memory(inline_pool):
+    """Test that images of different shapes reach the worker and tensors come back."""
+    images = [
+        np.full((30, 40, 3), 10, dtype=np.uint8),
+        np.full((17, 9, 3), 20, dtype=np.uint8),
+        np.full((64, 64, 3), 30, dtype=np.uint8),
+    ]
+    result = inline_pool.process_images(images)
+    assert result.shape == (3, 3, 112, 112)
+    assert result[:, 0, 0, 0].tolist() == [10, 20, 30]
+
+
+def test_process_single_image(inline_pool):
+    """Test that a single image uses the single-image pipeline."""
+    result = inline_pool.process_images([np.full((8, 8, 3), 7, dtype=np.uint8)])
+    assert result.shape == (1, 3, 112, 112)
+    assert np.all(result == 7)
+
+
+def test_process_images_reports_worker_error(inline_pool, monkeypatch):
+    """Test that a failure in the worker is raised in the calling process."""
+
+    def fail(image, **kwargs):
+        raise HTTPException(status_code=400, detail="No face detected!")
+
+    monkeypatch.setattr("src_models.models.utils.detect_align_crop_face", fail)
+    with pytest.raises(RuntimeError, match="No face detected!"):
+        inline_pool.process_images([np.zeros((8, 8, 3), dtype=np.uint8)])
+
+
+def test_aligned_offsets():
+    """Test that array offsets in a segment are aligned."""
+    assert process_pool._aligned(1) == process_pool.SEGMENT_ALIGNMENT
+    assert process_pool._aligned(process_pool.SEGMENT_ALIGNMENT) == process_pool.SEGMENT_ALIGNMENT
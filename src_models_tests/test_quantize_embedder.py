@@ -0,0 +1,50 @@
+import numpy as np
+from src_models.tools.quantize_embedder import decision_changes, embedding_drift, hold_out, passes_gate
+
+
+def embeddings(n=6, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def test_identical_embeddings_have_no_drift():
+    """Test that a model compared with itself shows no drift or flipped decisions."""
+    reference = embeddings()
+    drift = embedding_drift(reference, reference * 3)
+    assert np.isclose(drift["min_cosine"], 1.0)
+    assert drift["max_drift"] < 1e-6
+    changes = decision_changes(reference, reference.copy(), threshold=0.5)
+    assert changes == {"pairs": 15, "flipped": 0, "max_score_change": changes["max_score_change"]}
+    assert changes["max_score_change"] < 1e-6
+
+
+def test_decision_changes_counts_flips():
+    """Test that pairs crossing the threshold are counted."""
+    reference = np.array([[1.0, 0.0], [1.0, 0.1], [0.0, 1.0]])
+    # The first two faces move apart and now score below the threshold
+    candidate = np.array([[1.0, 0.0], [0.0, 1.0], [0.0, 1.0]])
+    changes = decision_changes(reference, candidate, threshold=0.9)
+    assert changes["pairs"] == 3
+    assert changes["flipped"] == 2
+
+
+def test_passes_gate():
+    """Test that a model is promoted only within both drift and flip bounds."""
+    report = {"drift": {"max_drift": 0.01}, "decisions": {"flipped": 0}}
+    assert passes_gate(report, max_drift=0.02, max_flipped=0)
+    assert not passes_gate(report, max_drift=0.005, max_flipped=0)
+    report["decisions"]["flipped"] = 1
+    assert not passes_gate(report, max_drift=0.02, max_flipped=0)
+
+
+def test_hold_out_is_stable_and_disjoint():
+    """Test that held-out faces never calibrate and that adding an image does not move the others."""
+    faces = {f"faces/{i}.jpg": np.full((1, 3, 112, 112), i, dtype=np.float32) for i in range(10)}
+    calibration, evaluation = hold_out(faces, 0.3)
+    assert len(evaluation) == 3
+    assert not set(calibration) & set(evaluation)
+    assert set(calibration) | set(evaluation) == set(faces)
+
+    faces["faces/new.jpg"] = np.zeros((1, 3, 112, 112), dtype=np.float32)
+    _, grown_evaluation = hold_out(faces, 0.3)
+    assert len(grown_evaluation) == 3
+    assert set(grown_evaluation) - {"faces/new.jpg"} <= set(evaluation)
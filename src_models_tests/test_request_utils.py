@@ -1,14 +1,39 @@
 import asyncio
+import io
+import threading
 import cv2
 import pytest
 import numpy as np
+from PIL import Image
 from fastapi import HTTPException
 from src_models.request_utils import (
     validate_file_extension,
     validate_file_mime,
+    sniff_image_mime,
+    embed_image,
     process_image,
     process_image_sync,
+    process_images_sync,
+    preprocess_image_faces_bytes,
+    select_video_faces_sync,
 )
+from src_models.embedding_cache import EmbeddingCache
+from src_models.models.pool import ModelPool
+
+
+@pytest.fixture(autouse=True)
+def reset_magic_handles(monkeypatch):
+    """Drop cached libmagic handles so tests can patch magic.Magic."""
+    monkeypatch.setattr("src_models.request_utils._MAGIC_LOCAL", threading.local())
+
+
+class DummyUploadFile:
+    def __init__(self, filename, content):
+        self.filename = filename
+        self._content = content
+
+    async def read(self):
+        return self._content
 
 
 def test_validate_file_extension_valid():
@@ -39,12 +64,61 @@ def test_validate_file_mime(monkeypatch):
     validate_file_mime(b"dummy data")
 
 
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        (b"\xff\xd8\xff\xe0\x00\x10JFIF", "image/jpeg"),
+        (b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR", "image/png"),
+        (b"RIFF\x24\x00\x00\x00WEBPVP8 ", "image/webp"),
+        (b"II*\x00\x08\x00\x00\x00", "image/tiff"),
+        (b"MM\x00*\x00\x00\x00\x08", "image/tiff"),
+        (b"%PDF-1.4", None),
+        (b"", None),
+    ],
+)
+def test_sniff_image_mime(data, expected):
+    """Test that the magic-byte fast path recognizes the allowed formats only."""
+    assert sniff_image_mime(data) == expected
+
+
+def test_validate_file_mime_fast_path_skips_libmagic(monkeypatch):
+    """Test that recognized signatures never open a libmagic handle."""
+
+    def fail(**kwargs):
+        raise AssertionError("libmagic should not be used")
+
+    monkeypatch.setattr("src_models.request_utils.magic.Magic", fail)
+    validate_file_mime(b"\x89PNG\r\n\x1a\n" + b"\x00" * 16)
+
+
+def test_validate_file_mime_reuses_handle(monkeypatch):
+    """Test that libmagic is opened once per thread."""
+    created = []
+
+    class DummyMagic:
+        def __init__(self, **kwargs):
+            created.append(self)
+
+        def from_buffer(self, data):
+            return "image/jpeg"
+
+    monkeypatch.setattr("src_models.request_utils.magic.Magic", DummyMagic)
+    for _ in range(3):
+        validate_file_mime(b"dummy data")
+    assert len(created) == 1
+
+    thread = threading.Thread(target=validate_file_mime, args=(b"dummy data",))
+    thread.start()
+    thread.join()
+    assert len(created) == 2
+
+
 def test_process_image_sync(monkeypatch):
     """Test process_image_sync returns preprocessed image with correct shape."""
     dummy_image = np.ones((100, 100, 3), dtype=np.uint8) * 255
     monkeypatch.setattr(
         "src_models.request_utils.detect_align_crop_face",
-        lambda img: (img, np.array([[0, 0]])),
+        lambda img, *args, **kwargs: (img, np.array([[0, 0]])),
     )
     monkeypatch.setattr(
         "src_models.request_utils.preprocess_image_direct",
@@ -54,6 +128,96 @@ def test_process_image_sync(monkeypatch):
     assert result.shape == (1, 3, 112, 112)
 
 
+def test_preprocess_image_faces_bytes_scales_boxes_of_rotated_jpeg(monkeypatch):
+    """Test that face boxes of an EXIF-rotated, reduced JPEG are scaled back to the upright image."""
+    # Stored landscape, shown portrait: EXIF orientation 6 rotates it 90 degrees clockwise
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    Image.new("RGB", (3000, 2000)).save(buffer, format="JPEG", exif=exif.tobytes())
+    decoded_shapes = []
+
+    def fake_process_faces(image, full_resolution=None):
+        decoded_shapes.append(image.shape[:2])
+        return np.ones((1, 3, 112, 112), dtype=np.float32), [(100, 600, 50, 60)]
+
+    monkeypatch.setattr("src_models.request_utils.validate_file_mime", lambda data: None)
+    monkeypatch.setattr("src_models.request_utils.DECODE_TARGET_SIDE", 1024)
+    monkeypatch.setattr("src_models.request_utils.process_image_faces_sync", fake_process_faces)
+    _, boxes = preprocess_image_faces_bytes(buffer.getvalue())
+    assert decoded_shapes == [(1500, 1000)]
+    assert boxes == [(200, 1200, 100, 120)]
+
+
+def test_process_image_sync_uses_process_pool(monkeypatch):
+    """Test process_image_sync hands the image to the worker process pool when enabled."""
+
+    class DummyProcessPool:
+        def process_images(self, images):
+            return np.full((len(images), 3, 112, 112), 2, dtype=np.float32)
+
+    monkeypatch.setattr("src_models.request_utils.PREPROCESS_PROCESS_POOL", DummyProcessPool())
+    result = process_image_sync(np.ones((100, 100, 3), dtype=np.uint8))
+    assert result.shape == (1, 3, 112, 112)
+    assert np.all(result == 2)
+
+
+def test_process_images_sync(monkeypatch):
+    """Test process_images_sync stacks one preprocessed face per frame."""
+    frames = [np.full((100, 100, 3), i, dtype=np.uint8) for i in range(3)]
+    monkeypatch.setattr(
+        "src_models.request_utils.detect_align_crop_faces",
+        lambda images, models=None, **kwargs: ((img, np.array([[0, 0]])) for img in images),
+    )
+    monkeypatch.setattr(
+        "src_models.request_utils.preprocess_image_direct",
+        lambda img, out: np.copyto(out, img[0, 0, 0]),
+    )
+    result = process_images_sync(frames)
+    assert result.shape == (3, 3, 112, 112)
+    assert result[:, 0, 0, 0].tolist() == [0, 1, 2]
+
+
+def test_select_video_faces_sync_keeps_best_frames(monkeypatch):
+    """Test that the best-quality frames are kept, in playback order, with their quality."""
+    frames = [np.full((10, 10, 3), i, dtype=np.uint8) for i in range(6)]
+    qualities = [0.1, 0.9, 0.3, 0.8, 0.2, 0.7]
+    video_landmarker = object()
+    calls = []
+
+    def fake_align_crop_video_faces(frames, models=None, video_landmarker=None):
+        calls.append(video_landmarker)
+        return ((i, frame, None) for i, frame in enumerate(frames) if i != 5)
+
+    monkeypatch.setattr("src_models.request_utils.align_crop_video_faces", fake_align_crop_video_faces)
+    monkeypatch.setattr(
+        "src_models.request_utils.FACE_VIDEO_LANDMARKER_POOL", ModelPool(lambda: video_landmarker, 1)
+    )
+    monkeypatch.setattr(
+        "src_models.request_utils.frame_quality", lambda face_image, landmarks: qualities[face_image[0, 0, 0]]
+    )
+    monkeypatch.setattr(
+        "src_models.request_utils.preprocess_image_direct",
+        lambda img: np.full((1, 3, 112, 112), img[0, 0, 0], dtype=np.float32),
+    )
+    result, selected_qualities = select_video_faces_sync(iter(frames), 3, tracking=True)
+    assert result.shape == (3, 3, 112, 112)
+    assert result[:, 0, 0, 0].tolist() == [1, 2, 3]
+    np.testing.assert_allclose(selected_qualities, [0.9, 0.3, 0.8])
+    select_video_faces_sync(iter(frames), 3)
+    assert calls == [video_landmarker, None]
+
+
+def test_select_video_faces_sync_without_faces(monkeypatch):
+    """Test that a video without a usable face is rejected."""
+    monkeypatch.setattr(
+        "src_models.request_utils.align_crop_video_faces", lambda frames, models=None, video_landmarker=None: iter(())
+    )
+    with pytest.raises(HTTPException) as exc_info:
+        select_video_faces_sync([np.zeros((10, 10, 3), dtype=np.uint8)], 3)
+    assert exc_info.value.status_code == 400
+
+
 def test_validate_file_mime_invalid(monkeypatch):
     """Test that an unsupported MIME type raises HTTPException."""
 
@@ -88,16 +252,55 @@ def test_process_image_invalid_image(monkeypatch):
         "src_models.request_utils.magic.Magic", lambda **kwargs: DummyMagicValid()
     )
 
-    class DummyUploadFile:
-        def __init__(self, filename, content):
-            self.filename = filename
-            self._content = content
-
-        async def read(self):
-            return self._content
-
     dummy_file = DummyUploadFile("test.jpg", b"dummy image data")
 
     with pytest.raises(HTTPException) as excinfo:
         asyncio.run(process_image(dummy_file))
     assert "Invalid or corrupted image file" in str(excinfo.value)
+
+
+def test_embed_image_uses_cache(monkeypatch):
+    """Test that a repeated upload is embedded once and then served from the cache."""
+    calls = []
+
+    def fake_preprocess(image_data):
+        calls.append(image_data)
+        return np.ones((1, 3, 112, 112), dtype=np.float32)
+
+    class DummyBatcher:
+        async def forward(self, image):
+            return np.array([[1.0, 0.0, 0.0]], dtype=np.float32)
+
+    monkeypatch.setattr("src_models.request_utils.preprocess_image_bytes", fake_preprocess)
+    monkeypatch.setattr("src_models.request_utils.FACE_BATCHER", DummyBatcher())
+    monkeypatch.setattr("src_models.request_utils.EMBEDDING_CACHE", EmbeddingCache())
+
+    first = asyncio.run(embed_image(DummyUploadFile("a.jpg", b"same bytes")))
+    second = asyncio.run(embed_image(DummyUploadFile("b.jpg", b"same bytes")))
+    np.testing.assert_array_equal(first, second)
+    assert len(calls) == 1
+
+
+def test_embed_image_writes_disk_cache_off_the_event_loop(monkeypatch, tmp_path):
+    """Test that storing an embedding in the disk tier runs on a worker thread."""
+    writer_threads = []
+
+    class RecordingCache(EmbeddingCache):
+        def _save_to_disk(self, key, embedding):
+            writer_threads.append(threading.current_thread())
+            super()._save_to_disk(key, embedding)
+
+    class DummyBatcher:
+        async def forward(self, image):
+            return np.array([[1.0, 0.0, 0.0]], dtype=np.float32)
+
+    cache = RecordingCache(disk_dir=str(tmp_path))
+    monkeypatch.setattr(
+        "src_models.request_utils.preprocess_image_bytes", lambda data: np.ones((1, 3, 112, 112), dtype=np.float32)
+    )
+    monkeypatch.setattr("src_models.request_utils.FACE_BATCHER", DummyBatcher())
+    monkeypatch.setattr("src_models.request_utils.EMBEDDING_CACHE", cache)
+
+    asyncio.run(embed_image(DummyUploadFile("a.jpg", b"image bytes")))
+    assert writer_threads and writer_threads[0] is not threading.main_thread()
+    assert EmbeddingCache(disk_dir=str(tmp_path)).get(cache.key(b"image bytes")) is not None
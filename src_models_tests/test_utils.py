@@ -1,6 +1,27 @@
 import numpy as np
 import pytest
-from src_models.models.utils import align_face, cosine_similarity
+import cv2
+from fastapi import HTTPException
+from src_models.models.utils import (
+    CropValidator,
+    align_face,
+    detect_landmarks_checked,
+    box_iou,
+    cosine_similarities,
+    cosine_similarity,
+    crop_aligned_face,
+    detect_landmarks_cascade,
+    detect_align_crop_all_faces,
+    detect_align_crop_face,
+    detect_align_crop_faces,
+    align_crop_video_faces,
+    estimate_alignment_transforms,
+    estimate_yaw,
+    face_sharpness,
+    frame_quality,
+    face_search_region,
+    landmark_face_box,
+)
 
 
 # Dummy classes for global patching in utils tests
@@ -24,6 +45,7 @@ class DummyDetector:
         return image[y : y + h, x : x + w]
 
 
+import src_models.models as models
 import src_models.models.utils as utils
 
 
@@ -46,6 +68,86 @@ def test_align_face_success():
     aligned_img, transformed_landmarks = align_face(dummy_image, landmarks)
     assert aligned_img.shape == (616, 616, 3)
     assert transformed_landmarks.shape[1] == 2
+    np.testing.assert_allclose(transformed_landmarks[utils.ALIGNMENT_LANDMARK_INDICES], utils.ALIGNMENT_TARGET_POINTS, atol=1e-3)
+
+    aligned_img, transformed_landmarks = align_face(dummy_image, landmarks, transform_landmarks=False)
+    assert aligned_img.shape == (616, 616, 3)
+    assert transformed_landmarks is None
+
+
+def test_estimate_alignment_transforms_matches_opencv():
+    """Test that the batched closed-form fit matches cv2.estimateAffinePartial2D."""
+    rng = np.random.default_rng(0)
+    base = np.array([(251, 272), (364, 272), (308, 336), (262, 402), (355, 402)], dtype=np.float32)
+    landmarks = np.zeros((4, 500, 2), dtype=np.float32)
+    for n in range(4):
+        angle = rng.uniform(-0.5, 0.5)
+        rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        points = base @ rotation.T * rng.uniform(0.3, 2.0) + rng.uniform(-100, 100, 2)
+        landmarks[n, [468, 473, 4, 61, 291]] = points + rng.normal(0, 1.0, points.shape)
+
+    transforms = estimate_alignment_transforms(landmarks)
+    assert transforms.shape == (4, 2, 3)
+    for n in range(4):
+        expected, _ = cv2.estimateAffinePartial2D(
+            landmarks[n, [468, 473, 4, 61, 291]], base, method=cv2.LMEDS
+        )
+        np.testing.assert_allclose(transforms[n], expected, rtol=1e-3, atol=1e-2)
+
+
+def test_estimate_alignment_transforms_matches_align_face_on_video_frames():
+    """Test that batched alignment maps real video landmarks exactly like align_face, outliers included."""
+    capture = cv2.VideoCapture("test_images/test_video.mp4")
+    landmarks = []
+    # The opening second has several frames where LMedS drops a landmark
+    for _ in range(60):
+        _, frame = capture.read()
+        landmarks.append(detect_landmarks_checked(frame, models.FACE_LANDMARKER))
+    capture.release()
+    landmarks = np.stack(landmarks)
+
+    transforms = estimate_alignment_transforms(landmarks)
+    for face_landmarks, transform in zip(landmarks, transforms):
+        _, expected = align_face(np.zeros((8, 8, 3), dtype=np.uint8), face_landmarks)
+        np.testing.assert_allclose(face_landmarks @ transform[:, :2].T + transform[:, 2], expected, atol=1e-3)
+
+
+def test_detect_align_crop_faces_batch():
+    """Test that the batch API yields one crop and landmark set per frame."""
+    frames = [np.full((200, 200, 3), i, dtype=np.uint8) for i in range(3)]
+    results = [(face.copy(), landmarks) for face, landmarks in detect_align_crop_faces(frames)]
+    assert len(results) == 3
+    for face, landmarks in results:
+        assert face.shape == (100, 100, 3)
+        assert landmarks.shape == (500, 2)
+
+
+def test_detect_align_crop_faces_no_landmarks(monkeypatch):
+    """Test that a frame without landmarks fails the whole batch."""
+    monkeypatch.setattr(utils.FACE_LANDMARKER, "detect_landmarks", lambda image: None)
+    with pytest.raises(HTTPException) as exc_info:
+        list(detect_align_crop_faces([np.zeros((50, 50, 3), dtype=np.uint8)]))
+    assert exc_info.value.status_code == 400
+
+
+def test_detect_align_crop_face_full_resolution_fallback():
+    """Test that a small face in a reduced decode is re-cropped from the full-resolution image."""
+    reduced = np.zeros((200, 200, 3), dtype=np.uint8)
+    full = np.full((400, 400, 3), 255, dtype=np.uint8)
+    calls = []
+
+    def full_resolution():
+        calls.append(1)
+        return full
+
+    # Dummy eyes are 0.1 px apart: far below the threshold
+    face, _ = detect_align_crop_face(reduced, full_resolution=full_resolution, min_eye_distance=48)
+    assert calls == [1]
+    assert face.max() > 0
+
+    face, _ = detect_align_crop_face(reduced, full_resolution=full_resolution, min_eye_distance=0)
+    assert calls == [1]
+    assert face.max() == 0
 
 
 def test_cosine_similarity():
@@ -54,3 +156,202 @@ def test_cosine_similarity():
     emb2 = np.array([0, 1])
     similarity = cosine_similarity(emb1, emb2)
     assert abs(similarity) < 1e-6
+
+
+def test_landmark_face_box_is_square_around_landmarks():
+    """Test that the landmark box is the square centered on the landmarks' extent."""
+    landmarks = np.array([[100, 120], [300, 120], [200, 400]], dtype=np.float32)
+    assert landmark_face_box(landmarks) == (60, 120, 280, 280)
+
+
+def test_box_iou():
+    """Test intersection over union of (x, y, w, h) boxes."""
+    assert box_iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert box_iou((0, 0, 10, 10), (20, 20, 10, 10)) == 0.0
+    assert box_iou((0, 0, 10, 10), (5, 0, 10, 10)) == pytest.approx(50 / 150)
+
+
+class CountingDetector(DummyDetector):
+    def __init__(self, coords=(50, 50, 100, 100)):
+        self.coords = coords
+        self.calls = 0
+
+    def detect_face(self, image):
+        self.calls += 1
+        return self.coords
+
+
+def test_crop_aligned_face_landmark_mode_skips_detector(monkeypatch):
+    """Test that landmark mode crops without running the detector unless sampled for validation."""
+    image = np.zeros((616, 616, 3), dtype=np.uint8)
+    landmarks = np.array([[100, 100], [200, 200]], dtype=np.float32)
+    detector = CountingDetector()
+    monkeypatch.setattr(utils, "CROP_VALIDATOR", CropValidator(0.0))
+
+    crop = crop_aligned_face(image, landmarks, detector, "landmarks")
+    assert crop.shape == (100, 100, 3)
+    assert detector.calls == 0
+
+    crop = crop_aligned_face(image, landmarks, detector, "detector")
+    assert detector.calls == 1
+
+
+def test_crop_aligned_face_validation(monkeypatch):
+    """Test that validation records disagreements but always keeps the landmark crop."""
+    image = np.zeros((616, 616, 3), dtype=np.uint8)
+    landmarks = np.array([[50, 50], [150, 150]], dtype=np.float32)
+    validator = CropValidator(1.0)
+    monkeypatch.setattr(utils, "CROP_VALIDATOR", validator)
+
+    expected = crop_aligned_face(image, landmarks, CountingDetector((50, 50, 100, 100)), "landmarks")
+    for detected in (None, (400, 400, 100, 100)):
+        crop = crop_aligned_face(image, landmarks, CountingDetector(detected), "landmarks")
+        np.testing.assert_array_equal(crop, expected)
+    assert validator.stats() == {"rate": 1.0, "checked": 3, "missed": 1, "disagreed": 2, "mean_iou": 0.5}
+
+
+def test_face_search_region_is_clipped_square():
+    """Test that the landmarking region is a scaled square around the box, clipped to the image."""
+    assert face_search_region((1000, 1000, 3), (400, 400, 100, 200), 2.0) == (250, 300, 650, 700)
+    assert face_search_region((1000, 1000, 3), (0, 900, 100, 100), 2.0) == (0, 850, 150, 1000)
+
+
+class RecordingLandmarker:
+    def __init__(self):
+        self.shapes = []
+
+    def detect_landmarks(self, image):
+        self.shapes.append(image.shape[:2])
+        return np.array([[10.0, 20.0]], dtype=np.float32)
+
+
+def test_detect_landmarks_cascade_maps_crop_back():
+    """Test that landmarks found on the face region are returned in full-image coordinates."""
+    image = np.zeros((2160, 3840, 3), dtype=np.uint8)
+    landmarker = RecordingLandmarker()
+    # Box in the 640 px detection image, 6x smaller than the frame
+    detector = CountingDetector((100, 50, 20, 20))
+
+    landmarks = detect_landmarks_cascade(image, landmarker, detector, detect_side=640, crop_scale=2.0)
+    assert detector.calls == 1
+    assert landmarker.shapes == [(240, 240)]
+    np.testing.assert_allclose(landmarks, [[10 + 600 - 60, 20 + 300 - 60]])
+
+
+def test_detect_landmarks_cascade_falls_back_to_full_image():
+    """Test that the whole image is landmarked when the detector finds no face."""
+    image = np.zeros((1000, 2000, 3), dtype=np.uint8)
+    landmarker = RecordingLandmarker()
+    detect_landmarks_cascade(image, landmarker, CountingDetector(None), detect_side=640)
+    assert landmarker.shapes == [(1000, 2000)]
+
+
+def test_cosine_similarities():
+    """Test one-vs-many cosine similarity."""
+    embeddings = np.array([[1.0, 0.0], [0.0, 2.0], [-3.0, 0.0]])
+    np.testing.assert_allclose(cosine_similarities(np.array([[2.0, 0.0]]), embeddings), [1.0, 0.0, -1.0])
+
+
+class MultiFaceLandmarker(DummyLandmarker):
+    def detect_all_landmarks(self, image):
+        first = self.detect_landmarks(image) * 100
+        second = first + np.array([200, 0], dtype=np.float32)
+        return [first, second]
+
+
+def test_detect_align_crop_all_faces():
+    """Test that every face is aligned and cropped and reported with its box."""
+    image = np.full((300, 400, 3), 128, dtype=np.uint8)
+    models = utils.FaceModels(MultiFaceLandmarker(), DummyDetector())
+    faces = detect_align_crop_all_faces(image, models)
+    assert len(faces) == 2
+    assert all(crop.shape == (100, 100, 3) for crop, _ in faces)
+    assert faces[0][1] == (0, 0, 65, 70)
+    assert faces[1][1] == (200, 0, 65, 70)
+
+
+def test_detect_align_crop_all_faces_none_found():
+    """Test that an image without faces is rejected."""
+
+    class NoFaces:
+        def detect_all_landmarks(self, image):
+            return []
+
+    with pytest.raises(HTTPException):
+        detect_align_crop_all_faces(np.zeros((10, 10, 3), dtype=np.uint8), utils.FaceModels(NoFaces(), DummyDetector()))
+
+
+def test_estimate_yaw():
+    """Test that a centered nose is frontal and a nose near one cheek is turned."""
+    landmarks = np.zeros((500, 2), dtype=np.float32)
+    landmarks[234], landmarks[454] = [100, 200], [300, 200]
+    landmarks[4] = [200, 220]
+    assert estimate_yaw(landmarks) == pytest.approx(0.0)
+    landmarks[4] = [250, 220]
+    assert estimate_yaw(landmarks) == pytest.approx(30.0)
+    landmarks[4] = [100, 220]
+    assert estimate_yaw(landmarks) == pytest.approx(-90.0)
+
+
+def test_face_sharpness_drops_with_blur():
+    """Test that blurring a textured face crop lowers its sharpness."""
+    image = np.random.default_rng(0).integers(0, 256, (224, 224, 3), dtype=np.uint8)
+    assert face_sharpness(cv2.GaussianBlur(image, (15, 15), 5)) < face_sharpness(image) / 10
+
+
+def test_frame_quality_factors():
+    """Test that quality falls with blur, small faces and yaw."""
+    image = np.random.default_rng(0).integers(0, 256, (224, 224, 3), dtype=np.uint8)
+    landmarks = np.zeros((500, 2), dtype=np.float32)
+    landmarks[468], landmarks[473] = [150, 200], [250, 200]
+    landmarks[234], landmarks[454] = [100, 200], [300, 200]
+    landmarks[4] = [200, 220]
+
+    quality = frame_quality(image, landmarks)
+    assert 0.9 < quality <= 1.0
+    assert frame_quality(cv2.GaussianBlur(image, (15, 15), 5), landmarks) < quality / 2
+    assert frame_quality(image, landmarks / 5) == pytest.approx(quality / 2)
+    turned = landmarks.copy()
+    turned[4] = [250, 220]
+    assert frame_quality(image, turned) == pytest.approx(quality * 0.75)
+
+
+def test_align_crop_video_faces_skips_frames_without_face():
+    """Test that frames where the face is not found are left out."""
+
+    class FlakyLandmarker(DummyLandmarker):
+        def detect_landmarks(self, image):
+            return None if image[0, 0, 0] == 1 else super().detect_landmarks(image) * 100
+
+        detect_video_landmarks = detect_landmarks
+
+    frames = [np.full((300, 300, 3), i, dtype=np.uint8) for i in range(3)]
+    for video_landmarker in (FlakyLandmarker(), None):
+        results = list(
+            align_crop_video_faces(
+                frames, utils.FaceModels(FlakyLandmarker(), DummyDetector()), video_landmarker=video_landmarker
+            )
+        )
+        assert [index for index, _, _ in results] == [0, 2]
+        assert all(face_image.shape == (100, 100, 3) for _, face_image, _ in results)
+
+
+def test_align_crop_video_faces_tracks_with_video_landmarker():
+    """Test that a video landmarker, when given, landmarks every frame instead of the pipeline's one."""
+
+    class VideoLandmarker(DummyLandmarker):
+        frames = 0
+
+        def detect_video_landmarks(self, frame):
+            self.frames += 1
+            return self.detect_landmarks(frame) * 1000
+
+    class UnusedLandmarker:
+        def detect_landmarks(self, image):
+            raise AssertionError("searched a tracked frame")
+
+    video_landmarker = VideoLandmarker()
+    frames = [np.zeros((1080, 1920, 3), dtype=np.uint8)] * 3
+    models = utils.FaceModels(UnusedLandmarker(), DummyDetector())
+    assert len(list(align_crop_video_faces(frames, models, video_landmarker=video_landmarker))) == 3
+    assert video_landmarker.frames == 3
@@ -0,0 +1,278 @@
+import asyncio
+import os
+import tempfile
+import threading
+import cv2
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from src_models.video_utils import (
+    SequentialSimilarityTest,
+    VideoFrameSampler,
+    iter_frames_at_indices,
+    iter_frames_at_timestamps,
+    refinement_order,
+    sample_frame_indices,
+    sample_frame_timestamps,
+    sample_video_frames,
+    spooled_upload,
+)
+
+
+class DummyCapture:
+    """Sequential capture whose frames are filled with their own index."""
+
+    def __init__(self, frame_count, fps=10.0):
+        self.frame_count = frame_count
+        self.fps = fps
+        self.position = -1
+        self.retrieved = []
+
+    def grab(self):
+        if self.position + 1 >= self.frame_count:
+            return False
+        self.position += 1
+        return True
+
+    def retrieve(self):
+        self.retrieved.append(self.position)
+        return True, np.full((2, 2, 3), self.position, dtype=np.uint8)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return self.position / self.fps * 1000.0
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frame_count
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        return 0
+
+    def set(self, prop, value):
+        raise AssertionError("Frames must not be read by seeking")
+
+    def release(self):
+        pass
+
+
+def test_sample_frame_indices():
+    """Test that indices span the clip and are deduplicated for short clips."""
+    assert sample_frame_indices(100, 5) == [0, 24, 49, 74, 99]
+    assert sample_frame_indices(2, 5) == [0, 1]
+
+
+def test_refinement_order():
+    """Test that the first samples span the clip and the rest halve the widest gaps."""
+    order = refinement_order(15, 3)
+    assert order[:5] == [0, 7, 14, 3, 10]
+    assert sorted(order) == list(range(15))
+    assert refinement_order(2, 3) == [0, 1]
+
+
+def test_sample_frame_timestamps():
+    """Test that timestamps span the clip duration."""
+    assert sample_frame_timestamps(11, 10.0, 3) == pytest.approx([0.0, 500.0, 1000.0])
+
+
+def test_iter_frames_at_indices_retrieves_only_requested_frames():
+    """Test that only the sampled frames are retrieved and decoding stops after the last one."""
+    cap = DummyCapture(100)
+    frames = list(iter_frames_at_indices(cap, [0, 24, 49]))
+    assert [index for index, _ in frames] == [0, 24, 49]
+    assert [int(frame[0, 0, 0]) for _, frame in frames] == [0, 24, 49]
+    assert cap.retrieved == [0, 24, 49]
+    assert cap.position == 49
+
+
+def test_iter_frames_at_indices_truncated_video():
+    """Test that indices beyond the decodable frames are skipped."""
+    cap = DummyCapture(10)
+    assert [index for index, _ in iter_frames_at_indices(cap, [5, 20])] == [5]
+
+
+def test_iter_frames_at_indices_seeks_over_long_gaps():
+    """Test that frames further apart than max_grab_gap are reached by seeking."""
+
+    class SeekableCapture(DummyCapture):
+        def set(self, prop, value):
+            assert prop == cv2.CAP_PROP_POS_FRAMES
+            self.position = value - 1
+
+    cap = SeekableCapture(100)
+    frames = list(iter_frames_at_indices(cap, [0, 5, 90], max_grab_gap=10))
+    assert [int(frame[0, 0, 0]) for _, frame in frames] == [0, 5, 90]
+
+
+def test_iter_frames_at_timestamps():
+    """Test that the first frame at or after each timestamp is returned once."""
+    cap = DummyCapture(50, fps=10.0)
+    frames = list(iter_frames_at_timestamps(cap, [0.0, 250.0, 260.0, 4900.0]))
+    assert [timestamp for timestamp, _ in frames] == pytest.approx([0.0, 300.0, 4900.0])
+
+
+def test_sample_video_frames(monkeypatch):
+    """Test that sample_video_frames samples by index or by timestamp."""
+    monkeypatch.setattr(
+        "src_models.video_utils.cv2.VideoCapture", lambda path: DummyCapture(21, fps=10.0)
+    )
+    total_frames, frames = sample_video_frames("video.mp4", 3)
+    assert total_frames == 21
+    assert [int(frame[0, 0, 0]) for frame in frames] == [0, 10, 20]
+
+    _, frames = sample_video_frames("video.mp4", 3, by_timestamp=True)
+    assert [int(frame[0, 0, 0]) for frame in frames] == [0, 10, 20]
+
+
+def test_video_frame_sampler_reads_progressively(monkeypatch):
+    """Test that the sampler hands out frames in batches and stops decoding early."""
+    capture = DummyCapture(100)
+    monkeypatch.setattr("src_models.video_utils.cv2.VideoCapture", lambda path: capture)
+    with VideoFrameSampler("video.mp4", 5) as sampler:
+        assert [int(frame[0, 0, 0]) for frame in sampler.read(2)] == [0, 24]
+        assert capture.position == 24
+        assert len(sampler.read(10)) == 3
+        assert sampler.read(1) == []
+
+
+def test_video_frame_sampler_iterates_remaining_frames(monkeypatch):
+    """Test that iterating the sampler continues after the frames already read."""
+    capture = DummyCapture(100)
+    monkeypatch.setattr("src_models.video_utils.cv2.VideoCapture", lambda path: capture)
+    with VideoFrameSampler("video.mp4", 5) as sampler:
+        sampler.read(1)
+        assert [int(frame[0, 0, 0]) for frame in sampler] == [24, 49, 74, 99]
+
+
+def test_sequential_test_stops_early_on_clear_scores():
+    """Test that consistent scores far from the threshold stop after min_frames."""
+    test = SequentialSimilarityTest(threshold=0.7, min_frames=3, max_frames=15)
+    assert test.next_batch_size(step=2) == 3
+    test.add([0.95, 0.96, 0.94])
+    assert test.confident
+    assert test.done
+    assert test.mean == pytest.approx(0.95)
+
+
+def test_sequential_test_keeps_sampling_ambiguous_scores():
+    """Test that scores straddling the threshold are sampled up to max_frames."""
+    test = SequentialSimilarityTest(threshold=0.7, min_frames=3, max_frames=7)
+    test.add([0.65, 0.75, 0.7])
+    assert not test.done
+    assert test.next_batch_size(step=2) == 2
+    test.add([0.72, 0.68])
+    assert test.next_batch_size(step=5) == 2
+    test.add([0.71, 0.69])
+    assert not test.confident
+    assert test.done
+
+
+def test_sequential_test_without_early_exit():
+    """Test that equal min and max frames behave like fixed sampling."""
+    test = SequentialSimilarityTest(threshold=0.7, min_frames=5, max_frames=5)
+    assert test.next_batch_size(step=2) == 5
+    test.add([1.0] * 4)
+    assert not test.done
+    test.add([1.0])
+    assert test.done
+
+
+class ChunkedUpload:
+    """Upload that records the size of every read."""
+
+    def __init__(self, content):
+        self._content = content
+        self._offset = 0
+        self.read_sizes = []
+
+    async def read(self, size=-1):
+        self.read_sizes.append(size)
+        end = len(self._content) if size < 0 else self._offset + size
+        chunk = self._content[self._offset : end]
+        self._offset += len(chunk)
+        return chunk
+
+
+def test_spooled_upload_copies_in_chunks(monkeypatch):
+    """Test that the upload is copied to a temporary file without a whole-file read."""
+    monkeypatch.setattr("src_models.video_utils.SPOOL_CHUNK_SIZE", 4)
+    upload = ChunkedUpload(b"0123456789")
+
+    async def run():
+        async with spooled_upload(upload, max_bytes=100) as path:
+            with open(path, "rb") as f:
+                return path, f.read()
+
+    path, content = asyncio.run(run())
+    assert content == b"0123456789"
+    assert all(size == 4 for size in upload.read_sizes)
+    assert not os.path.exists(path)
+
+
+def test_spooled_upload_writes_off_event_loop(monkeypatch):
+    """Test that chunks are written to the temporary file outside the event loop thread."""
+    monkeypatch.setattr("src_models.video_utils.SPOOL_CHUNK_SIZE", 4)
+    write_threads = []
+    named_temporary_file = tempfile.NamedTemporaryFile
+
+    def recording_temporary_file(*args, **kwargs):
+        tmp = named_temporary_file(*args, **kwargs)
+        write = tmp.write
+
+        def recording_write(data):
+            write_threads.append(threading.get_ident())
+            return write(data)
+
+        tmp.write = recording_write
+        return tmp
+
+    monkeypatch.setattr("src_models.video_utils.tempfile.NamedTemporaryFile", recording_temporary_file)
+
+    async def run():
+        async with spooled_upload(ChunkedUpload(b"0123456789"), max_bytes=100):
+            return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert len(write_threads) == 3
+    assert loop_thread not in write_threads
+
+
+def test_spooled_upload_enforces_size_limit(monkeypatch):
+    """Test that an upload larger than max_bytes is rejected with 413."""
+    monkeypatch.setattr("src_models.video_utils.SPOOL_CHUNK_SIZE", 4)
+    upload = ChunkedUpload(b"0123456789")
+
+    async def run():
+        async with spooled_upload(upload, max_bytes=6):
+            pass
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(run())
+    assert excinfo.value.status_code == 413
+    assert upload.read_sizes == [4, 4]
+
+
+def test_sequential_test_weighted_mean():
+    """Test that weighted scores are averaged by weight, and all-zero weights fall back to the mean."""
+    test = SequentialSimilarityTest(threshold=0.7, min_frames=2, max_frames=2)
+    test.add([1.0, 0.5], weights=[0.9, 0.1])
+    assert test.mean == pytest.approx(0.95)
+
+    test = SequentialSimilarityTest(threshold=0.7, min_frames=2, max_frames=2)
+    test.add([1.0, 0.5], weights=[0.0, 0.0])
+    assert test.mean == pytest.approx(0.75)
+
+
+def test_video_frame_sampler_first_pass_spans_clip(monkeypatch):
+    """Test that coarse-to-fine sampling hands out the whole clip first, then fills the gaps."""
+
+    class SeekableCapture(DummyCapture):
+        def set(self, prop, value):
+            assert prop == cv2.CAP_PROP_POS_FRAMES
+            self.position = value - 1
+
+    capture = SeekableCapture(141)
+    monkeypatch.setattr("src_models.video_utils.cv2.VideoCapture", lambda path: capture)
+    with VideoFrameSampler("video.mp4", 15, first_pass=3) as sampler:
+        assert [int(frame[0, 0, 0]) for frame in sampler.read(3)] == [0, 70, 140]
+        assert [int(frame[0, 0, 0]) for frame in sampler.read(2)] == [30, 100]
+        remaining = [int(frame[0, 0, 0]) for frame in sampler]
+    assert sorted([0, 70, 140, 30, 100] + remaining) == sample_frame_indices(141, 15)
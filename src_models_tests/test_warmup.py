@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+import numpy as np
+import pytest
+import src_models.warmup as warmup
+from src_models.warmup import warm_up, warm_up_batch_sizes
+
+
+class DummyPool:
+    size = 3
+
+    def __init__(self):
+        self.checked_out = 0
+        self.max_checked_out = 0
+
+    @contextmanager
+    def checkout(self):
+        self.checked_out += 1
+        self.max_checked_out = max(self.max_checked_out, self.checked_out)
+        try:
+            yield object()
+        finally:
+            self.checked_out -= 1
+
+
+class DummyEmbedder:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def forward_batch(self, images):
+        self.batch_sizes.append(images.shape[0])
+        return np.zeros((images.shape[0], 4), dtype=np.float32)
+
+
+@pytest.mark.parametrize("max_batch_size, expected", [(1, [1]), (32, [1, 2, 4, 8, 16, 32]), (24, [1, 2, 4, 8, 16, 24])])
+def test_warm_up_batch_sizes(max_batch_size, expected):
+    """Test that warm-up covers the power-of-two batch sizes up to the largest batch."""
+    assert warm_up_batch_sizes(max_batch_size) == expected
+
+
+def test_warm_up_runs_every_pipeline_and_batch_size(monkeypatch):
+    """Test that all pool instances are used and the embedder runs at each batch size."""
+    pool, embedder, detected = DummyPool(), DummyEmbedder(), []
+
+    def fake_detect(image, models, **kwargs):
+        detected.append(models)
+        return np.zeros((112, 112, 3), dtype=np.uint8), None
+
+    monkeypatch.setattr(warmup, "FACE_MODEL_POOL", pool)
+    monkeypatch.setattr(warmup, "FACE_EMBEDDER", embedder)
+    monkeypatch.setattr(warmup, "detect_align_crop_face", fake_detect)
+    monkeypatch.setattr(warmup, "PREPROCESS_PROCESS_POOL", None)
+
+    timings = warm_up("test_images/clear_face.png", [1, 4, 8])
+    assert pool.max_checked_out == 3
+    assert len(set(map(id, detected))) == 3
+    assert embedder.batch_sizes == [1, 4, 8]
+    assert set(timings) == {"face_pipeline_seconds", "embedder_seconds"}
+
+
+def test_warm_up_without_face(monkeypatch):
+    """Test that a missing image or undetected face still warms up the embedder."""
+    embedder = DummyEmbedder()
+
+    def no_face(image, models, **kwargs):
+        raise ValueError("No face detected!")
+
+    monkeypatch.setattr(warmup, "FACE_MODEL_POOL", DummyPool())
+    monkeypatch.setattr(warmup, "FACE_EMBEDDER", embedder)
+    monkeypatch.setattr(warmup, "detect_align_crop_face", no_face)
+    monkeypatch.setattr(warmup, "PREPROCESS_PROCESS_POOL", None)
+
+    warm_up("does/not/exist.png", [2])
+    assert embedder.batch_sizes == [2]